@@ -36,10 +36,12 @@ from daggr.node import (
     Node,
 )
 from daggr.port import ItemList, Port
+from daggr.result_cache import CachePolicy
 from daggr.server import DaggrServer
 
 __all__ = [
     "__version__",
+    "CachePolicy",
     "ChoiceNode",
     "Edge",
     "Graph",
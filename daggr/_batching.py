@@ -0,0 +1,116 @@
+"""Dynamic batching of FnNode calls.
+
+FnNodes created with `batch=True` don't run their function once per call.
+Calls that arrive close together, from scattered items, parallel sessions or
+API requests, are queued on the node's process-wide `Batcher` and passed to
+the function as one list-in/list-out call. A batch is sent once
+`max_batch_size` calls are waiting or the oldest has waited `max_wait_ms`.
+This suits models that are much faster per item on a batch, such as
+embeddings or GPU inference.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Future
+from typing import Any
+
+BATCHER_IDLE_TIMEOUT = 30.0
+
+
+class Batcher:
+    """Coalesces concurrent calls of one batched FnNode into list calls.
+
+    Calls may come from any thread or event loop (scattered items, parallel
+    sessions, API requests). A background thread collects them until
+    `max_batch_size` calls are waiting or the oldest has waited `max_wait_ms`,
+    then passes the batch to `run_batch` and splits its results back to each
+    caller. One batch runs at a time; the thread exits after being idle.
+
+    Args:
+        run_batch: Called with one kwargs dict per call, must return one
+            result per call in the same order.
+        max_batch_size: Max calls per batch.
+        max_wait_ms: Max time to wait for a batch to fill up.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[dict[str, Any]]], list[Any]],
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending: list[tuple[dict[str, Any], Future]] = []
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    def submit(self, kwargs: dict[str, Any]) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((kwargs, future))
+            self._cond.notify()
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="daggr-batcher", daemon=True
+                )
+                self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait(BATCHER_IDLE_TIMEOUT)
+                    if not self._pending:
+                        self._thread = None
+                        return
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch_size]
+                del self._pending[: self.max_batch_size]
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list[tuple[dict[str, Any], Future]]):
+        batch = [(kwargs, f) for kwargs, f in batch if f.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.run_batch([kwargs for kwargs, _ in batch])
+            if not isinstance(results, (list, tuple)):
+                raise ValueError(
+                    f"Batched function must return a list with one result per "
+                    f"call, got {type(results).__name__}"
+                )
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"Batched function returned {len(results)} results for "
+                    f"{len(batch)} calls"
+                )
+        except BaseException as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(
+    node: Any, run_batch: Callable[[list[dict[str, Any]]], list[Any]]
+) -> Batcher:
+    """Get the process-wide batcher for a batched FnNode, creating it on first use."""
+    with _batchers_lock:
+        if node._batcher is None:
+            node._batcher = Batcher(run_batch, node._max_batch_size, node._max_wait_ms)
+        return node._batcher
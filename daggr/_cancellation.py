@@ -0,0 +1,121 @@
+"""Cancellation and deadlines for node work.
+
+Cancelling an asyncio task that awaits a call in a worker thread doesn't stop
+the thread. `run_in_thread` gives the thread a cancel event, set when the
+awaiting task is cancelled, and the blocking waits inside node execution
+(remote jobs, batches, process pool calls, downloads) check it, so they stop
+early and cancel the work they were waiting on.
+
+A run can also have a deadline, set with `run_deadline`. It's kept in a
+context variable, so it follows the run into the tasks and threads it starts,
+and nodes are given at most the time that remains.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any
+
+from daggr._pools import run_in_pool
+
+CANCEL_POLL_INTERVAL = 0.1
+
+_cancel_event: ContextVar[threading.Event | None] = ContextVar(
+    "daggr_cancel_event", default=None
+)
+_deadline: ContextVar[float | None] = ContextVar("daggr_deadline", default=None)
+
+
+def is_cancelled() -> bool:
+    """Whether the task that started the current worker thread was cancelled."""
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def check_cancelled() -> None:
+    if is_cancelled():
+        raise asyncio.CancelledError()
+
+
+def wait_future(future: concurrent.futures.Future, cancel: bool = True) -> Any:
+    """Wait for a future from a worker thread, giving up if the run is cancelled.
+
+    Args:
+        future: The future to wait for, e.g. a gradio_client Job or a process
+            pool call.
+        cancel: Whether to cancel the future when giving up. Pass False for
+            futures other callers share.
+    """
+    event = _cancel_event.get()
+    if event is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            if event.is_set():
+                if cancel:
+                    future.cancel()
+                raise asyncio.CancelledError() from None
+
+
+async def run_in_thread(fn: Callable[..., Any], /, *args: Any, pool: str = "fn") -> Any:
+    """Run `fn(*args)` in a worker thread pool (see `daggr._pools`), giving the
+    thread a cancel event that is set if the caller is cancelled."""
+    event = threading.Event()
+
+    def call():
+        _cancel_event.set(event)
+        return fn(*args)
+
+    try:
+        return await run_in_pool(pool, call)
+    except asyncio.CancelledError:
+        event.set()
+        raise
+
+
+def validate_deadline(deadline: float | None) -> float | None:
+    if deadline is not None and (
+        isinstance(deadline, bool)
+        or not isinstance(deadline, (int, float))
+        or deadline <= 0
+    ):
+        raise ValueError(
+            f"deadline must be a positive number of seconds, got {deadline!r}"
+        )
+    return deadline
+
+
+@contextmanager
+def run_deadline(seconds: float | None) -> Iterator[None]:
+    """Limit the run in the current context to `seconds` from now.
+
+    Nested deadlines can only shorten the time left. None adds no limit.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> float | None:
+    """Seconds left before the current run's deadline, or None if it has none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
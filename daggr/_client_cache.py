@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
 import os
+import threading
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 from typing import Any
 
@@ -14,6 +18,11 @@ _validated_set: set[str] = set()
 _model_task_cache: dict[str, str] = {}
 _dependency_hash_cache: dict[str, str] = {}
 _dependency_hash_loaded: bool = False
+INFERENCE_CLIENTS_MAX = 64
+
+_inference_clients: OrderedDict[tuple, Any] = OrderedDict()
+_async_inference_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_inference_clients_lock = threading.Lock()
 
 
 def _is_hot_reload() -> bool:
@@ -106,6 +115,64 @@ def set_client(src: str, client) -> None:
     _client_cache[src] = client
 
 
+def _inference_client_key(
+    model: str, provider: str | None, token: str | None
+) -> tuple[str, str | None, str | None]:
+    token_hash = hashlib.sha256(token.encode()).hexdigest() if token else None
+    return (model, provider, token_hash)
+
+
+def _pooled_client(clients: OrderedDict, key: tuple, create) -> Any:
+    """Get `key` from an LRU of clients, creating it if needed.
+
+    Evicted clients aren't closed, as a call may still be using them; their
+    connections are released once they're garbage collected.
+    """
+    client = clients.get(key)
+    if client is None:
+        client = create()
+        clients[key] = client
+        while len(clients) > INFERENCE_CLIENTS_MAX:
+            clients.popitem(last=False)
+    else:
+        clients.move_to_end(key)
+    return client
+
+
+def get_inference_client(model: str, provider: str | None, token: str | None):
+    """Get a shared InferenceClient, so repeated calls reuse its connections.
+
+    The `INFERENCE_CLIENTS_MAX` most recently used clients are kept, so each
+    user's token doesn't keep a client alive for the life of the process.
+    """
+    from huggingface_hub import InferenceClient
+
+    with _inference_clients_lock:
+        return _pooled_client(
+            _inference_clients,
+            _inference_client_key(model, provider, token),
+            lambda: InferenceClient(model=model, provider=provider, token=token),
+        )
+
+
+def get_async_inference_client(model: str, provider: str | None, token: str | None):
+    """Get a shared AsyncInferenceClient for the running event loop.
+
+    Async clients hold connections bound to the loop they were first used on,
+    so each loop gets its own clients, dropped when the loop is discarded.
+    Like sync clients, only the most recently used ones are kept.
+    """
+    from huggingface_hub import AsyncInferenceClient
+
+    loop = asyncio.get_running_loop()
+    with _inference_clients_lock:
+        return _pooled_client(
+            _async_inference_clients.setdefault(loop, OrderedDict()),
+            _inference_client_key(model, provider, token),
+            lambda: AsyncInferenceClient(model=model, provider=provider, token=token),
+        )
+
+
 def _get_model_task_cache_path() -> Path:
     return get_daggr_cache_dir() / "_model_tasks.json"
 
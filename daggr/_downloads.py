@@ -0,0 +1,360 @@
+"""Downloading of remote output files.
+
+Remote files in node results are lazy: they become FileValues that keep the
+remote URL and only point at where the file will be downloaded to. GradioNodes
+receive the URL directly; FnNodes, InferenceNodes, the UI and persistence
+materialize the file when they need its bytes.
+
+Files are streamed to disk in chunks through shared, pooled HTTP clients and
+written to a temp file that is atomically renamed into place, so large
+outputs never sit in memory and readers never see a partial file. Concurrent
+requests for the same URL, from any session or thread, share one download,
+which is aborted once every caller waiting on it has been cancelled.
+Finished downloads are hashed as they stream and deduplicated against the
+file store.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import hashlib
+import os
+import threading
+import uuid
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextvars import copy_context
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlparse
+
+from daggr._cancellation import is_cancelled, wait_future
+from daggr._file_store import link_file
+from daggr._pools import get_thread_pool, run_in_pool
+from daggr.state import get_daggr_files_dir
+from daggr.tracing import span
+
+if TYPE_CHECKING:
+    from daggr.executor import FileValue
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+LAZY_FILES_MAX = 10_000
+
+_sync_client = None
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+_inflight: dict[str, _Download] = {}
+_inflight_lock = threading.Lock()
+
+_lazy_files: OrderedDict[str, tuple[str, str | None]] = OrderedDict()
+_lazy_files_lock = threading.Lock()
+_background_tasks: set[asyncio.Task] = set()
+
+
+def get_download_path(url: str) -> Path:
+    """Get the local path a URL is downloaded to."""
+    ext = Path(urlparse(url).path).suffix or ".bin"
+    url_hash = hashlib.md5(url.encode()).hexdigest()[:16]
+    return get_daggr_files_dir() / f"{url_hash}{ext}"
+
+
+def is_download_path(path: str) -> bool:
+    """Whether `path` is where a remote file is, or will be, downloaded to.
+
+    Such files are named after their URL, so the name identifies the content
+    whether or not the download has finished.
+    """
+    return Path(path).parent == get_daggr_files_dir()
+
+
+def _get_sync_client():
+    global _sync_client
+    with _clients_lock:
+        if _sync_client is None:
+            import httpx
+
+            _sync_client = httpx.Client(follow_redirects=True, timeout=None)
+        return _sync_client
+
+
+def _get_async_client():
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            import httpx
+
+            client = httpx.AsyncClient(follow_redirects=True, timeout=None)
+            _async_clients[loop] = client
+        return client
+
+
+def _auth_headers(hf_token: str | None) -> dict[str, str]:
+    return {"Authorization": f"Bearer {hf_token}"} if hf_token else {}
+
+
+def _temp_path(local_path: Path) -> Path:
+    return local_path.with_name(f".{local_path.name}.{uuid.uuid4().hex}.tmp")
+
+
+class _Download:
+    """An in-flight download shared by every caller asking for its URL."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.future: Future = Future()
+        self.waiters = 0
+        self.task: asyncio.Task | None = None
+
+
+def _claim(url: str) -> tuple[_Download, bool]:
+    """Join the in-flight download of a URL. Returns it and whether we own it."""
+    with _inflight_lock:
+        download = _inflight.get(url)
+        owner = download is None
+        if owner:
+            download = _Download(url)
+            _inflight[url] = download
+        download.waiters += 1
+        return download, owner
+
+
+def _leave(download: _Download) -> None:
+    """Stop waiting on a download, aborting it if nobody else is waiting."""
+    with _inflight_lock:
+        download.waiters -= 1
+        abort = download.waiters == 0 and not download.future.done()
+        if abort and _inflight.get(download.url) is download:
+            del _inflight[download.url]
+    if abort and download.task is not None:
+        download.task.get_loop().call_soon_threadsafe(download.task.cancel)
+
+
+def _release(download: _Download, path: str | None, error: BaseException | None):
+    with _inflight_lock:
+        if _inflight.get(download.url) is download:
+            del _inflight[download.url]
+    if path is not None:
+        with _lazy_files_lock:
+            _lazy_files.pop(path, None)
+    if error is not None:
+        download.future.set_exception(error)
+    else:
+        download.future.set_result(path)
+
+
+def download_file(url: str, hf_token: str | None = None) -> str:
+    """Download a URL to the daggr files directory, reusing earlier downloads."""
+    local_path = get_download_path(url)
+    if local_path.exists():
+        return str(local_path)
+    download, owner = _claim(url)
+    if not owner:
+        try:
+            return wait_future(download.future, cancel=False)
+        finally:
+            _leave(download)
+
+    tmp_path = _temp_path(local_path)
+    hasher = hashlib.sha256()
+    try:
+        client = _get_sync_client()
+        with (
+            span("download", url=url),
+            client.stream("GET", url, headers=_auth_headers(hf_token)) as response,
+        ):
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    if download.waiters == 1 and is_cancelled():
+                        raise asyncio.CancelledError()
+                    f.write(chunk)
+                    hasher.update(chunk)
+        os.replace(tmp_path, local_path)
+        link_file(local_path, hasher.hexdigest())
+    except BaseException as e:
+        tmp_path.unlink(missing_ok=True)
+        _release(download, None, e)
+        raise
+    _release(download, str(local_path), None)
+    return str(local_path)
+
+
+def _write_chunk(f, hasher, chunk: bytes) -> None:
+    f.write(chunk)
+    hasher.update(chunk)
+
+
+def _finish_file(f, tmp_path: Path, local_path: Path, digest: str | None) -> None:
+    """Close a temp file and move it into place, or discard it on failure."""
+    f.close()
+    if digest is None:
+        tmp_path.unlink(missing_ok=True)
+        return
+    os.replace(tmp_path, local_path)
+    link_file(local_path, digest)
+
+
+async def _stream_to_file(url: str, local_path: Path, hf_token: str | None) -> str:
+    tmp_path = _temp_path(local_path)
+    hasher = hashlib.sha256()
+    client = _get_async_client()
+    with span("download", url=url):
+        async with client.stream(
+            "GET", url, headers=_auth_headers(hf_token)
+        ) as response:
+            response.raise_for_status()
+            f = await run_in_pool("io", open, tmp_path, "wb")
+            digest = None
+            try:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    await run_in_pool("io", _write_chunk, f, hasher, chunk)
+                digest = hasher.hexdigest()
+            finally:
+                await asyncio.shield(
+                    run_in_pool("io", _finish_file, f, tmp_path, local_path, digest)
+                )
+    return str(local_path)
+
+
+async def download_file_async(url: str, hf_token: str | None = None) -> str:
+    """Async version of `download_file`.
+
+    The download runs in its own task, so a caller being cancelled doesn't
+    abort it for the other callers waiting on the same URL. It's cancelled
+    once no caller is waiting.
+    """
+    local_path = get_download_path(url)
+    if local_path.exists():
+        return str(local_path)
+    download, owner = _claim(url)
+    if owner:
+        download.task = asyncio.ensure_future(
+            _stream_to_file(url, local_path, hf_token)
+        )
+
+        def settle(task: asyncio.Task):
+            if task.cancelled():
+                error = RuntimeError(f"Download of {url} was cancelled")
+                _release(download, None, error)
+            elif task.exception() is not None:
+                _release(download, None, task.exception())
+            else:
+                _release(download, task.result(), None)
+
+        download.task.add_done_callback(settle)
+    try:
+        return await asyncio.shield(asyncio.wrap_future(download.future))
+    finally:
+        _leave(download)
+
+
+def lazy_file(url: str, hf_token: str | None = None) -> FileValue:
+    """Get a FileValue for a remote file without downloading it."""
+    from daggr.executor import FileValue
+
+    path = str(get_download_path(url))
+    if not os.path.exists(path):
+        with _lazy_files_lock:
+            _lazy_files[path] = (url, hf_token)
+            _lazy_files.move_to_end(path)
+            while len(_lazy_files) > LAZY_FILES_MAX:
+                _lazy_files.popitem(last=False)
+    return FileValue(path, url=url, hf_token=hf_token)
+
+
+def get_lazy_file(path: str) -> tuple[str, str | None] | None:
+    """Get the (url, hf_token) a not yet downloaded local path comes from."""
+    with _lazy_files_lock:
+        return _lazy_files.get(path)
+
+
+def _pending_files(data: Any) -> dict[str, tuple[str, str | None]]:
+    from daggr.executor import FileValue
+
+    pending: dict[str, tuple[str, str | None]] = {}
+
+    def visit(value: Any):
+        if isinstance(value, FileValue):
+            if value.url and not os.path.exists(value):
+                pending[str(value)] = (value.url, value.hf_token)
+        elif isinstance(value, dict):
+            for v in value.values():
+                visit(v)
+        elif isinstance(value, (list, tuple)):
+            for v in value:
+                visit(v)
+
+    visit(data)
+    return pending
+
+
+def has_lazy_files(data: Any) -> bool:
+    """Whether `data` holds lazy FileValues that aren't downloaded yet."""
+    return bool(_pending_files(data))
+
+
+def materialize_files(data: Any) -> None:
+    """Download every lazy FileValue in `data` that isn't local yet.
+
+    Files are downloaded concurrently on the remote pool. A download that no
+    pool thread has picked up yet is run by the caller instead, so waiting
+    from a pool thread can't deadlock a full pool.
+    """
+    pending = list(_pending_files(data).values())
+    if not pending:
+        return
+    with span("materialize_files", files=len(pending)):
+        pool = get_thread_pool("remote")
+        futures = [
+            (
+                pool.submit(
+                    functools.partial(copy_context().run, download_file, *args)
+                ),
+                args,
+            )
+            for args in pending[1:]
+        ]
+        download_file(*pending[0])
+        for future, args in futures:
+            if future.cancel():
+                download_file(*args)
+            else:
+                wait_future(future)
+
+
+async def materialize_files_async(data: Any) -> None:
+    """Async version of `materialize_files`, downloading files concurrently."""
+    pending = _pending_files(data).values()
+    if not pending:
+        return
+    with span("materialize_files", files=len(pending)):
+        await asyncio.gather(
+            *(download_file_async(url, hf_token) for url, hf_token in pending)
+        )
+
+
+def materialize_in_background(data: Any, then=None) -> None:
+    """Download the lazy files in `data` without waiting for them.
+
+    Used where files must eventually be local (persisted results, the disk
+    cache) but nothing should wait for them. `then` is called in a thread
+    once every file is downloaded.
+    """
+    if then is None and not has_lazy_files(data):
+        return
+
+    async def run():
+        try:
+            await materialize_files_async(data)
+            if then is not None:
+                await run_in_pool("io", then)
+        except Exception:
+            pass
+
+    task = asyncio.ensure_future(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
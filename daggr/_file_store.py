@@ -0,0 +1,349 @@
+"""Content-addressed storage of the files daggr produces and receives.
+
+Files written by daggr (uploads, inference outputs, decoded data URLs) are
+named after the SHA-256 of their bytes, so identical results share one file.
+Downloaded files keep their URL-derived names but are hardlinked to the object
+with the same content, so duplicate media takes no extra space.
+
+The files directory has a size budget (`DAGGR_FILES_MAX_SIZE`). When it's
+exceeded, the least recently used files that no persisted result, saved input
+or disk cache entry refers to are evicted.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any
+
+from daggr.state import get_daggr_cache_dir, get_daggr_files_dir
+
+HASH_CHUNK_SIZE = 1024 * 1024
+PRUNE_GRACE_SECONDS = 600
+TOUCH_INTERVAL_SECONDS = 3600
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(size: str | int) -> int:
+    """Parse a size like "500MB" or "10G" into bytes."""
+    if isinstance(size, int):
+        return size
+    match = _SIZE_RE.match(size)
+    if match is None:
+        raise ValueError(
+            f"Invalid size '{size}'. Expected a number of bytes or a value "
+            f"like '500MB' or '10GB'."
+        )
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.upper()])
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+FILES_MAX_SIZE = parse_size(os.getenv("DAGGR_FILES_MAX_SIZE", "10GB"))
+
+_written_since_prune = 0
+_prune_lock = threading.Lock()
+_prune_thread: threading.Thread | None = None
+
+
+def get_objects_dir() -> Path:
+    objects_dir = get_daggr_files_dir() / "objects"
+    objects_dir.mkdir(parents=True, exist_ok=True)
+    return objects_dir
+
+
+def _object_path(digest: str, ext: str) -> Path:
+    return get_objects_dir() / f"{digest[:32]}{ext.lower()}"
+
+
+def temp_path(ext: str = "") -> Path:
+    """Get a path in the store to write a file to before adding it."""
+    return get_objects_dir() / f".{uuid.uuid4().hex}{ext}.tmp"
+
+
+def hash_file(path: str | Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def store_file(
+    path: str | Path, ext: str | None = None, digest: str | None = None
+) -> str:
+    """Move a file into the store and get its content-addressed path.
+
+    Args:
+        path: A file the caller owns, e.g. a finished temp file. It's moved, or
+            deleted if the store already has the same content.
+        ext: Extension for the stored file. Defaults to the file's own.
+        digest: SHA-256 of the file, if already computed while writing it.
+    """
+    path = Path(path)
+    if ext is None:
+        ext = "".join(path.suffixes[-2:-1]) if path.suffix == ".tmp" else path.suffix
+    target = _object_path(digest or hash_file(path), ext)
+    if target.exists():
+        path.unlink(missing_ok=True)
+        touch(target, force=True)
+    else:
+        size = path.stat().st_size
+        os.replace(path, target)
+        _note_written(size)
+    return str(target)
+
+
+def store_bytes(data: bytes, ext: str) -> str:
+    """Add bytes to the store and get their content-addressed path."""
+    target = _object_path(hashlib.sha256(data).hexdigest(), ext)
+    if target.exists():
+        touch(target, force=True)
+        return str(target)
+    tmp_path = temp_path(ext)
+    try:
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    _note_written(len(data))
+    return str(target)
+
+
+def link_file(path: str | Path, digest: str) -> None:
+    """Deduplicate a file kept outside the store (e.g. a download).
+
+    If the store has the same content, the file is replaced by a hardlink to
+    it; otherwise the file is hardlinked into the store. Filesystems without
+    hardlinks just keep the file as is.
+    """
+    path = Path(path)
+    target = _object_path(digest, path.suffix)
+    try:
+        if target.exists():
+            if not os.path.samefile(path, target):
+                link_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+                os.link(target, link_path)
+                os.replace(link_path, path)
+            touch(target, force=True)
+        else:
+            os.link(path, target)
+            _note_written(path.stat().st_size)
+    except OSError:
+        pass
+
+
+def touch(path: str | Path, force: bool = False) -> None:
+    """Mark a stored file as recently used, which protects it from eviction.
+
+    Without `force`, files used within the last hour aren't touched again, so
+    serving a file costs at most one extra syscall.
+    """
+    try:
+        if force or time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL_SECONDS:
+            os.utime(path)
+    except OSError:
+        pass
+
+
+def _collect_paths(value: Any, prefixes: tuple[str, ...], paths: set[str]) -> None:
+    if isinstance(value, str):
+        if value.startswith("/file/"):
+            value = value[len("/file/") :]
+            if not (len(value) >= 2 and value[1] == ":"):
+                value = "/" + value
+        if value.startswith(prefixes):
+            paths.add(value)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _collect_paths(v, prefixes, paths)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_paths(v, prefixes, paths)
+
+
+def referenced_files(db_path: str | None = None) -> set[str]:
+    """Get the files that persisted results, saved inputs and disk cache entries use.
+
+    This includes the saved results of single items of a scattered node, which
+    are kept so failed runs can be retried.
+    """
+    files_dir = get_daggr_files_dir()
+    prefixes = (str(files_dir), str(files_dir.resolve()))
+    paths: set[str] = set()
+    db_path = db_path or os.environ.get("DAGGR_DB_PATH")
+    db_path = db_path or str(get_daggr_cache_dir() / "sessions.db")
+
+    if os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        try:
+            rows = conn.execute(
+                "SELECT result FROM node_results UNION ALL "
+                "SELECT inputs_snapshot FROM node_results UNION ALL "
+                "SELECT result FROM node_item_results UNION ALL "
+                "SELECT value FROM node_inputs"
+            ).fetchall()
+        except sqlite3.Error:
+            rows = []
+        finally:
+            conn.close()
+        for (data,) in rows:
+            if data and "files" in data:
+                try:
+                    _collect_paths(json.loads(data), prefixes, paths)
+                except ValueError:
+                    pass
+
+    results_dir = get_daggr_cache_dir() / "results"
+    if results_dir.exists():
+        for entry in results_dir.glob("*/*.json"):
+            try:
+                _collect_paths(json.loads(entry.read_text()), prefixes, paths)
+            except (OSError, ValueError):
+                pass
+    return paths
+
+
+def _referenced_inodes() -> set[tuple[int, int]]:
+    inodes = set()
+    for path in referenced_files():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        inodes.add((stat.st_dev, stat.st_ino))
+    return inodes
+
+
+def _scan_files() -> dict[tuple[int, int], dict[str, Any]]:
+    """Group the files in the files directory by inode, so links count once."""
+    groups: dict[tuple[int, int], dict[str, Any]] = {}
+    for root, _, names in os.walk(get_daggr_files_dir()):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            group = groups.setdefault(
+                (stat.st_dev, stat.st_ino),
+                {"paths": [], "size": stat.st_size, "mtime": stat.st_mtime},
+            )
+            group["paths"].append(path)
+            group["mtime"] = max(group["mtime"], stat.st_mtime)
+    return groups
+
+
+def usage() -> dict[str, Any]:
+    """Report the size of the files directory."""
+    groups = _scan_files()
+    referenced = _referenced_inodes()
+    return {
+        "path": str(get_daggr_files_dir()),
+        "files": sum(len(g["paths"]) for g in groups.values()),
+        "unique_files": len(groups),
+        "size": sum(g["size"] for g in groups.values()),
+        "referenced_size": sum(
+            g["size"] for inode, g in groups.items() if inode in referenced
+        ),
+        "max_size": FILES_MAX_SIZE,
+    }
+
+
+def prune(
+    max_size: int | None = None,
+    older_than: float | None = None,
+    dry_run: bool = False,
+) -> dict[str, int]:
+    """Evict unreferenced files, least recently used first.
+
+    Args:
+        max_size: Evict until the files directory is at most this many bytes.
+            Defaults to `DAGGR_FILES_MAX_SIZE`. Leftover temp files from
+            interrupted writes are always removed.
+        older_than: Also evict files unused for this many seconds.
+        dry_run: Only report what would be evicted.
+
+    Returns:
+        The number of files removed and bytes freed.
+    """
+    global _written_since_prune
+    if max_size is None:
+        max_size = FILES_MAX_SIZE if FILES_MAX_SIZE > 0 else None
+    now = time.time()
+    groups = _scan_files()
+    total = sum(g["size"] for g in groups.values())
+    referenced = _referenced_inodes()
+    candidates = sorted(
+        (
+            g
+            for inode, g in groups.items()
+            if now - g["mtime"] > PRUNE_GRACE_SECONDS and inode not in referenced
+        ),
+        key=lambda g: g["mtime"],
+    )
+
+    removed = freed = 0
+    for group in candidates:
+        over_budget = max_size is not None and total - freed > max_size
+        stale = older_than is not None and now - group["mtime"] > older_than
+        leftover = all(p.endswith(".tmp") for p in group["paths"])
+        if not (over_budget or stale or leftover):
+            continue
+        if not dry_run:
+            for path in group["paths"]:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        removed += len(group["paths"])
+        freed += group["size"]
+    if not dry_run:
+        with _prune_lock:
+            _written_since_prune = 0
+    return {"removed": removed, "freed": freed}
+
+
+def _note_written(size: int) -> None:
+    """Count bytes added to the files directory.
+
+    Once a tenth of the budget has been written since the last check, the
+    directory is pruned in a background thread.
+    """
+    global _written_since_prune, _prune_thread
+    if FILES_MAX_SIZE <= 0:
+        return
+    with _prune_lock:
+        _written_since_prune += size
+        if _written_since_prune < FILES_MAX_SIZE // 10:
+            return
+        if _prune_thread is not None and _prune_thread.is_alive():
+            return
+        _written_since_prune = 0
+        _prune_thread = threading.Thread(
+            target=_prune_quietly, name="daggr-file-prune", daemon=True
+        )
+        _prune_thread.start()
+
+
+def _prune_quietly() -> None:
+    try:
+        prune()
+    except Exception:
+        pass
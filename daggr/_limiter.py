@@ -0,0 +1,223 @@
+"""Process-wide concurrency limits shared by every session on a server.
+
+Per-session limits (`ConcurrencyManager`) only bound one browser tab or API
+call. FnNodes created with `concurrency_scope="server"`, and every call to a
+Space or model, instead take a slot from a `FairLimiter` shared by the whole
+process, e.g. so a GPU-bound FnNode runs one call at a time however many users
+are connected.
+
+Waiters are queued per user and free slots are handed out round-robin across
+users, so one user scattering over 500 items doesn't make everyone else wait
+for all 500.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+from daggr.metrics import LIMITER_ACTIVE, LIMITER_WAITING
+
+_limiters: dict[str, FairLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+class QueueFull(RuntimeError):
+    """Raised when a limiter's wait queue is at its max length."""
+
+
+class _Waiter:
+    def __init__(self, loop: asyncio.AbstractEventLoop, user: str, priority: int):
+        self.loop = loop
+        self.user = user
+        self.priority = priority
+        self.future = loop.create_future()
+        self.granted = False
+        self.cancelled = False
+
+
+class FairLimiter:
+    """Bounds how many callers hold a slot at once, across threads and loops.
+
+    Waiters are served by priority (lower first), then round-robin across
+    users within a priority.
+
+    Args:
+        name: Name used in metrics.
+        limit: Max slots held at once.
+        max_waiting: Max waiters queued at once. None means unlimited.
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int | None = None):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._queues: dict[int, OrderedDict[str, deque[_Waiter]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self) -> int:
+        with self._lock:
+            return self._waiting()
+
+    def _waiting(self) -> int:
+        return sum(
+            len(queue) for users in self._queues.values() for queue in users.values()
+        )
+
+    def enqueue(self, user: str, priority: int = 0) -> _Waiter | None:
+        """Take a slot if one is free and nobody is waiting, or join the queue.
+
+        Returns None if a slot was taken, otherwise the waiter to pass to
+        `wait`. Raises QueueFull if the queue is at `max_waiting`.
+        """
+        with self._lock:
+            if self.active < self.limit and not self._queues:
+                self.active += 1
+                LIMITER_ACTIVE.set(self.active, limiter=self.name)
+                return None
+            if self.max_waiting is not None and self._waiting() >= self.max_waiting:
+                raise QueueFull(f"'{self.name}' queue is full ({self.max_waiting})")
+            waiter = _Waiter(asyncio.get_running_loop(), user, priority)
+            users = self._queues.setdefault(priority, OrderedDict())
+            users.setdefault(user, deque()).append(waiter)
+            LIMITER_WAITING.inc(limiter=self.name)
+            return waiter
+
+    async def wait(self, waiter: _Waiter) -> None:
+        """Wait until a queued waiter is granted a slot."""
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            self.cancel(waiter)
+            raise
+
+    def cancel(self, waiter: _Waiter) -> None:
+        """Give up a waiter's place in the queue, or the slot it was handed if
+        it was granted one. Does nothing if it was already given up."""
+        with self._lock:
+            if waiter.cancelled:
+                return
+            waiter.cancelled = True
+            if waiter.granted:
+                self._hand_off()
+            elif self._remove(waiter):
+                LIMITER_WAITING.dec(limiter=self.name)
+
+    async def acquire(self, user: str, priority: int = 0) -> None:
+        """Wait for a slot, queued behind `user`'s earlier requests."""
+        waiter = self.enqueue(user, priority)
+        if waiter is not None:
+            await self.wait(waiter)
+
+    def release(self) -> None:
+        with self._lock:
+            self._hand_off()
+
+    def position(self, waiter: _Waiter) -> int | None:
+        """How many queued waiters will be served before `waiter`, or None if
+        it isn't queued."""
+        with self._lock:
+            users = self._queues.get(waiter.priority)
+            queue = users.get(waiter.user) if users else None
+            if queue is None or waiter not in queue:
+                return None
+            index = queue.index(waiter)
+            ahead = sum(
+                len(q)
+                for priority, others in self._queues.items()
+                if priority < waiter.priority
+                for q in others.values()
+            )
+            # Users before this one in the rotation get one more turn.
+            before = True
+            for user, other in users.items():
+                if user == waiter.user:
+                    before = False
+                    continue
+                ahead += min(len(other), index + 1 if before else index)
+            return ahead + index
+
+    def _remove(self, waiter: _Waiter) -> bool:
+        users = self._queues.get(waiter.priority)
+        queue = users.get(waiter.user) if users else None
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        if not queue:
+            del users[waiter.user]
+            if not users:
+                del self._queues[waiter.priority]
+        return True
+
+    def _hand_off(self) -> None:
+        # Called with the lock held when a slot is freed. The slot goes to the
+        # next user in turn in the highest priority, who then moves to the
+        # back of the line. If the limit was lowered while the slot was held,
+        # the slot is dropped instead.
+        while self._queues and self.active <= self.limit:
+            users = self._queues[min(self._queues)]
+            user, queue = next(iter(users.items()))
+            waiter = queue[0]
+            self._remove(waiter)
+            if queue:
+                users.move_to_end(user)
+            LIMITER_WAITING.dec(limiter=self.name)
+            if waiter.cancelled or waiter.future.cancelled():
+                continue
+            try:
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            except RuntimeError:
+                # The waiter's event loop has closed.
+                continue
+            waiter.granted = True
+            return
+        self.active -= 1
+        LIMITER_ACTIVE.set(self.active, limiter=self.name)
+
+    def slot(self, user: str) -> LimiterSlot:
+        return LimiterSlot(self, user)
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class LimiterSlot:
+    """A user's handle on a FairLimiter, with a semaphore's acquire/release."""
+
+    def __init__(self, limiter: FairLimiter, user: str):
+        self.limiter = limiter
+        self.user = user
+
+    async def acquire(self) -> None:
+        await self.limiter.acquire(self.user)
+
+    def release(self) -> None:
+        self.limiter.release()
+
+    async def __aenter__(self) -> LimiterSlot:
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+def get_limiter(key: str, limit: int) -> FairLimiter:
+    """Get the process-wide limiter for `key`.
+
+    Callers sharing a key may declare different limits; the smallest one
+    applies.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = FairLimiter(key, limit)
+        elif limit < limiter.limit:
+            with limiter._lock:
+                limiter.limit = limit
+        return limiter
@@ -0,0 +1,255 @@
+"""Worker pools for node execution.
+
+Blocking work runs in dedicated, bounded thread pools instead of the event
+loop's default executor, one per kind of work, so a burst of one kind can't
+starve the others:
+
+- `remote`: preparing and finishing calls to Spaces and inference providers
+- `fn`: synchronous FnNode functions
+- `io`: internal blocking work such as SQLite queries, cache lookups and file
+  writes
+
+Pool sizes are set with `DAGGR_REMOTE_THREADS`, `DAGGR_FN_THREADS` and
+`DAGGR_IO_THREADS`. With `DAGGR_THREAD_POOL_AUTOSCALE=1`, a pool whose calls
+keep waiting for a thread grows, up to four times its configured size.
+
+FnNodes with `executor="process"` run in shared process pools instead.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextvars
+import os
+import pickle
+import queue
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from daggr._utils import env_int
+from daggr.metrics import (
+    WORKER_THREAD_WAIT,
+    WORKER_THREADS_BUSY,
+    WORKER_THREADS_MAX,
+    WORKER_THREADS_QUEUED,
+)
+from daggr.tracing import record_span
+
+PROCESS_WORKERS = env_int("DAGGR_PROCESS_WORKERS", 0) or os.cpu_count() or 1
+
+THREAD_POOL_SIZES = {
+    "remote": env_int("DAGGR_REMOTE_THREADS", 64, minimum=1),
+    "fn": env_int("DAGGR_FN_THREADS", 0) or min(32, (os.cpu_count() or 1) + 4),
+    "io": env_int("DAGGR_IO_THREADS", 8, minimum=1),
+}
+THREAD_POOL_AUTOSCALE = os.getenv("DAGGR_THREAD_POOL_AUTOSCALE", "0") == "1"
+AUTOSCALE_MAX_FACTOR = 4
+AUTOSCALE_WAIT_THRESHOLD = 0.1
+AUTOSCALE_INTERVAL = 1.0
+
+_process_pools: dict[tuple[Any, bytes], ProcessPoolExecutor] = {}
+_thread_pools: dict[str, ThreadPool] = {}
+_pools_lock = threading.Lock()
+
+
+class ThreadPool:
+    """A bounded pool of worker threads for one kind of work.
+
+    Threads are started on demand, while calls are queued and fewer than
+    `max_workers` threads exist.
+
+    Args:
+        kind: The kind of work, used to name threads and label metrics.
+        max_workers: Number of threads.
+        autoscale: Whether to grow the pool while calls wait for a thread.
+    """
+
+    def __init__(self, kind: str, max_workers: int, autoscale: bool = False):
+        if max_workers < 1:
+            raise ValueError(
+                f"Thread pool '{kind}' needs at least 1 worker, got {max_workers}"
+            )
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_limit = max_workers * AUTOSCALE_MAX_FACTOR if autoscale else None
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._threads: list[threading.Thread] = []
+        self._idle = 0
+        self._pending = 0
+        self._shutdown = False
+        self._avg_wait = 0.0
+        self._last_scaled = 0.0
+        self._lock = threading.Lock()
+        WORKER_THREADS_MAX.set(max_workers, pool=kind)
+
+    def _start_threads(self) -> None:
+        # Called with the lock held.
+        while self._pending > self._idle and len(self._threads) < self.max_workers:
+            thread = threading.Thread(
+                target=self._work,
+                name=f"daggr-{self.kind}-{len(self._threads) + 1}",
+                daemon=True,
+            )
+            self._threads.append(thread)
+            self._idle += 1
+            thread.start()
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn = item
+            with self._lock:
+                self._pending -= 1
+                self._idle -= 1
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn())
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                self._idle += 1
+
+    def submit(self, fn: Callable[[], Any]) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError(f"Thread pool '{self.kind}' has been shut down")
+            self._pending += 1
+            self._queue.put((future, fn))
+            self._start_threads()
+        return future
+
+    def _record_wait(self, seconds: float) -> None:
+        WORKER_THREAD_WAIT.observe(seconds, pool=self.kind)
+        if self.max_limit is None:
+            return
+        with self._lock:
+            self._avg_wait = 0.8 * self._avg_wait + 0.2 * seconds
+            now = time.monotonic()
+            if (
+                self._avg_wait > AUTOSCALE_WAIT_THRESHOLD
+                and self.max_workers < self.max_limit
+                and now - self._last_scaled > AUTOSCALE_INTERVAL
+            ):
+                self.max_workers = min(
+                    self.max_limit, self.max_workers + max(1, self.max_workers // 4)
+                )
+                self._last_scaled = now
+                self._start_threads()
+                WORKER_THREADS_MAX.set(self.max_workers, pool=self.kind)
+
+    async def run(self, fn: Callable[..., Any], /, *args: Any) -> Any:
+        """Run `fn(*args)` in the pool, like `asyncio.to_thread`.
+
+        The caller's context variables are copied to the thread.
+        """
+        context = contextvars.copy_context()
+        submitted_ns = time.time_ns()
+        started = False
+
+        def call():
+            nonlocal started
+            started = True
+            started_ns = time.time_ns()
+            record_span("thread_queue_wait", submitted_ns, started_ns, pool=self.kind)
+            WORKER_THREADS_QUEUED.dec(pool=self.kind)
+            WORKER_THREADS_BUSY.inc(pool=self.kind)
+            self._record_wait((started_ns - submitted_ns) / 1e9)
+            try:
+                return fn(*args)
+            finally:
+                WORKER_THREADS_BUSY.dec(pool=self.kind)
+
+        WORKER_THREADS_QUEUED.inc(pool=self.kind)
+        future = self.submit(lambda: context.run(call))
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if not started and future.cancel():
+                WORKER_THREADS_QUEUED.dec(pool=self.kind)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        """Stop the pool's threads once they finish their current call."""
+        with self._lock:
+            self._shutdown = True
+            threads = list(self._threads)
+        if cancel_futures:
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[0].cancel()
+        for _ in threads:
+            self._queue.put(None)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+def get_thread_pool(kind: str) -> ThreadPool:
+    """Get the shared thread pool for a kind of work, creating it on first use."""
+    if kind not in THREAD_POOL_SIZES:
+        raise ValueError(
+            f"Unknown thread pool '{kind}'. Expected one of: "
+            f"{', '.join(THREAD_POOL_SIZES)}"
+        )
+    with _pools_lock:
+        pool = _thread_pools.get(kind)
+        if pool is None:
+            pool = ThreadPool(kind, THREAD_POOL_SIZES[kind], THREAD_POOL_AUTOSCALE)
+            _thread_pools[kind] = pool
+        return pool
+
+
+async def run_in_pool(kind: str, fn: Callable[..., Any], /, *args: Any) -> Any:
+    """Run a blocking call in the thread pool for `kind` ("remote", "fn" or "io")."""
+    return await get_thread_pool(kind).run(fn, *args)
+
+
+def get_process_pool(
+    initializer: Callable | None = None, initargs: tuple = ()
+) -> ProcessPoolExecutor:
+    """Get the shared process pool for an initializer, creating it on first use.
+
+    FnNodes with the same initializer and initargs share workers, so state set
+    up by the initializer (e.g. a loaded model) is reused across nodes.
+    """
+    key = (initializer, pickle.dumps(initargs))
+    with _pools_lock:
+        pool = _process_pools.get(key)
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=PROCESS_WORKERS,
+                initializer=initializer,
+                initargs=initargs,
+            )
+            _process_pools[key] = pool
+        return pool
+
+
+def shutdown_pools() -> None:
+    with _pools_lock:
+        pools = list(_process_pools.values()) + list(_thread_pools.values())
+        _process_pools.clear()
+        _thread_pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def check_picklable(obj: Any, what: str) -> None:
+    try:
+        pickle.dumps(obj)
+    except Exception as e:
+        raise ValueError(
+            f"{what} must be picklable to run in a process pool: {e}. "
+            f"Use a function defined at module level instead of a lambda or "
+            f"nested function."
+        ) from None
@@ -0,0 +1,189 @@
+"""Admission control for workflow runs.
+
+Every run started through the server (UI runs and `/api/call`) takes a slot
+in a `RunQueue` before it executes. At most `DAGGR_MAX_RUNS` runs execute at
+once; the rest wait, interactive UI runs ahead of API batch work and
+round-robin across users within each class. When `DAGGR_MAX_QUEUED_RUNS` runs
+are already waiting, new ones are turned away with a suggested retry delay,
+so a burst of requests degrades into queueing and 429s instead of thousands
+of simultaneous Space calls.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+from daggr._limiter import FairLimiter, QueueFull, _Waiter
+from daggr._utils import env_int
+from daggr.tracing import span
+
+MAX_RUNS = env_int("DAGGR_MAX_RUNS", 16, minimum=1)
+MAX_QUEUED_RUNS = env_int("DAGGR_MAX_QUEUED_RUNS", 256)
+QUEUE_POSITION_INTERVAL = 0.5
+
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class RunQueueFull(QueueFull):
+    """Raised when a run can't be queued.
+
+    Attributes:
+        retry_after: Suggested seconds to wait before retrying.
+    """
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RunTicket:
+    """A run's place in the queue. Use as an async context manager to wait
+    for its turn and hold the slot while it runs."""
+
+    def __init__(self, queue: RunQueue, run_id: str, user: str, waiter: _Waiter | None):
+        self.queue = queue
+        self.run_id = run_id
+        self.user = user
+        self._waiter = waiter
+        self._state = "running" if waiter is None else "queued"
+        self._started = time.monotonic() if waiter is None else None
+
+    @property
+    def position(self) -> int | None:
+        """Runs ahead of this one, or None once it's running."""
+        if self._state != "queued" or self._waiter.granted:
+            return None
+        return self.queue._limiter.position(self._waiter)
+
+    async def wait(self, on_position: Callable[[int], Any] | None = None) -> None:
+        """Wait for the run's turn, calling `on_position` when its position
+        in the queue changes."""
+        if self._state != "queued":
+            return
+        try:
+            with span("run_queue_wait", kind="wait"):
+                await self._wait(on_position)
+        except BaseException:
+            self.release()
+            raise
+        self._state = "running"
+        self._started = time.monotonic()
+
+    async def _wait(self, on_position: Callable[[int], Any] | None) -> None:
+        if on_position is None:
+            await self.queue._limiter.wait(self._waiter)
+            return
+        wait = asyncio.ensure_future(self.queue._limiter.wait(self._waiter))
+        last = None
+        try:
+            while not wait.done():
+                position = self.position
+                if position is not None and position != last:
+                    last = position
+                    await on_position(position)
+                await asyncio.wait({wait}, timeout=QUEUE_POSITION_INTERVAL)
+        finally:
+            if not wait.done():
+                wait.cancel()
+        await wait
+
+    def release(self) -> None:
+        """Free the run's slot, or give up its place if it's still queued.
+        Safe to call more than once."""
+        if self._state == "running":
+            self.queue._finish(self)
+        elif self._state == "queued":
+            self.queue._limiter.cancel(self._waiter)
+            self.queue._forget(self)
+        self._state = "done"
+
+    async def __aenter__(self) -> RunTicket:
+        await self.wait()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+
+class RunQueue:
+    """Bounded, prioritized, per-user fair queue of runs.
+
+    Args:
+        max_running: Max runs executing at once.
+        max_queued: Max runs waiting at once.
+    """
+
+    def __init__(self, max_running: int = MAX_RUNS, max_queued: int = MAX_QUEUED_RUNS):
+        if max_running < 1:
+            raise ValueError(f"max_running must be at least 1, got {max_running}")
+        self.max_running = max_running
+        self.max_queued = max_queued
+        self._limiter = FairLimiter("runs", max_running, max_waiting=max_queued)
+        self._tickets: dict[str, RunTicket] = {}
+        self._avg_duration: float | None = None
+        self._lock = threading.Lock()
+
+    def admit(self, run_id: str, user: str, priority: str = "batch") -> RunTicket:
+        """Queue a run. Raises RunQueueFull if the queue is full.
+
+        Args:
+            run_id: ID to report the run's queue position under.
+            user: Who the run is for, for fair queuing.
+            priority: "interactive" or "batch".
+        """
+        if priority not in PRIORITIES:
+            raise ValueError(
+                f"Invalid priority '{priority}'. Expected one of: "
+                f"{', '.join(PRIORITIES)}"
+            )
+        try:
+            waiter = self._limiter.enqueue(user, PRIORITIES[priority])
+        except QueueFull:
+            raise RunQueueFull(
+                f"Server is busy: {self.max_queued} runs are already queued",
+                self.retry_after(),
+            ) from None
+        ticket = RunTicket(self, run_id, user, waiter)
+        with self._lock:
+            self._tickets[run_id] = ticket
+        return ticket
+
+    def get(self, run_id: str) -> RunTicket | None:
+        with self._lock:
+            return self._tickets.get(run_id)
+
+    def retry_after(self) -> int:
+        """Estimate how many seconds until a new run would be admitted."""
+        avg = self._avg_duration or 1.0
+        waiting = self._limiter.waiting
+        return max(1, math.ceil(avg * (waiting + 1) / self.max_running))
+
+    def status(self) -> dict[str, int]:
+        return {
+            "running": self._limiter.active,
+            "queued": self._limiter.waiting,
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+        }
+
+    def _forget(self, ticket: RunTicket) -> None:
+        with self._lock:
+            if self._tickets.get(ticket.run_id) is ticket:
+                del self._tickets[ticket.run_id]
+
+    def _finish(self, ticket: RunTicket) -> None:
+        self._forget(ticket)
+        if ticket._started is not None:
+            duration = time.monotonic() - ticket._started
+            with self._lock:
+                self._avg_duration = (
+                    duration
+                    if self._avg_duration is None
+                    else 0.8 * self._avg_duration + 0.2 * duration
+                )
+        self._limiter.release()
@@ -0,0 +1,173 @@
+"""Streaming storage of files uploaded by the browser or API clients.
+
+Uploads arrive in chunks (multipart bodies on `/api/upload` or binary
+websocket frames) and are written to disk from a worker thread, into a temp
+file that is hashed as it's written and moved into the content-addressed file
+store once complete. Large files never sit in memory or block the event loop,
+and each upload is capped at `DAGGR_MAX_UPLOAD_SIZE`. A websocket connection
+can have at most `DAGGR_MAX_PENDING_UPLOADS` uploads in progress at once.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+from daggr._file_store import parse_size, store_file, temp_path
+from daggr._pools import run_in_pool
+from daggr._utils import env_int
+
+MAX_UPLOAD_SIZE = parse_size(os.getenv("DAGGR_MAX_UPLOAD_SIZE", "2GB"))
+MAX_PENDING_UPLOADS = env_int("DAGGR_MAX_PENDING_UPLOADS", 8, minimum=1)
+
+_EXTENSION_RE = re.compile(r"^\.[A-Za-z0-9]{1,16}$")
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds `MAX_UPLOAD_SIZE`."""
+
+
+class PendingUpload:
+    """A file being uploaded in chunks.
+
+    Args:
+        name: The client's file name. Only its extension is kept, so the
+            stored file has the right type.
+    """
+
+    def __init__(self, name: str | None = None):
+        ext = Path(name or "").suffix
+        if not _EXTENSION_RE.match(ext):
+            ext = ""
+        self.name = name
+        self.path: Path | None = None
+        self.size = 0
+        self._ext = ext.lower()
+        self._tmp_path = temp_path(self._ext)
+        self._hasher = hashlib.sha256()
+        self._file = None
+
+    def _write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._hasher.update(chunk)
+
+    async def write(self, chunk: bytes) -> None:
+        """Append a chunk. Raises UploadTooLarge past `MAX_UPLOAD_SIZE`."""
+        if MAX_UPLOAD_SIZE and self.size + len(chunk) > MAX_UPLOAD_SIZE:
+            raise UploadTooLarge(
+                f"Upload exceeds the maximum size of {MAX_UPLOAD_SIZE} bytes"
+            )
+        if self._file is None:
+            self._file = await run_in_pool("io", open, self._tmp_path, "wb")
+        await run_in_pool("io", self._write, chunk)
+        self.size += len(chunk)
+
+    async def finish(self) -> Path:
+        if self._file is None:
+            self._file = await run_in_pool("io", open, self._tmp_path, "wb")
+        await run_in_pool("io", self._file.close)
+        path = await run_in_pool(
+            "io", store_file, self._tmp_path, self._ext, self._hasher.hexdigest()
+        )
+        self.path = Path(path)
+        return self.path
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+    def to_handle(self, url: str) -> dict[str, Any]:
+        """Describe the stored file to the client that uploaded it."""
+        return {
+            "path": str(self.path),
+            "url": url,
+            "orig_name": self.name,
+            "size": self.size,
+        }
+
+
+async def receive_multipart(
+    content_type: str, body: AsyncIterator[bytes]
+) -> list[PendingUpload]:
+    """Store the files in a multipart/form-data body as it streams in.
+
+    Parts that aren't files are skipped. Files are finished as soon as their
+    part ends. If the body is malformed or a file is too large, the file being
+    written is discarded and the error is raised.
+
+    Args:
+        content_type: The request's Content-Type header, with the boundary.
+        body: The request body, in chunks.
+
+    Returns:
+        The finished uploads, in the order they were sent.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise ValueError("Expected a multipart/form-data body")
+
+    # The parser's callbacks are synchronous, so they only record what they
+    # saw; the writes happen after each chunk is parsed.
+    events: list[tuple[str, Any]] = []
+    header = {"field": b"", "value": b"", "disposition": b""}
+
+    def on_header_field(data: bytes, start: int, end: int):
+        header["field"] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        if header["field"].lower() == b"content-disposition":
+            header["disposition"] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(header["disposition"])
+        header["disposition"] = b""
+        filename = options.get(b"filename")
+        events.append(("start", None if filename is None else filename.decode()))
+
+    def on_part_data(data: bytes, start: int, end: int):
+        events.append(("data", bytes(data[start:end])))
+
+    callbacks = {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    parser = MultipartParser(boundary, callbacks)
+    uploads: list[PendingUpload] = []
+    current: PendingUpload | None = None
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            for kind, value in events:
+                if kind == "start":
+                    current = None if value is None else PendingUpload(value)
+                elif current is None:
+                    continue
+                elif kind == "data":
+                    await current.write(value)
+                else:
+                    await current.finish()
+                    uploads.append(current)
+                    current = None
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        if current is not None:
+            current.abort()
+        raise
+    return uploads
@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import difflib
+import os
+import warnings
 
 
 def suggest_similar(invalid: str, valid_options: set[str]) -> str | None:
@@ -17,3 +19,32 @@ def suggest_similar(invalid: str, valid_options: set[str]) -> str | None:
     """
     matches = difflib.get_close_matches(invalid, valid_options, n=1, cutoff=0.6)
     return matches[0] if matches else None
+
+
+def env_int(name: str, default: int, minimum: int = 0) -> int:
+    """Read an integer setting from the environment.
+
+    Args:
+        name: The environment variable.
+        default: Used when the variable is unset, or isn't an integer of at
+            least `minimum`, in which case a warning is issued.
+        minimum: The smallest accepted value.
+
+    Returns:
+        The parsed value, or `default`.
+    """
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        value = None
+    if value is None or value < minimum:
+        warnings.warn(
+            f"Ignoring {name}={raw!r}: expected an integer of at least {minimum}. "
+            f"Using {default}.",
+            stacklevel=2,
+        )
+        return default
+    return value
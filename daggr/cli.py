@@ -73,6 +73,9 @@ def main():
     if len(sys.argv) > 1 and sys.argv[1] == "deploy":
         _deploy_main()
         return
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        _cache_main()
+        return
 
     parser = argparse.ArgumentParser(
         prog="daggr",
@@ -243,6 +246,60 @@ def _deploy_main():
     )
 
 
+def _cache_main():
+    """Entry point for the cache subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="daggr cache",
+        description="Inspect and prune daggr's stored files",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("info", help="Show how much disk space stored files use")
+    prune_parser = subparsers.add_parser(
+        "prune",
+        help="Delete stored files that no saved result or input refers to",
+    )
+    prune_parser.add_argument(
+        "--max-size",
+        help="Delete least recently used files until at most this size is used, "
+        "e.g. 5GB (default: DAGGR_FILES_MAX_SIZE)",
+    )
+    prune_parser.add_argument(
+        "--older-than",
+        type=float,
+        metavar="DAYS",
+        help="Also delete files unused for this many days",
+    )
+    prune_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show what would be deleted without deleting anything",
+    )
+
+    args = parser.parse_args(sys.argv[2:])
+
+    from daggr._file_store import format_size, parse_size, prune, usage
+
+    if args.command == "info":
+        info = usage()
+        max_size = info["max_size"]
+        print(f"Location:    {info['path']}")
+        print(f"Files:       {info['files']} ({info['unique_files']} unique)")
+        print(f"Size:        {format_size(info['size'])}")
+        print(f"Referenced:  {format_size(info['referenced_size'])}")
+        print(f"Max size:    {format_size(max_size) if max_size > 0 else 'unlimited'}")
+        return
+
+    try:
+        max_size = parse_size(args.max_size) if args.max_size else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    older_than = args.older_than * 86400 if args.older_than is not None else None
+    stats = prune(max_size=max_size, older_than=older_than, dry_run=args.dry_run)
+    verb = "Would delete" if args.dry_run else "Deleted"
+    print(f"{verb} {stats['removed']} file(s), {format_size(stats['freed'])}")
+
+
 def _extract_graph(script_path: Path):
     """Extract the Graph object from a script without running it."""
     from daggr.graph import Graph
@@ -8,14 +8,38 @@ from __future__ import annotations
 
 import asyncio
 import base64
-import hashlib
-import uuid
+import contextlib
+import functools
+import io
+import time
+from collections.abc import AsyncIterator, Callable, Coroutine, Iterator
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
-from urllib.parse import urlparse
-
-from gradio_client.utils import is_file_obj_with_meta, traverse
 
+from gradio_client.utils import Status, is_file_obj_with_meta, traverse
+
+from daggr import _client_cache
+from daggr._batching import Batcher, get_batcher
+from daggr._cancellation import remaining_time, run_in_thread, wait_future
+from daggr._downloads import (
+    download_file,
+    has_lazy_files,
+    lazy_file,
+    materialize_files,
+    materialize_files_async,
+    materialize_in_background,
+)
+from daggr._file_store import store_bytes
+from daggr._limiter import LimiterSlot, get_limiter
+from daggr._pools import PROCESS_WORKERS, get_process_pool, run_in_pool
+from daggr._utils import env_int
+from daggr.metrics import (
+    NODE_DURATION,
+    NODES_IN_FLIGHT,
+    SCATTER_ITEMS,
+    SPACE_CALL_DURATION,
+    SPACE_CALLS_IN_FLIGHT,
+)
 from daggr.node import (
     ChoiceNode,
     FnNode,
@@ -23,41 +47,120 @@ from daggr.node import (
     InferenceNode,
     InputNode,
     InteractionNode,
+    Node,
 )
-from daggr.session import ExecutionSession
-from daggr.state import get_daggr_files_dir
+from daggr.result_cache import cached_call, input_fingerprint
+from daggr.session import ExecutionSession, ItemStream
+from daggr.tracing import is_tracing, record_span, span
 
 if TYPE_CHECKING:
     from daggr.graph import Graph
 
 
 class FileValue(str):
-    """A string subclass that marks a value as a file URL/path from Gradio output."""
+    """A string subclass that marks a value as a file path from Gradio output.
+
+    A FileValue with a `url` is lazy: it names the path the remote file will
+    be downloaded to, which may not exist yet. `hf_token` is the token needed
+    to download it, if any. See `daggr._downloads`.
+    """
+
+    url: str | None
+    hf_token: str | None
+
+    def __new__(cls, path: str, url: str | None = None, hf_token: str | None = None):
+        value = super().__new__(cls, path)
+        value.url = url
+        value.hf_token = hf_token
+        return value
+
+
+def _runs_on_loop(node: FnNode) -> bool:
+    """Whether a FnNode is awaited on the event loop rather than run in a thread."""
+    return node._is_async or node._batch or node._executor == "process"
+
+
+def _upstream_key(node: GradioNode | InferenceNode) -> str:
+    if isinstance(node, GradioNode):
+        return f"space:{node._src}"
+    return f"model:{node._model}"
+
+
+def _declared_upstream_limits(graph: Graph) -> dict[str, int]:
+    """The smallest `max_concurrency` declared for each Space or model."""
+    limits: dict[str, int] = {}
+    for node in graph.nodes.values():
+        variants = node._variants if isinstance(node, ChoiceNode) else [node]
+        for variant in variants:
+            if isinstance(variant, (GradioNode, InferenceNode)):
+                limit = variant._max_concurrency
+                if limit is not None:
+                    key = _upstream_key(variant)
+                    limits[key] = min(limits.get(key, limit), limit)
+    return limits
+
+
+class NodeExecutionError(RuntimeError):
+    """Raised by the scheduler when a node fails, recording which node it was."""
+
+    def __init__(self, node_name: str, error: BaseException):
+        super().__init__(str(error))
+        self.node_name = node_name
+        self.error = error
 
-    pass
 
+_NODE_DONE = object()
 
-def _download_file(url: str, hf_token: str | None = None) -> str:
-    import httpx
+DEFAULT_REMOTE_CONCURRENCY = env_int("DAGGR_REMOTE_CONCURRENCY", 16, minimum=1)
+JOB_POLL_MIN_INTERVAL = 0.05
+JOB_POLL_MAX_INTERVAL = 0.5
 
-    parsed = urlparse(url)
-    ext = Path(parsed.path).suffix or ".bin"
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:16]
-    filename = f"{url_hash}{ext}"
+# How a Space job's status maps onto the phases recorded in a run's trace.
+# Log messages don't change the phase.
+_JOB_PHASES = {
+    Status.STARTING: "remote_queue",
+    Status.JOINING_QUEUE: "remote_queue",
+    Status.QUEUE_FULL: "remote_queue",
+    Status.IN_QUEUE: "remote_queue",
+    Status.SENDING_DATA: "remote_upload",
+    Status.PROCESSING: "remote_processing",
+    Status.ITERATING: "remote_processing",
+    Status.PROGRESS: "remote_processing",
+    Status.FINISHED: None,
+    Status.CANCELLED: None,
+}
 
-    files_dir = get_daggr_files_dir()
-    local_path = files_dir / filename
 
-    if not local_path.exists():
-        headers = {}
-        if hf_token:
-            headers["Authorization"] = f"Bearer {hf_token}"
-        with httpx.Client(follow_redirects=True) as client:
-            response = client.get(url, headers=headers)
-            response.raise_for_status()
-            local_path.write_bytes(response.content)
+def _extract_item(item_result: Any, port: str) -> Any:
+    if isinstance(item_result, dict) and port in item_result:
+        return item_result[port]
+    return item_result
 
-    return str(local_path)
+
+def _is_item_error(item_result: Any, port: str) -> bool:
+    return (
+        isinstance(item_result, dict)
+        and "error" in item_result
+        and port not in item_result
+    )
+
+
+def _is_failed_item(item_result: Any) -> bool:
+    """Whether a scattered item's result is the error it failed with."""
+    return isinstance(item_result, dict) and set(item_result) == {"error"}
+
+
+def _get_scatter_items(source_result: Any, port: str) -> list[Any]:
+    """Get the items a scattered edge iterates over from its source's result.
+
+    If the source is itself scattered, its per-item results are used.
+    """
+    if source_result is None:
+        return []
+    if isinstance(source_result, dict) and "_scattered_results" in source_result:
+        return [_extract_item(r, port) for r in source_result["_scattered_results"]]
+    items = _extract_item(source_result, port)
+    return items if isinstance(items, list) else [items]
 
 
 def _postprocess_inference_result(task: str | None, result: Any) -> Any:
@@ -87,9 +190,7 @@ def _postprocess_inference_result(task: str | None, result: Any) -> Any:
         return result
     elif task in ("text-to-speech", "text-to-audio"):
         if isinstance(result, bytes):
-            file_path = get_daggr_files_dir() / f"{uuid.uuid4()}.wav"
-            file_path.write_bytes(result)
-            return str(file_path)
+            return store_bytes(result, ".wav")
         return result
     elif task in ("text-to-image", "image-to-image"):
         if isinstance(result, dict):
@@ -98,15 +199,21 @@ def _postprocess_inference_result(task: str | None, result: Any) -> Any:
             elif "image" in result:
                 result = result["image"]
         if hasattr(result, "save"):
-            file_path = get_daggr_files_dir() / f"{uuid.uuid4()}.png"
-            result.save(file_path)
-            return str(file_path)
+            buffer = io.BytesIO()
+            result.save(buffer, format="PNG")
+            return store_bytes(buffer.getvalue(), ".png")
         return result
 
     return result
 
 
-def _call_inference_task(client: Any, task: str | None, inputs: dict[str, Any]) -> Any:
+def _prepare_inference_call(
+    task: str | None, inputs: dict[str, Any]
+) -> tuple[str, Any, dict[str, Any]] | None:
+    """Pick the InferenceClient method and arguments for a task.
+
+    Returns (method_name, primary_input, kwargs), or None if there is no input.
+    """
     primary_input = None
     if task in (
         "image-to-image",
@@ -163,7 +270,6 @@ def _call_inference_task(client: Any, task: str | None, inputs: dict[str, Any])
     method_name = (
         task_method_map.get(task, "text_generation") if task else "text_generation"
     )
-    method = getattr(client, method_name, None)
 
     file_input_tasks = {
         "image-to-image",
@@ -181,25 +287,45 @@ def _call_inference_task(client: Any, task: str | None, inputs: dict[str, Any])
     if task in file_input_tasks and isinstance(primary_input, str):
         primary_input = _read_file_as_bytes(primary_input)
 
+    kwargs = {}
+    if task in ("image-to-image",):
+        kwargs["prompt"] = inputs.get("prompt", "")
+    elif task in ("visual-question-answering", "document-question-answering"):
+        kwargs["question"] = inputs.get("question", inputs.get("prompt", ""))
+    return method_name, primary_input, kwargs
+
+
+def _get_inference_method(
+    client: Any, method_name: str, kwargs: dict[str, Any]
+) -> tuple[Callable, dict[str, Any]]:
+    method = getattr(client, method_name, None)
+    if method is None:
+        return client.text_generation, {}
+    return method, kwargs
+
+
+def _unexpected_response_error(task: str | None, e: KeyError) -> RuntimeError:
+    return RuntimeError(
+        f"Provider returned unexpected response format for task '{task}'. "
+        f"Missing key: {e}. This model may require a specific provider "
+        f"(e.g., 'model_name:fal-ai' or 'model_name:replicate')."
+    )
+
+
+async def _call_inference_task_async(
+    client: Any, task: str | None, inputs: dict[str, Any]
+) -> Any:
+    """Call the InferenceClient method for `task` on an AsyncInferenceClient."""
+    call = await run_in_pool("remote", _prepare_inference_call, task, inputs)
+    if call is None:
+        return None
+    method_name, primary_input, kwargs = call
+    method, kwargs = _get_inference_method(client, method_name, kwargs)
     try:
-        if method is None:
-            result = client.text_generation(primary_input)
-        elif task in ("image-to-image",):
-            prompt = inputs.get("prompt", "")
-            result = method(primary_input, prompt=prompt)
-        elif task in ("visual-question-answering", "document-question-answering"):
-            question = inputs.get("question", inputs.get("prompt", ""))
-            result = method(primary_input, question=question)
-        else:
-            result = method(primary_input)
+        result = await method(primary_input, **kwargs)
     except KeyError as e:
-        raise RuntimeError(
-            f"Provider returned unexpected response format for task '{task}'. "
-            f"Missing key: {e}. This model may require a specific provider "
-            f"(e.g., 'model_name:fal-ai' or 'model_name:replicate')."
-        ) from e
-
-    return _postprocess_inference_result(task, result)
+        raise _unexpected_response_error(task, e) from e
+    return await run_in_pool("remote", _postprocess_inference_result, task, result)
 
 
 def _read_file_as_bytes(file_path: str) -> bytes:
@@ -218,6 +344,38 @@ def _read_file_as_bytes(file_path: str) -> bytes:
     return file_path
 
 
+@contextlib.contextmanager
+def _space_call(node: GradioNode) -> Iterator[None]:
+    """Record the latency of a job submitted to a Space."""
+    status = "error"
+    start = time.perf_counter()
+    SPACE_CALLS_IN_FLIGHT.inc(space=node._src)
+    try:
+        yield
+        status = "ok"
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    finally:
+        SPACE_CALLS_IN_FLIGHT.dec(space=node._src)
+        SPACE_CALL_DURATION.observe(
+            time.perf_counter() - start, space=node._src, status=status
+        )
+
+
+@contextlib.asynccontextmanager
+async def _holding(
+    semaphore: asyncio.Semaphore | LimiterSlot, kind: str
+) -> AsyncIterator[None]:
+    """Hold a semaphore, tracing the time spent waiting for it."""
+    with span("semaphore_wait", kind=kind):
+        await semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
 class AsyncExecutor:
     """Async executor for graph nodes.
 
@@ -229,12 +387,11 @@ class AsyncExecutor:
 
     def __init__(self, graph: Graph):
         self.graph = graph
+        self._upstream_limits = _declared_upstream_limits(graph)
 
     def _get_client_for_gradio_node(
         self, session: ExecutionSession, gradio_node, cache_key: str
     ):
-        from daggr import _client_cache
-
         token_cache_key = f"{cache_key}__token_{hash(session.hf_token or '')}"
         if token_cache_key in session.clients:
             return session.clients[token_cache_key]
@@ -271,11 +428,17 @@ class AsyncExecutor:
         session.clients[token_cache_key] = client
         return client
 
-    def _get_client(self, session: ExecutionSession, node_name: str):
+    def _get_client(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        variant_idx: int | None = None,
+    ):
         node = self.graph.nodes[node_name]
 
         if isinstance(node, ChoiceNode):
-            variant_idx = session.selected_variants.get(node_name, 0)
+            if variant_idx is None:
+                variant_idx = session.selected_variants.get(node_name, 0)
             variant = node._variants[variant_idx]
             if isinstance(variant, GradioNode):
                 cache_key = f"{node_name}__variant_{variant_idx}"
@@ -288,85 +451,61 @@ class AsyncExecutor:
         return self._get_client_for_gradio_node(session, node, node_name)
 
     def _get_scattered_input_edges(self, node_name: str) -> list:
-        scattered = []
-        for edge in self.graph._edges:
-            if edge.target_node._name == node_name and edge.is_scattered:
-                scattered.append(edge)
-        return scattered
+        return self.graph.get_plan().scattered_edges.get(node_name, [])
 
     def _get_gathered_input_edges(self, node_name: str) -> list:
-        gathered = []
-        for edge in self.graph._edges:
-            if edge.target_node._name == node_name and edge.is_gathered:
-                gathered.append(edge)
-        return gathered
+        return self.graph.get_plan().gathered_edges.get(node_name, [])
 
     def _prepare_inputs(
         self, session: ExecutionSession, node_name: str, skip_scattered: bool = False
     ) -> dict[str, Any]:
         inputs = {}
 
-        for edge in self.graph._edges:
-            if edge.target_node._name == node_name:
-                if skip_scattered and edge.is_scattered:
-                    continue
-
-                source_name = edge.source_node._name
-                source_output = edge.source_port
-                target_input = edge.target_port
-
-                if source_name in session.results:
-                    source_result = session.results[source_name]
-
-                    if (
-                        edge.is_gathered
-                        and isinstance(source_result, dict)
-                        and "_scattered_results" in source_result
-                    ):
-                        scattered_results = source_result["_scattered_results"]
-                        extracted = []
-                        for item_result in scattered_results:
-                            if (
-                                isinstance(item_result, dict)
-                                and source_output in item_result
-                            ):
-                                extracted.append(item_result[source_output])
-                            else:
-                                extracted.append(item_result)
-                        inputs[target_input] = extracted
-                    elif (
-                        isinstance(source_result, dict)
-                        and source_output in source_result
-                    ):
-                        inputs[target_input] = source_result[source_output]
-                    elif isinstance(source_result, (list, tuple)):
-                        try:
-                            output_idx = int(
-                                source_output.replace("output_", "").replace(
-                                    "output", "0"
-                                )
-                            )
-                            if 0 <= output_idx < len(source_result):
-                                inputs[target_input] = source_result[output_idx]
-                        except (ValueError, TypeError):
-                            if len(source_result) > 0:
-                                inputs[target_input] = source_result[0]
-                    else:
-                        inputs[target_input] = source_result
+        for edge in self.graph.get_plan().incoming.get(node_name, []):
+            if skip_scattered and edge.is_scattered:
+                continue
+
+            source_name = edge.source_node._name
+            source_output = edge.source_port
+            target_input = edge.target_port
+
+            if source_name in session.results:
+                source_result = session.results[source_name]
+
+                if (
+                    edge.is_gathered
+                    and isinstance(source_result, dict)
+                    and "_scattered_results" in source_result
+                ):
+                    scattered_results = source_result["_scattered_results"]
+                    extracted = []
+                    for item_result in scattered_results:
+                        if (
+                            isinstance(item_result, dict)
+                            and source_output in item_result
+                        ):
+                            extracted.append(item_result[source_output])
+                        else:
+                            extracted.append(item_result)
+                    inputs[target_input] = extracted
+                elif isinstance(source_result, dict) and source_output in source_result:
+                    inputs[target_input] = source_result[source_output]
+                elif isinstance(source_result, (list, tuple)):
+                    try:
+                        output_idx = int(
+                            source_output.replace("output_", "").replace("output", "0")
+                        )
+                        if 0 <= output_idx < len(source_result):
+                            inputs[target_input] = source_result[output_idx]
+                    except (ValueError, TypeError):
+                        if len(source_result) > 0:
+                            inputs[target_input] = source_result[0]
+                else:
+                    inputs[target_input] = source_result
 
         return inputs
 
-    def _execute_single_node_sync(
-        self, session: ExecutionSession, node_name: str, inputs: dict[str, Any]
-    ) -> Any:
-        """Synchronous node execution (called from thread pool for FnNode)."""
-        node = self.graph.nodes[node_name]
-
-        if isinstance(node, ChoiceNode):
-            variant_idx = session.selected_variants.get(node_name, 0)
-            variant = node._variants[variant_idx]
-            return self._execute_variant_node_sync(session, node_name, variant, inputs)
-
+    def _collect_inputs(self, node, inputs: dict[str, Any]) -> dict[str, Any]:
         all_inputs = {}
         for port_name, value in node._fixed_inputs.items():
             all_inputs[port_name] = value() if callable(value) else value
@@ -377,60 +516,467 @@ class AsyncExecutor:
                     val = val["path"]
                 all_inputs[port_name] = val
         all_inputs.update(inputs)
+        return all_inputs
+
+    def _get_fn_kwargs(self, node: FnNode, all_inputs: dict[str, Any]) -> dict:
+        fn_kwargs = {}
+        for port_name in node._input_ports:
+            if port_name in all_inputs:
+                fn_kwargs[port_name] = all_inputs[port_name]
+        if node._preprocess:
+            fn_kwargs = node._preprocess(fn_kwargs)
+        return fn_kwargs
+
+    def _finish_fn_result(self, node: FnNode, raw_result: Any) -> Any:
+        with span("map_result"):
+            if node._postprocess:
+                raw_result = self._apply_postprocess(node._postprocess, raw_result)
+            return self._map_fn_result(node, raw_result)
 
-        if isinstance(node, GradioNode):
-            client = self._get_client(session, node_name)
-            if client:
-                api_name = node._api_name or "/predict"
-                if not api_name.startswith("/"):
-                    api_name = "/" + api_name
-                call_inputs = {
-                    k: self._wrap_file_input(v)
-                    for k, v in all_inputs.items()
-                    if k in node._input_ports
-                }
-                if node._preprocess:
-                    call_inputs = node._preprocess(call_inputs)
-                raw_result = client.predict(api_name=api_name, **call_inputs)
-                if node._postprocess:
-                    raw_result = self._apply_postprocess(node._postprocess, raw_result)
-                result = self._map_gradio_result(
-                    node, raw_result, hf_token=session.hf_token
-                )
-            else:
-                result = None
+    async def _execute_async_fn_node(
+        self, session: ExecutionSession, node: FnNode, inputs: dict[str, Any]
+    ) -> Any:
+        """Run an `async def`, batched or process FnNode without holding a
+        worker thread."""
+        all_inputs = self._collect_inputs(node, inputs)
+        await materialize_files_async(all_inputs)
+
+        cached = await self._get_cached_call(session, node, all_inputs)
+        if cached is not None:
+            hit, result = await run_in_pool("io", cached.get)
+            if hit:
+                return result
+
+        fn_kwargs = self._get_fn_kwargs(node, all_inputs)
+        if node._batch:
+            future = self._get_batcher(node).submit(fn_kwargs)
+            raw_result = await asyncio.wrap_future(future)
+        elif node._executor == "process":
+            pool = get_process_pool(node._initializer, node._initargs)
+            raw_result = await asyncio.wrap_future(pool.submit(node._fn, **fn_kwargs))
+        else:
+            raw_result = await node._fn(**fn_kwargs)
+        result = self._finish_fn_result(node, raw_result)
 
-        elif isinstance(node, FnNode):
-            fn_kwargs = {}
-            for port_name in node._input_ports:
-                if port_name in all_inputs:
-                    fn_kwargs[port_name] = all_inputs[port_name]
-            if node._preprocess:
-                fn_kwargs = node._preprocess(fn_kwargs)
-            raw_result = node._fn(**fn_kwargs)
+        if cached is not None and result is not None:
+            await run_in_pool("io", cached.put, result)
+        return result
+
+    def _get_api_name(self, node: GradioNode) -> str:
+        api_name = node._api_name or "/predict"
+        if not api_name.startswith("/"):
+            api_name = "/" + api_name
+        return api_name
+
+    def _get_gradio_call_inputs(
+        self, node: GradioNode, all_inputs: dict[str, Any]
+    ) -> dict[str, Any]:
+        if node._preprocess:
+            # preprocess may read the files, so they must be local.
+            materialize_files(all_inputs)
+        call_inputs = {
+            k: self._wrap_file_input(v)
+            for k, v in all_inputs.items()
+            if k in node._input_ports
+        }
+        if node._preprocess:
+            call_inputs = node._preprocess(call_inputs)
+        return call_inputs
+
+    def _finish_gradio_result(
+        self, node: GradioNode, raw_result: Any, hf_token: str | None
+    ) -> Any:
+        with span("map_result"):
             if node._postprocess:
                 raw_result = self._apply_postprocess(node._postprocess, raw_result)
-            result = self._map_fn_result(node, raw_result)
+            return self._map_gradio_result(node, raw_result, hf_token=hf_token)
 
-        elif isinstance(node, InferenceNode):
-            from huggingface_hub import InferenceClient
+    async def _put_cached(self, cached, result: Any):
+        # Disk entries only store paths, so lazy files must be downloaded
+        # before the entry is written.
+        if cached.store.disk_dir is not None and has_lazy_files(result):
+            materialize_in_background(result, lambda: cached.put(result))
+        else:
+            await run_in_pool("io", cached.put, result)
 
-            if not node._task_fetched:
-                node._fetch_model_info()
-            client = InferenceClient(
-                model=node._model_name_for_hub,
-                provider=node._provider,
-                token=session.hf_token,
-            )
-            inference_inputs = {
-                k: v for k, v in all_inputs.items() if k in node._input_ports
-            }
-            if node._preprocess:
-                inference_inputs = node._preprocess(inference_inputs)
-            raw_result = _call_inference_task(client, node._task, inference_inputs)
+    async def _get_cached_call(
+        self, session: ExecutionSession, node, all_inputs: dict[str, Any]
+    ):
+        if node._cache is None:
+            return None
+        return await run_in_pool("io", cached_call, session, node, all_inputs)
+
+    def _get_inference_inputs(
+        self, node: InferenceNode, all_inputs: dict[str, Any]
+    ) -> dict[str, Any]:
+        inference_inputs = {
+            k: v for k, v in all_inputs.items() if k in node._input_ports
+        }
+        if node._preprocess:
+            inference_inputs = node._preprocess(inference_inputs)
+        return inference_inputs
+
+    def _finish_inference_result(self, node: InferenceNode, raw_result: Any) -> Any:
+        with span("map_result"):
             if node._postprocess:
                 raw_result = self._apply_postprocess(node._postprocess, raw_result)
-            result = self._map_inference_result(node, raw_result)
+            return self._map_inference_result(node, raw_result)
+
+    async def _execute_inference_node(
+        self, session: ExecutionSession, node: InferenceNode, inputs: dict[str, Any]
+    ) -> Any:
+        """Call an InferenceNode with a pooled AsyncInferenceClient."""
+        all_inputs = self._collect_inputs(node, inputs)
+        await materialize_files_async(all_inputs)
+
+        cached = await self._get_cached_call(session, node, all_inputs)
+        if cached is not None:
+            hit, result = await run_in_pool("io", cached.get)
+            if hit:
+                return result
+
+        if not node._task_fetched:
+            await run_in_pool("remote", node._fetch_model_info)
+        client = _client_cache.get_async_inference_client(
+            node._model_name_for_hub, node._provider, session.hf_token
+        )
+        inference_inputs = self._get_inference_inputs(node, all_inputs)
+        raw_result = await _call_inference_task_async(
+            client, node._task, inference_inputs
+        )
+        result = await run_in_pool(
+            "remote", self._finish_inference_result, node, raw_result
+        )
+
+        if cached is not None and result is not None:
+            await run_in_pool("io", cached.put, result)
+        return result
+
+    async def _execute_gradio_node(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+        variant_idx: int | None = None,
+    ) -> Any:
+        """Submit a GradioNode call as a Job and wait for it without a thread.
+
+        `variant_idx` selects a GradioNode variant when `node_name` is a
+        ChoiceNode.
+        """
+        node = self.graph.nodes[node_name]
+        if variant_idx is not None:
+            node = node._variants[variant_idx]
+        all_inputs = self._collect_inputs(node, inputs)
+
+        cached = await self._get_cached_call(session, node, all_inputs)
+        if cached is not None:
+            hit, result = await run_in_pool("io", cached.get)
+            if hit:
+                return result
+
+        client = await run_in_pool(
+            "remote", self._get_client, session, node_name, variant_idx
+        )
+        if client is None:
+            return None
+        call_inputs = await run_in_pool(
+            "remote", self._get_gradio_call_inputs, node, all_inputs
+        )
+        with _space_call(node):
+            job = client.submit(api_name=self._get_api_name(node), **call_inputs)
+            raw_result = await self._wait_for_job(
+                job, session, node_name, on_event, node
+            )
+        result = await run_in_pool(
+            "remote", self._finish_gradio_result, node, raw_result, session.hf_token
+        )
+
+        if cached is not None and result is not None:
+            await self._put_cached(cached, result)
+        return result
+
+    async def _wait_for_job(
+        self,
+        job,
+        session: ExecutionSession,
+        node_name: str,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+        node: GradioNode | None = None,
+    ) -> Any:
+        """Wait for a gradio_client Job to finish, reporting progress.
+
+        Completion is awaited directly on the job's future. When events or
+        tracing are wanted, a side task polls the job's status to emit
+        `node_status` events when the queue position or progress changes and
+        `node_partial` events for each intermediate output of a generator
+        endpoint. The job is cancelled if the wait is cancelled.
+        """
+        if node is None:
+            node = self.graph.nodes[node_name]
+        tracing = is_tracing()
+        phases: list[tuple[str, int]] = []
+        watcher = None
+        if on_event is not None or tracing:
+            watcher = asyncio.create_task(
+                self._watch_job(job, session, node, node_name, on_event, phases)
+            )
+        try:
+            return await asyncio.wrap_future(job.future)
+        except asyncio.CancelledError:
+            await run_in_pool("remote", job.cancel)
+            raise
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await watcher
+            if phases:
+                phase, phase_start = phases[-1]
+                record_span(phase, phase_start, time.time_ns())
+
+    async def _watch_job(
+        self,
+        job,
+        session: ExecutionSession,
+        node: GradioNode,
+        node_name: str,
+        on_event: Callable[[dict[str, Any]], None] | None,
+        phases: list[tuple[str, int]],
+    ) -> None:
+        """Poll a running job's status until cancelled by `_wait_for_job`.
+
+        Trace phases are appended to `phases` as `(phase, start_ns)`; every
+        phase but the last is recorded here, the last one by the caller.
+        """
+        delay = JOB_POLL_MIN_INTERVAL
+        last_status = None
+        outputs_seen = 0
+        while True:
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.5, JOB_POLL_MAX_INTERVAL)
+            status = job.status()
+            new_phase = _JOB_PHASES.get(status.code)
+            if new_phase is not None and (not phases or phases[-1][0] != new_phase):
+                now = time.time_ns()
+                if phases:
+                    record_span(phases[-1][0], phases[-1][1], now)
+                phases.append((new_phase, now))
+            if on_event is None:
+                continue
+
+            progress = None
+            if status.progress_data:
+                unit = status.progress_data[-1]
+                progress = unit.progress
+                if progress is None and unit.index is not None and unit.length:
+                    progress = unit.index / unit.length
+            status_key = (status.code, status.rank, status.queue_size, progress)
+            if status_key != last_status:
+                last_status = status_key
+                on_event(
+                    {
+                        "type": "node_status",
+                        "node": node_name,
+                        "status": status.code.value,
+                        "rank": status.rank,
+                        "queue_size": status.queue_size,
+                        "eta": status.eta,
+                        "progress": progress,
+                    }
+                )
+
+            outputs = job.outputs()
+            if len(outputs) > outputs_seen and not job.done():
+                outputs_seen = len(outputs)
+                delay = JOB_POLL_MIN_INTERVAL
+                try:
+                    partial = await run_in_pool(
+                        "remote",
+                        self._finish_gradio_result,
+                        node,
+                        outputs[-1],
+                        session.hf_token,
+                    )
+                except Exception:
+                    continue
+                on_event({"type": "node_partial", "node": node_name, "result": partial})
+
+    async def _run_remote_node(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Any:
+        node = self.graph.nodes[node_name]
+        if isinstance(node, GradioNode):
+            return await self._execute_gradio_node(session, node_name, inputs, on_event)
+        return await self._execute_inference_node(session, node, inputs)
+
+    async def _run_fn_node(
+        self, session: ExecutionSession, node_name: str, inputs: dict[str, Any]
+    ) -> Any:
+        node = self.graph.nodes[node_name]
+        if isinstance(node, FnNode) and _runs_on_loop(node):
+            return await self._execute_async_fn_node(session, node, inputs)
+        return await run_in_thread(
+            self._execute_single_node_sync, session, node_name, inputs
+        )
+
+    async def _run_choice_node(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Any:
+        node = self.graph.nodes[node_name]
+        if node._race and len(node._variants) > 1:
+            return await self._race_variants(session, node_name, inputs, on_event)
+        variant_idx = session.selected_variants.get(node_name, 0)
+        return await self._run_variant(
+            session, node_name, variant_idx, inputs, on_event
+        )
+
+    async def _run_variant(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        variant_idx: int,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Any:
+        node = self.graph.nodes[node_name]
+        variant = node._variants[variant_idx]
+        start_time = time.time()
+        result = await self._with_timeout(
+            variant,
+            self._dispatch_variant(session, node_name, variant_idx, inputs, on_event),
+        )
+        node._record_latency(variant_idx, time.time() - start_time)
+        return result
+
+    async def _dispatch_variant(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        variant_idx: int,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Any:
+        variant = self.graph.nodes[node_name]._variants[variant_idx]
+        if isinstance(variant, (GradioNode, InferenceNode)):
+            semaphore = await self._get_upstream_semaphore(session, variant)
+            async with _holding(semaphore, "upstream"):
+                if isinstance(variant, GradioNode):
+                    return await self._execute_gradio_node(
+                        session, node_name, inputs, on_event, variant_idx
+                    )
+                return await self._execute_inference_node(session, variant, inputs)
+        if isinstance(variant, FnNode) and _runs_on_loop(variant):
+            return await self._execute_async_fn_node(session, variant, inputs)
+        return await run_in_thread(
+            self._execute_variant_node_sync, session, node_name, variant, inputs
+        )
+
+    async def _race_variants(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Any:
+        """Run a racing ChoiceNode's variants and return the first success.
+
+        The selected variant starts first. The others start after the node's
+        hedge delay, or as soon as the selected variant fails. Variants still
+        running when one succeeds are cancelled. The winner is recorded in
+        `session.race_winners` and reported with a `variant_won` event.
+        """
+        node = self.graph.nodes[node_name]
+        primary = session.selected_variants.get(node_name, 0)
+        backups = [i for i in range(len(node._variants)) if i != primary]
+        hedge_delay = node._get_hedge_delay(primary)
+        loop = asyncio.get_running_loop()
+        hedge_at = None if hedge_delay is None else loop.time() + hedge_delay
+        running: dict[asyncio.Task, int] = {}
+        errors: list[str] = []
+
+        def start(variant_idx: int):
+            # Only the selected variant reports queue status and partial
+            # outputs, so the UI doesn't interleave several jobs.
+            task = asyncio.ensure_future(
+                self._run_variant(
+                    session,
+                    node_name,
+                    variant_idx,
+                    inputs,
+                    on_event if variant_idx == primary else None,
+                )
+            )
+            running[task] = variant_idx
+
+        start(primary)
+        try:
+            while running or backups:
+                if backups and (not running or hedge_delay == 0):
+                    for variant_idx in backups:
+                        start(variant_idx)
+                    backups = []
+                timeout = None
+                if backups and hedge_at is not None:
+                    timeout = max(hedge_at - loop.time(), 0)
+                done, _ = await asyncio.wait(
+                    running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedge_delay = 0
+                    continue
+                for task in done:
+                    variant_idx = running.pop(task)
+                    if task.exception() is not None:
+                        variant = node._variants[variant_idx]
+                        errors.append(f"{variant._name}: {task.exception()}")
+                        continue
+                    session.race_winners[node_name] = variant_idx
+                    if on_event:
+                        on_event(
+                            {
+                                "type": "variant_won",
+                                "node": node_name,
+                                "variant": variant_idx,
+                                "variant_name": node._variants[variant_idx]._name,
+                            }
+                        )
+                    return task.result()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        raise RuntimeError(f"All variants failed: {'; '.join(errors)}")
+
+    def _execute_single_node_sync(
+        self, session: ExecutionSession, node_name: str, inputs: dict[str, Any]
+    ) -> Any:
+        """Synchronous node execution (called from thread pool for FnNode)."""
+        node = self.graph.nodes[node_name]
+        all_inputs = self._collect_inputs(node, inputs)
+        if isinstance(node, FnNode):
+            materialize_files(all_inputs)
+
+        cached = cached_call(session, node, all_inputs)
+        if cached is not None:
+            hit, result = cached.get()
+            if hit:
+                return result
+
+        if isinstance(node, FnNode):
+            fn_kwargs = self._get_fn_kwargs(node, all_inputs)
+            raw_result = self._call_fn(node, fn_kwargs)
+            result = self._finish_fn_result(node, raw_result)
 
         elif isinstance(node, InteractionNode):
             result = all_inputs.get(
@@ -446,6 +992,9 @@ class AsyncExecutor:
         else:
             result = None
 
+        if cached is not None and result is not None:
+            cached.put(result)
+
         return result
 
     def _execute_variant_node_sync(
@@ -455,72 +1004,25 @@ class AsyncExecutor:
         variant,
         inputs: dict[str, Any],
     ) -> Any:
-        all_inputs = {}
-        for port_name, value in variant._fixed_inputs.items():
-            all_inputs[port_name] = value() if callable(value) else value
-        for port_name, component in variant._input_components.items():
-            if hasattr(component, "value"):
-                val = component.value
-                if is_file_obj_with_meta(val):
-                    val = val["path"]
-                all_inputs[port_name] = val
-        all_inputs.update(inputs)
-
-        if isinstance(variant, GradioNode):
-            client = self._get_client(session, node_name)
-            if client:
-                api_name = variant._api_name or "/predict"
-                if not api_name.startswith("/"):
-                    api_name = "/" + api_name
-                call_inputs = {
-                    k: self._wrap_file_input(v)
-                    for k, v in all_inputs.items()
-                    if k in variant._input_ports
-                }
-                if variant._preprocess:
-                    call_inputs = variant._preprocess(call_inputs)
-                raw_result = client.predict(api_name=api_name, **call_inputs)
-                if variant._postprocess:
-                    raw_result = self._apply_postprocess(
-                        variant._postprocess, raw_result
-                    )
-                result = self._map_gradio_result(
-                    variant, raw_result, hf_token=session.hf_token
-                )
-            else:
-                result = None
-
-        elif isinstance(variant, FnNode):
-            fn_kwargs = {}
-            for port_name in variant._input_ports:
-                if port_name in all_inputs:
-                    fn_kwargs[port_name] = all_inputs[port_name]
-            if variant._preprocess:
-                fn_kwargs = variant._preprocess(fn_kwargs)
-            raw_result = variant._fn(**fn_kwargs)
-            if variant._postprocess:
-                raw_result = self._apply_postprocess(variant._postprocess, raw_result)
-            result = self._map_fn_result(variant, raw_result)
-
-        elif isinstance(variant, InferenceNode):
-            from huggingface_hub import InferenceClient
-
-            if not variant._task_fetched:
-                variant._fetch_model_info()
-            client = InferenceClient(
-                model=variant._model_name_for_hub,
-                provider=variant._provider,
-                token=session.hf_token,
-            )
-            inference_inputs = {
-                k: v for k, v in all_inputs.items() if k in variant._input_ports
-            }
-            if variant._preprocess:
-                inference_inputs = variant._preprocess(inference_inputs)
-            raw_result = _call_inference_task(client, variant._task, inference_inputs)
-            if variant._postprocess:
-                raw_result = self._apply_postprocess(variant._postprocess, raw_result)
-            result = self._map_inference_result(variant, raw_result)
+        """Run a variant that isn't a remote call in a worker thread.
+
+        GradioNode and InferenceNode variants are always run by
+        `_dispatch_variant` on the event loop, with the variant's own client.
+        """
+        all_inputs = self._collect_inputs(variant, inputs)
+        if isinstance(variant, FnNode):
+            materialize_files(all_inputs)
+
+        cached = cached_call(session, variant, all_inputs)
+        if cached is not None:
+            hit, result = cached.get()
+            if hit:
+                return result
+
+        if isinstance(variant, FnNode):
+            fn_kwargs = self._get_fn_kwargs(variant, all_inputs)
+            raw_result = self._call_fn(variant, fn_kwargs)
+            result = self._finish_fn_result(variant, raw_result)
 
         elif isinstance(variant, InputNode):
             result = {}
@@ -531,23 +1033,95 @@ class AsyncExecutor:
         else:
             result = None
 
+        if cached is not None and result is not None:
+            if cached.store.disk_dir is not None:
+                materialize_files(result)
+            cached.put(result)
+
         return result
 
+    async def _with_timeout(self, node: Node, coro: Coroutine[Any, Any, Any]) -> Any:
+        """Await `coro`, cut off at the node's timeout or the run's deadline.
+
+        Cancelling `coro` also cancels the remote job or thread wait it's in.
+        """
+        timeout = node._timeout
+        remaining = remaining_time()
+        if remaining is not None and (timeout is None or remaining < timeout):
+            if remaining <= 0:
+                coro.close()
+                raise TimeoutError("run deadline exceeded")
+            try:
+                return await asyncio.wait_for(coro, remaining)
+            except asyncio.TimeoutError:
+                raise TimeoutError("run deadline exceeded") from None
+        if timeout is None:
+            return await coro
+        try:
+            return await asyncio.wait_for(coro, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"timed out after {timeout:g}s") from None
+
     async def execute_node(
         self,
         session: ExecutionSession,
         node_name: str,
         user_inputs: dict[str, Any] | None = None,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
     ) -> Any:
-        """Execute a single node with proper concurrency control."""
+        """Execute a single node with proper concurrency control.
+
+        Args:
+            session: The session to execute in.
+            node_name: Name of the node to execute.
+            user_inputs: Values for the node's input ports, overriding
+                upstream results.
+            on_event: Optional callback for progress events emitted while the
+                node runs. Scattered nodes emit an `item_complete` event as
+                each item finishes; GradioNodes emit `node_status` (queue
+                position, progress) and `node_partial` (intermediate output)
+                events; racing ChoiceNodes emit `variant_won`.
+        """
         node = self.graph.nodes[node_name]
-        scattered_edges = self._get_scattered_input_edges(node_name)
+        node_type = type(node).__name__
+        status = "error"
+        start = time.perf_counter()
+        NODES_IN_FLIGHT.inc(node=node_name)
+        try:
+            with span(node_name, kind="node", node_type=node_type):
+                result = await self._execute_node(
+                    session, node, node_name, user_inputs, on_event
+                )
+            status = "ok"
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            NODES_IN_FLIGHT.dec(node=node_name)
+            NODE_DURATION.observe(
+                time.perf_counter() - start,
+                node=node_name,
+                node_type=node_type,
+                status=status,
+            )
+        session.results[node_name] = result
+        return result
 
+    async def _execute_node(
+        self,
+        session: ExecutionSession,
+        node: Node,
+        node_name: str,
+        user_inputs: dict[str, Any] | None,
+        on_event: Callable[[dict[str, Any]], None] | None,
+    ) -> Any:
+        scattered_edges = self._get_scattered_input_edges(node_name)
         if scattered_edges:
-            result = await self._execute_scattered_node(
-                session, node_name, scattered_edges, user_inputs
+            return await self._execute_scattered_node(
+                session, node_name, scattered_edges, user_inputs, on_event
             )
-        else:
+
+        with span("prepare_inputs"):
             inputs = self._prepare_inputs(session, node_name)
             if user_inputs:
                 if isinstance(user_inputs, dict):
@@ -558,38 +1132,37 @@ class AsyncExecutor:
                     else:
                         inputs["input"] = user_inputs
 
-            try:
-                if isinstance(node, (GradioNode, InferenceNode)):
-                    result = await asyncio.to_thread(
-                        self._execute_single_node_sync, session, node_name, inputs
-                    )
-                elif isinstance(node, FnNode):
-                    semaphore = await session.concurrency.get_semaphore(
-                        node._concurrent,
-                        node._concurrency_group,
-                        node._max_concurrent,
-                    )
-                    if semaphore:
-                        async with semaphore:
-                            result = await asyncio.to_thread(
-                                self._execute_single_node_sync,
-                                session,
-                                node_name,
-                                inputs,
-                            )
-                    else:
-                        result = await asyncio.to_thread(
-                            self._execute_single_node_sync, session, node_name, inputs
-                        )
-                else:
-                    result = await asyncio.to_thread(
-                        self._execute_single_node_sync, session, node_name, inputs
-                    )
-            except Exception as e:
-                raise RuntimeError(f"Error executing node '{node_name}': {e}")
+        try:
+            return await self._with_timeout(
+                node, self._dispatch_node(session, node_name, inputs, on_event)
+            )
+        except TimeoutError as e:
+            raise TimeoutError(f"Error executing node '{node_name}': {e}") from None
+        except Exception as e:
+            raise RuntimeError(f"Error executing node '{node_name}': {e}")
 
-        session.results[node_name] = result
-        return result
+    async def _dispatch_node(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        inputs: dict[str, Any],
+        on_event: Callable[[dict[str, Any]], None] | None = None,
+    ) -> Any:
+        node = self.graph.nodes[node_name]
+        if isinstance(node, (GradioNode, InferenceNode)):
+            semaphore = await self._get_upstream_semaphore(session, node)
+            async with _holding(semaphore, "upstream"):
+                return await self._run_remote_node(session, node_name, inputs, on_event)
+        elif isinstance(node, FnNode):
+            async with contextlib.AsyncExitStack() as stack:
+                for limit in await self._get_fn_limits(session, node_name, node):
+                    await stack.enter_async_context(_holding(limit, "concurrency"))
+                return await self._run_fn_node(session, node_name, inputs)
+        elif isinstance(node, ChoiceNode):
+            return await self._run_choice_node(session, node_name, inputs, on_event)
+        return await run_in_thread(
+            self._execute_single_node_sync, session, node_name, inputs
+        )
 
     async def _execute_scattered_node(
         self,
@@ -597,27 +1170,44 @@ class AsyncExecutor:
         node_name: str,
         scattered_edges: list,
         user_inputs: dict[str, Any] | None = None,
+        on_event: Callable[[dict[str, Any]], None] | None = None,
     ) -> dict[str, list[Any]]:
         first_edge = scattered_edges[0]
         source_name = first_edge.source_node._name
         source_port = first_edge.source_port
 
-        source_result = session.results.get(source_name)
-        if source_result is None:
-            items = []
-        elif isinstance(source_result, dict) and source_port in source_result:
-            items = source_result[source_port]
+        # If the source is a scattered node that is still running, take its
+        # items from its stream as they finish instead of waiting for all.
+        stream = None
+        if source_name not in session.results:
+            stream = session.item_streams.get(source_name)
+        total = await stream.wait_total() if stream is not None else None
+        if total is None:
+            stream = None
+            source_result = session.results.get(source_name)
+            items = _get_scatter_items(source_result, source_port)
+            upstream_results = (
+                source_result["_scattered_results"]
+                if isinstance(source_result, dict)
+                and "_scattered_results" in source_result
+                else None
+            )
         else:
-            items = source_result
+            items = [None] * total
+            upstream_results = None
 
-        if not isinstance(items, list):
-            items = [items]
+        own_stream = session.item_streams.get(node_name)
+        if own_stream is not None:
+            own_stream.set_total(len(items))
+        SCATTER_ITEMS.observe(len(items), node=node_name)
 
         context_inputs = self._prepare_inputs(session, node_name, skip_scattered=True)
         if user_inputs:
             context_inputs.update(user_inputs)
 
         node = self.graph.nodes[node_name]
+        is_remote = isinstance(node, (GradioNode, InferenceNode))
+        reusable = session.reusable_items.pop(node_name, {})
 
         async def execute_item(item, idx):
             item_inputs = dict(context_inputs)
@@ -629,55 +1219,163 @@ class AsyncExecutor:
                 else:
                     item_inputs[target_port] = item
 
+            stored = reusable.get(idx)
+            if stored is not None or session.keep_item_results:
+                fingerprints[idx] = await run_in_pool(
+                    "io", input_fingerprint, node, item_inputs, {}
+                )
+            if (
+                stored is not None
+                and fingerprints[idx] is not None
+                and stored[0] == fingerprints[idx]
+                and not _is_failed_item(stored[1])
+            ):
+                reused.add(idx)
+                return stored[1]
+
             try:
-                if isinstance(node, (GradioNode, InferenceNode)):
-                    return await asyncio.to_thread(
-                        self._execute_single_node_sync, session, node_name, item_inputs
-                    )
-                elif isinstance(node, FnNode):
-                    semaphore = await session.concurrency.get_semaphore(
-                        node._concurrent,
-                        node._concurrency_group,
-                        node._max_concurrent,
-                    )
-                    if semaphore:
-                        async with semaphore:
-                            return await asyncio.to_thread(
-                                self._execute_single_node_sync,
-                                session,
-                                node_name,
-                                item_inputs,
-                            )
-                    else:
-                        return await asyncio.to_thread(
-                            self._execute_single_node_sync,
-                            session,
-                            node_name,
-                            item_inputs,
-                        )
-                else:
-                    return await asyncio.to_thread(
-                        self._execute_single_node_sync, session, node_name, item_inputs
-                    )
+                return await self._with_timeout(
+                    node, self._dispatch_node(session, node_name, item_inputs)
+                )
             except Exception as e:
                 return {"error": str(e)}
 
-        if isinstance(node, (GradioNode, InferenceNode)):
-            tasks = [execute_item(item, i) for i, item in enumerate(items)]
-            results = await asyncio.gather(*tasks)
+        results: list[Any] = [None] * len(items)
+        fingerprints: list[str | None] = [None] * len(items)
+        reused: set[int] = set()
+        completed = 0
+
+        async def run_item(idx):
+            nonlocal completed
+            upstream_result = None
+            if stream is not None:
+                available, upstream_result = await stream.get(idx)
+                if not available:
+                    source_result = session.results[source_name]
+                    upstream_result = source_result["_scattered_results"][idx]
+                items[idx] = _extract_item(upstream_result, source_port)
+            elif upstream_results is not None:
+                upstream_result = upstream_results[idx]
+            item = items[idx]
+
+            start_time = time.time()
+            if _is_item_error(upstream_result, source_port):
+                results[idx] = upstream_result
+            else:
+                results[idx] = await execute_item(item, idx)
+            completed += 1
+            if own_stream is not None:
+                own_stream.publish(idx, results[idx])
+            if on_event:
+                on_event(
+                    {
+                        "type": "item_complete",
+                        "node": node_name,
+                        "index": idx,
+                        "item": item,
+                        "result": results[idx],
+                        "fingerprint": fingerprints[idx],
+                        "reused": idx in reused,
+                        "execution_time_ms": (time.time() - start_time) * 1000,
+                        "completed": completed,
+                        "total": len(items),
+                    }
+                )
+
+        if is_remote:
+            num_workers = self._get_concurrency_limit(node)
+        elif isinstance(node, FnNode) and node._batch:
+            num_workers = len(items)
+        elif isinstance(node, FnNode) and node._executor == "process":
+            num_workers = PROCESS_WORKERS
         else:
-            results = []
-            for i, item in enumerate(items):
-                result = await execute_item(item, i)
-                results.append(result)
+            num_workers = 1
+        pending = iter(range(len(items)))
+
+        async def worker():
+            for i in pending:
+                await run_item(i)
+
+        num_workers = min(num_workers, len(items))
+        await asyncio.gather(*(worker() for _ in range(num_workers)))
 
         session.scattered_results[node_name] = list(results)
-        return {"_scattered_results": list(results), "_items": items}
+        return {
+            "_scattered_results": list(results),
+            "_items": items,
+            "_item_fingerprints": fingerprints,
+        }
+
+    def _call_fn(self, node: FnNode, fn_kwargs: dict[str, Any]) -> Any:
+        if node._batch:
+            return wait_future(self._get_batcher(node).submit(fn_kwargs))
+        return self._invoke_fn(node, fn_kwargs)
+
+    def _invoke_fn(self, node: FnNode, fn_kwargs: dict[str, Any]) -> Any:
+        if node._executor == "process":
+            pool = get_process_pool(node._initializer, node._initargs)
+            return wait_future(pool.submit(node._fn, **fn_kwargs))
+        if node._is_async:
+            # Only reached from worker threads (ChoiceNode variants, batches).
+            return asyncio.run(node._fn(**fn_kwargs))
+        return node._fn(**fn_kwargs)
+
+    def _get_batcher(self, node: FnNode) -> Batcher:
+        return get_batcher(node, functools.partial(self._run_fn_batch, node))
+
+    def _run_fn_batch(self, node: FnNode, calls: list[dict[str, Any]]) -> list[Any]:
+        ports = list(dict.fromkeys(port for call in calls for port in call))
+        batch_kwargs = {port: [call.get(port) for call in calls] for port in ports}
+        return self._invoke_fn(node, batch_kwargs)
+
+    def _get_concurrency_limit(self, node: GradioNode | InferenceNode) -> int:
+        return self._upstream_limits.get(
+            _upstream_key(node), DEFAULT_REMOTE_CONCURRENCY
+        )
+
+    async def _get_upstream_semaphore(
+        self, session: ExecutionSession, node: GradioNode | InferenceNode
+    ) -> LimiterSlot:
+        upstream = _upstream_key(node)
+        limit = self._get_concurrency_limit(node)
+        return get_limiter(upstream, limit).slot(session.fairness_key)
+
+    async def _get_fn_limits(
+        self, session: ExecutionSession, node_name: str, node: FnNode
+    ) -> list[asyncio.Semaphore | LimiterSlot]:
+        """Get the limits a FnNode call holds, in the order to acquire them.
+
+        With concurrency_scope="server", the group's limit (or the node's own,
+        without a group) is shared by all sessions. Non-concurrent nodes still
+        run one at a time per session.
+        """
+        if node._concurrency_scope == "server":
+            limits: list[asyncio.Semaphore | LimiterSlot] = []
+            if not node._concurrent:
+                limits.append(await session.concurrency.get_semaphore(False, None, 1))
+            key = f"group:{node._concurrency_group or node_name}"
+            limiter = get_limiter(key, node._max_concurrent)
+            limits.append(limiter.slot(session.fairness_key))
+            return limits
+        semaphore = await session.concurrency.get_semaphore(
+            node._concurrent,
+            node._concurrency_group,
+            node._max_concurrent,
+        )
+        return [semaphore] if semaphore else []
 
     def _wrap_file_input(self, value: Any) -> Any:
         from gradio_client import handle_file
 
         if isinstance(value, FileValue):
+            if value.url and value.hf_token is None:
+                # Let the Space fetch public files itself instead of
+                # re-uploading them.
+                return handle_file(value.url)
+            # The receiving Space can't fetch a file that needs our token, so
+            # it's downloaded and uploaded instead.
+            if value.url:
+                download_file(value.url, value.hf_token)
             return handle_file(str(value))
 
         if isinstance(value, str):
@@ -713,10 +1411,7 @@ class AsyncExecutor:
                 "video/webm": ".webm",
             }
             ext = ext_map.get(media_type, ".bin")
-            data = base64.b64decode(encoded)
-            file_path = get_daggr_files_dir() / f"{uuid.uuid4()}{ext}"
-            file_path.write_bytes(data)
-            return str(file_path)
+            return store_bytes(base64.b64decode(encoded), ext)
         except Exception:
             return None
 
@@ -729,8 +1424,7 @@ class AsyncExecutor:
         def download_and_wrap(file_obj: dict) -> FileValue:
             url = file_obj.get("url")
             if url:
-                local_path = _download_file(url, hf_token=hf_token)
-                return FileValue(local_path)
+                return lazy_file(url, hf_token=hf_token)
             path = file_obj.get("path", "")
             return FileValue(path)
 
@@ -791,15 +1485,114 @@ class AsyncExecutor:
 
         return {output_ports[0]: raw_result}
 
+    async def execute_wavefront(
+        self,
+        node_names: list[str],
+        run_node: Callable[[str], AsyncIterator[Any]],
+        session: ExecutionSession | None = None,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Run nodes as soon as all of their upstream nodes have finished.
+
+        Only dependencies between nodes in `node_names` are considered; nodes
+        outside the set are assumed to already have results in the session.
+
+        When a session is given, a node that scatters over another scattered
+        node's output is started as soon as that node starts, and picks up
+        items from its ItemStream as they finish.
+
+        Args:
+            node_names: The nodes to run.
+            run_node: Called once per node. Returns an async iterator whose
+                items are forwarded to the caller; the node counts as finished
+                once the iterator is exhausted.
+            session: The session the nodes run in, enabling item pipelining.
+
+        Yields:
+            (node_name, item) pairs in the order they are produced.
+
+        Raises:
+            NodeExecutionError: If a node fails. Nodes still running are
+                cancelled first.
+        """
+        plan = self.graph.get_plan()
+        pending = set(node_names)
+        upstream = {name: set(plan.predecessors[name]) & pending for name in node_names}
+        stream_sources: dict[str, str] = {}
+        if session is not None:
+            for name in node_names:
+                source = plan.stream_sources.get(name)
+                if source in pending:
+                    upstream[name].discard(source)
+                    stream_sources[name] = source
+        streams: dict[str, ItemStream] = {}
+        events: asyncio.Queue = asyncio.Queue()
+        tasks: dict[str, asyncio.Task] = {}
+
+        async def drive(node_name: str):
+            try:
+                async for item in run_node(node_name):
+                    events.put_nowait((node_name, item))
+            except Exception as e:
+                events.put_nowait((node_name, NodeExecutionError(node_name, e)))
+            else:
+                events.put_nowait((node_name, _NODE_DONE))
+
+        def start_ready():
+            for node_name in node_names:
+                if node_name in pending and not upstream[node_name]:
+                    if stream_sources.get(node_name) in pending:
+                        continue
+                    pending.discard(node_name)
+                    if node_name in stream_sources.values():
+                        streams[node_name] = session.item_streams[node_name] = (
+                            ItemStream()
+                        )
+                    tasks[node_name] = asyncio.create_task(drive(node_name))
+
+        def close_stream(node_name: str):
+            stream = streams.pop(node_name, None)
+            if stream is not None:
+                stream.close()
+                if session.item_streams.get(node_name) is stream:
+                    del session.item_streams[node_name]
+
+        try:
+            start_ready()
+            while tasks:
+                node_name, item = await events.get()
+                if isinstance(item, NodeExecutionError):
+                    raise item
+                if item is _NODE_DONE:
+                    del tasks[node_name]
+                    close_stream(node_name)
+                    for deps in upstream.values():
+                        deps.discard(node_name)
+                    start_ready()
+                    continue
+                yield node_name, item
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks.values(), return_exceptions=True)
+            for node_name in list(streams):
+                close_stream(node_name)
+
     async def execute_all(
         self, session: ExecutionSession, entry_inputs: dict[str, dict[str, Any]]
     ) -> dict[str, Any]:
         execution_order = self.graph.get_execution_order()
         session.results = {}
 
-        for node_name in execution_order:
+        async def run_node(node_name: str):
             user_input = entry_inputs.get(node_name, {})
-            await self.execute_node(session, node_name, user_input)
+            yield await self.execute_node(session, node_name, user_input)
+
+        try:
+            async for _ in self.execute_wavefront(execution_order, run_node, session):
+                pass
+        except NodeExecutionError as e:
+            raise e.error
 
         return session.results
 
@@ -838,21 +1631,39 @@ class SequentialExecutor:
     def execute_node(
         self, node_name: str, user_inputs: dict[str, Any] | None = None
     ) -> Any:
-        """Synchronous wrapper around async execute_node."""
+        """Synchronous wrapper around async execute_node.
+
+        Remote files in the result are downloaded before it is returned.
+        """
+
+        async def run():
+            result = await self._async_executor.execute_node(
+                self._session, node_name, user_inputs
+            )
+            await materialize_files_async(result)
+            return result
+
         loop = asyncio.new_event_loop()
         try:
-            return loop.run_until_complete(
-                self._async_executor.execute_node(self._session, node_name, user_inputs)
-            )
+            return loop.run_until_complete(run())
         finally:
             loop.close()
 
     def execute_all(self, entry_inputs: dict[str, dict[str, Any]]) -> dict[str, Any]:
-        """Synchronous wrapper around async execute_all."""
+        """Synchronous wrapper around async execute_all.
+
+        Remote files in the results are downloaded before they are returned.
+        """
+
+        async def run():
+            results = await self._async_executor.execute_all(
+                self._session, entry_inputs
+            )
+            await materialize_files_async(results)
+            return results
+
         loop = asyncio.new_event_loop()
         try:
-            return loop.run_until_complete(
-                self._async_executor.execute_all(self._session, entry_inputs)
-            )
+            return loop.run_until_complete(run())
         finally:
             loop.close()
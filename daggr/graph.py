@@ -20,6 +20,7 @@ from daggr._utils import suggest_similar
 from daggr.edge import Edge
 from daggr.local_space import prepare_local_node
 from daggr.node import ChoiceNode, GradioNode, InferenceNode, Node
+from daggr.plan import CompiledPlan
 from daggr.port import Port
 
 if TYPE_CHECKING:
@@ -290,6 +291,7 @@ class Graph:
         self.nodes: dict[str, Node] = {}
         self._nx_graph = nx.DiGraph()
         self._edges: list[Edge] = []
+        self._plan: CompiledPlan | None = None
 
         if nodes:
             for node in nodes:
@@ -334,6 +336,7 @@ class Graph:
             return
         self.nodes[node._name] = node
         self._nx_graph.add_node(node._name)
+        self._plan = None
 
     def _create_edges_from_port_connections(self, node: Node) -> None:
         for target_port_name, source_port in node._port_connections.items():
@@ -366,6 +369,7 @@ class Graph:
 
         self._edges.append(edge)
         self._nx_graph.add_edge(edge.source_node._name, edge.target_node._name)
+        self._plan = None
 
         if not nx.is_directed_acyclic_graph(self._nx_graph):
             self._nx_graph.remove_edge(edge.source_node._name, edge.target_node._name)
@@ -382,7 +386,13 @@ class Graph:
 
     def get_execution_order(self) -> list[str]:
         """Get the topologically sorted order of node names for execution."""
-        return list(nx.topological_sort(self._nx_graph))
+        return list(self.get_plan().order)
+
+    def get_plan(self) -> CompiledPlan:
+        """Get the compiled execution plan, building it if the graph changed."""
+        if self._plan is None:
+            self._plan = CompiledPlan(self)
+        return self._plan
 
     def get_connections(self) -> list[tuple]:
         """Get all edges as tuples of (source_node, source_port, target_node, target_port)."""
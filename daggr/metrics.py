@@ -0,0 +1,290 @@
+"""Metrics for daggr's executor, server and state store.
+
+Metrics are kept in process memory and served by `DaggrServer` at `/metrics`
+in the Prometheus text format, so they're available without a collector:
+`curl localhost:7860/metrics` shows node and Space latencies, in-flight work,
+scatter fan-out, worker thread saturation, websocket traffic, SQLite query
+latency and the size of the file store.
+
+Labels are passed as keyword arguments:
+
+    >>> NODE_DURATION.observe(1.2, node="tts", node_type="GradioNode", status="ok")
+    >>> print(render())
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+    300.0,
+)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+FILE_STORE_SCAN_INTERVAL = 60.0
+
+_registry: list[_Metric] = []
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: tuple[tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[tuple[str, str], ...], Any] = {}
+        self._lock = threading.Lock()
+        if not labelnames and self.type != "histogram":
+            self._values[()] = 0
+        _registry.append(self)
+
+    def _key(self, labels: dict[str, Any]) -> tuple[tuple[str, str], ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"Metric '{self.name}' expects labels {list(self.labelnames)}, "
+                f"got {sorted(labels)}"
+            )
+        return tuple((k, str(labels[k])) for k in self.labelnames)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(key)} {_format_value(value)}"
+                for key, value in self._values.items()
+            ]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    """A count that only goes up, e.g. bytes sent."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. calls in flight.
+
+    Args:
+        fn: Optional function computing the value when metrics are rendered,
+            for gauges without labels that are cheaper to read than to track.
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        fn: Callable[[], float] | None = None,
+    ):
+        super().__init__(name, help, labelnames)
+        self._fn = fn
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def _samples(self) -> list[str]:
+        if self._fn is not None:
+            try:
+                self.set(self._fn())
+            except Exception:
+                pass
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """A distribution of observed values, e.g. latencies, in cumulative buckets."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(key + (("le", _format_value(bound)),))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def render() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+_file_store_size: tuple[float | None, int] = (None, 0)
+
+
+def _files_bytes() -> int:
+    """Size of the files directory, rescanned at most once a minute."""
+    global _file_store_size
+    scanned_at, size = _file_store_size
+    if scanned_at is None or time.monotonic() - scanned_at > FILE_STORE_SCAN_INTERVAL:
+        from daggr._file_store import _scan_files
+
+        size = sum(group["size"] for group in _scan_files().values())
+        _file_store_size = (time.monotonic(), size)
+    return size
+
+
+def _files_max_bytes() -> int:
+    from daggr._file_store import FILES_MAX_SIZE
+
+    return FILES_MAX_SIZE
+
+
+NODE_DURATION = Histogram(
+    "daggr_node_duration_seconds",
+    "Time to execute a node, including waiting for concurrency slots.",
+    ("node", "node_type", "status"),
+)
+NODES_IN_FLIGHT = Gauge(
+    "daggr_nodes_in_flight", "Nodes currently executing.", ("node",)
+)
+SPACE_CALL_DURATION = Histogram(
+    "daggr_space_call_duration_seconds",
+    "Time from submitting a job to a Gradio Space until it finishes.",
+    ("space", "status"),
+)
+SPACE_CALLS_IN_FLIGHT = Gauge(
+    "daggr_space_calls_in_flight",
+    "Jobs submitted to a Space and not finished.",
+    ("space",),
+)
+SCATTER_ITEMS = Histogram(
+    "daggr_scatter_items",
+    "Number of items a scattered node fans out to.",
+    ("node",),
+    buckets=COUNT_BUCKETS,
+)
+WORKER_THREADS_BUSY = Gauge(
+    "daggr_worker_threads_busy", "Calls running in a worker thread pool.", ("pool",)
+)
+WORKER_THREADS_QUEUED = Gauge(
+    "daggr_worker_threads_queued",
+    "Calls waiting for a free thread in a worker thread pool.",
+    ("pool",),
+)
+WORKER_THREADS_MAX = Gauge(
+    "daggr_worker_threads_max", "Size of a worker thread pool.", ("pool",)
+)
+WORKER_THREAD_WAIT = Histogram(
+    "daggr_worker_thread_wait_seconds",
+    "Time calls waited for a free thread in a worker thread pool.",
+    ("pool",),
+)
+LIMITER_ACTIVE = Gauge(
+    "daggr_limiter_active",
+    "Slots held in a server-wide concurrency limit.",
+    ("limiter",),
+)
+LIMITER_WAITING = Gauge(
+    "daggr_limiter_waiting",
+    "Calls waiting for a slot in a server-wide concurrency limit.",
+    ("limiter",),
+)
+WEBSOCKET_SENDS_PENDING = Gauge(
+    "daggr_websocket_sends_pending",
+    "Websocket messages waiting to be sent to clients.",
+)
+WEBSOCKET_SENT_BYTES = Counter(
+    "daggr_websocket_sent_bytes_total",
+    "Bytes sent to websocket clients, by message type.",
+    ("type",),
+)
+SQLITE_QUERY_DURATION = Histogram(
+    "daggr_sqlite_query_duration_seconds",
+    "Latency of queries to the sessions database.",
+    ("operation",),
+)
+FILES_BYTES = Gauge(
+    "daggr_files_bytes", "Size of the daggr files directory.", fn=_files_bytes
+)
+FILES_MAX_BYTES = Gauge(
+    "daggr_files_max_bytes",
+    "Size budget of the files directory (0 means unlimited).",
+    fn=_files_max_bytes,
+)
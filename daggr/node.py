@@ -11,13 +11,21 @@ This module defines the various node types that can be used in a daggr graph:
 from __future__ import annotations
 
 import inspect
+import math
+import re
 import warnings
 from abc import ABC
+from collections import deque
 from collections.abc import Callable
 from typing import Any
 
 from daggr._utils import suggest_similar
 from daggr.port import ItemList, Port, PortNamespace, is_port
+from daggr.result_cache import CachePolicy
+
+_HEDGE_PERCENTILE_RE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)$")
+HEDGE_MIN_SAMPLES = 10
+HEDGE_LATENCY_WINDOW = 100
 
 _FILE_TYPE_COMPONENTS = {
     "Image",
@@ -74,6 +82,30 @@ def _is_gradio_component(obj: Any) -> bool:
     )
 
 
+def _validate_max_concurrency(max_concurrency: int | None) -> int | None:
+    if max_concurrency is not None and max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+    return max_concurrency
+
+
+CONCURRENCY_SCOPES = ("session", "server")
+
+
+def _validate_concurrency_scope(concurrency_scope: str) -> str:
+    if concurrency_scope not in CONCURRENCY_SCOPES:
+        raise ValueError(
+            f"Invalid concurrency_scope '{concurrency_scope}'. Expected one of: "
+            f"{', '.join(CONCURRENCY_SCOPES)}"
+        )
+    return concurrency_scope
+
+
+def _validate_timeout(timeout: float | None) -> float | None:
+    if timeout is not None and (isinstance(timeout, bool) or timeout <= 0):
+        raise ValueError(f"timeout must be a positive number of seconds, got {timeout}")
+    return timeout
+
+
 class Node(ABC):
     """Abstract base class for all nodes in a daggr graph.
 
@@ -101,6 +133,8 @@ class Node(ABC):
         self._item_list_schemas: dict[str, dict[str, Any]] = {}
         self._fixed_inputs: dict[str, Any] = {}
         self._port_connections: dict[str, Any] = {}
+        self._cache: CachePolicy | None = None
+        self._timeout: float | None = None
 
     @property
     def name(self) -> str:
@@ -252,24 +286,45 @@ class ChoiceNode(Node):
     Args:
         variants: List of Node objects that serve as alternatives.
         name: Optional display name. Defaults to the first variant's name.
+        race: If True, run the variants against each other and keep the first
+            successful result instead of running only the selected variant.
+            Losing variants are cancelled, including their remote jobs.
+        hedge_after: When racing, start the selected variant alone and only
+            start the other variants if it hasn't finished after this many
+            seconds, or after a percentile of its recent latencies such as
+            "p95". Percentile thresholds hedge once the selected variant has
+            completed at least 10 runs. Setting this implies `race=True`.
+        timeout: Max seconds for the node, whichever variants run. Each
+            variant's own timeout also applies, so a racing variant that
+            times out fails and the others take over.
 
     Example:
         >>> tts = GradioNode("space1/tts", ...) | GradioNode("space2/tts", ...)
         >>> # tts is a ChoiceNode with two variants
         >>> # tts.audio works regardless of which variant is selected
+        >>> # Race the variants, starting backups if space1 is slower than usual
+        >>> tts = ChoiceNode([GradioNode("space1/tts", ...), ...], hedge_after="p95")
     """
 
     def __init__(
         self,
         variants: list[Node],
         name: str | None = None,
+        race: bool = False,
+        hedge_after: float | str | None = None,
+        timeout: float | None = None,
     ):
         if not variants:
             raise ValueError("ChoiceNode requires at least one variant")
 
         super().__init__(name)
+        self._timeout = _validate_timeout(timeout)
         self._variants = variants
         self._selected_variant = 0
+        self._race = race or hedge_after is not None
+        self._hedge_after = hedge_after
+        self._hedge_percentile = self._parse_hedge_after(hedge_after)
+        self._latencies = [deque(maxlen=HEDGE_LATENCY_WINDOW) for _ in variants]
 
         if not self._name:
             self._name = variants[0]._name
@@ -282,6 +337,41 @@ class ChoiceNode(Node):
                 if port_name not in self._port_connections:
                     self._port_connections[port_name] = port
 
+    @staticmethod
+    def _parse_hedge_after(hedge_after: float | str | None) -> float | None:
+        if hedge_after is None:
+            return None
+        if isinstance(hedge_after, str):
+            match = _HEDGE_PERCENTILE_RE.match(hedge_after)
+            if not match or not 0 < float(match.group(1)) < 100:
+                raise ValueError(
+                    f"Invalid hedge_after '{hedge_after}'. Expected a number of "
+                    f"seconds or a percentile like 'p95'."
+                )
+            return float(match.group(1))
+        if isinstance(hedge_after, bool) or hedge_after < 0:
+            raise ValueError("hedge_after must be a non-negative number of seconds")
+        return None
+
+    def _record_latency(self, variant_idx: int, seconds: float):
+        self._latencies[variant_idx].append(seconds)
+
+    def _get_hedge_delay(self, variant_idx: int) -> float | None:
+        """Seconds to wait for a variant before starting the others.
+
+        Returns 0 to start all variants at once, or None to start the others
+        only if the variant fails.
+        """
+        if self._hedge_after is None:
+            return 0.0
+        if self._hedge_percentile is None:
+            return float(self._hedge_after)
+        samples = sorted(self._latencies[variant_idx])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        rank = math.ceil(self._hedge_percentile / 100 * len(samples)) - 1
+        return samples[rank]
+
     def _compute_union_output_ports(self) -> list[str]:
         seen = set()
         ports = []
@@ -302,8 +392,16 @@ class ChoiceNode(Node):
 
     def __or__(self, other: Node) -> ChoiceNode:
         if isinstance(other, ChoiceNode):
-            return ChoiceNode(self._variants + other._variants, name=self._name)
-        return ChoiceNode(self._variants + [other], name=self._name)
+            variants = self._variants + other._variants
+        else:
+            variants = self._variants + [other]
+        return ChoiceNode(
+            variants,
+            name=self._name,
+            race=self._race,
+            hedge_after=self._hedge_after,
+            timeout=self._timeout,
+        )
 
     def __repr__(self):
         variant_names = [v._name for v in self._variants]
@@ -327,6 +425,16 @@ class GradioNode(Node):
         validate: Whether to validate the Space exists and has the specified endpoint.
         run_locally: If True, clone and run the Space locally instead of using the
             remote API.
+        cache: Reuse results for identical inputs instead of calling the Space
+            again. A scope ("session" or "global") or a CachePolicy.
+        max_concurrency: Max calls in flight to this Space from the whole
+            server, e.g. for scattered items, with waiting calls served fairly
+            across users. Shared by nodes calling the same Space; if they
+            declare different limits, the smallest applies. Defaults to the
+            DAGGR_REMOTE_CONCURRENCY env var (16).
+        timeout: Max seconds to wait for the Space, including time in its
+            queue. The job is cancelled when it runs out. For scattered nodes
+            it applies to each item.
 
     Example:
         >>> tts = GradioNode(
@@ -350,9 +458,15 @@ class GradioNode(Node):
         run_locally: bool = False,
         preprocess: Callable[[dict], dict] | None = None,
         postprocess: Callable[..., Any] | None = None,
+        cache: str | CachePolicy | None = None,
+        max_concurrency: int | None = None,
+        timeout: float | None = None,
     ):
         super().__init__(name)
         self._src = space_or_url
+        self._cache = CachePolicy.resolve(cache)
+        self._max_concurrency = _validate_max_concurrency(max_concurrency)
+        self._timeout = _validate_timeout(timeout)
         self._api_name = api_name
         self._run_locally = run_locally
         self._local_url: str | None = None
@@ -522,6 +636,15 @@ class InferenceNode(Node):
             modified dict before the inference call.
         postprocess: Optional function that receives the raw inference result and
             returns a transformed value before it is mapped to output ports.
+        cache: Reuse results for identical inputs instead of calling the model
+            again. A scope ("session" or "global") or a CachePolicy.
+        max_concurrency: Max calls in flight to this model from the whole
+            server, e.g. for scattered items, with waiting calls served fairly
+            across users. Shared by nodes calling the same model; if they
+            declare different limits, the smallest applies. Defaults to the
+            DAGGR_REMOTE_CONCURRENCY env var (16).
+        timeout: Max seconds to wait for the model. For scattered nodes it
+            applies to each item.
 
     Example:
         >>> llm = InferenceNode("meta-llama/Llama-2-7b-chat-hf")
@@ -536,9 +659,15 @@ class InferenceNode(Node):
         validate: bool = True,
         preprocess: Callable[[dict], dict] | None = None,
         postprocess: Callable[..., Any] | None = None,
+        cache: str | CachePolicy | None = None,
+        max_concurrency: int | None = None,
+        timeout: float | None = None,
     ):
         super().__init__(name)
         self._model = model
+        self._cache = CachePolicy.resolve(cache)
+        self._max_concurrency = _validate_max_concurrency(max_concurrency)
+        self._timeout = _validate_timeout(timeout)
         self._task: str | None = None
         self._task_fetched: bool = False
         self._preprocess = preprocess
@@ -627,10 +756,25 @@ class FnNode(Node):
         - concurrent=True: Allow this node to run in parallel with others
         - concurrency_group: Group nodes that share a resource (e.g., GPU)
         - max_concurrent: Max parallel executions within a group (default: 1)
+        - concurrency_scope="server": Apply the limit across all sessions on
+          the server instead of per session, queuing calls fairly across users
 
         Note: GradioNode and InferenceNode always run concurrently since they
         are external API calls. Prefer these over FnNode when possible.
 
+        `async def` functions are awaited directly on the event loop instead of
+        running in a worker thread. The same concurrency rules apply.
+
+        With executor="process", calls run in a shared process pool instead of
+        a thread, so CPU-bound functions are not serialized by the GIL. These
+        nodes always run concurrently, bounded by the pool size
+        (DAGGR_PROCESS_WORKERS, default: number of CPUs).
+
+        With batch=True, calls made at the same time (scattered items,
+        parallel sessions, API requests) are coalesced into one call. The
+        function receives a list of values for each input and must return a
+        list with one result per call. One batch runs at a time.
+
     Args:
         fn: The Python function to wrap.
         name: Optional display name. Defaults to the function name.
@@ -641,6 +785,27 @@ class FnNode(Node):
         concurrent: If True, allow parallel execution. Default: False.
         concurrency_group: Name of a group sharing a concurrency limit.
         max_concurrent: Max parallel executions in the group. Default: 1.
+        concurrency_scope: "session" (default) or "server". With "server",
+            max_concurrent bounds executions of the group (or of this node,
+            if it has no group) across all sessions on the server. Waiting
+            calls are served round-robin across users.
+        cache: Reuse results for identical inputs instead of calling the
+            function again. A scope ("session" or "global") or a CachePolicy.
+            The cache key includes a hash of the function's source.
+        executor: "thread" (default) or "process". The function, initializer
+            and initargs must be picklable when using "process".
+        initializer: Optional function run once in each worker process before
+            it handles calls, e.g. to load a model into a global. Only used
+            with executor="process".
+        initargs: Arguments passed to `initializer`.
+        batch: If True, coalesce concurrent calls into list-in/list-out calls.
+        max_batch_size: Max calls per batch. Default: 32.
+        max_wait_ms: Max time to wait for more calls before running a
+            partial batch. Default: 10.
+        timeout: Max seconds for a call. When it runs out the node fails;
+            `async def` functions are cancelled, but a function running in a
+            thread can't be interrupted and finishes in the background. For
+            scattered nodes it applies to each item.
 
     Example:
         >>> def process_text(text: str) -> tuple[str, int]:
@@ -655,6 +820,17 @@ class FnNode(Node):
 
         >>> # Share GPU with other nodes (max 2 concurrent)
         >>> node = FnNode(gpu_func, concurrency_group="gpu", max_concurrent=2)
+
+        >>> # One call at a time on the GPU, however many users are connected
+        >>> node = FnNode(gpu_func, concurrency_group="gpu", concurrency_scope="server")
+
+        >>> # Run a CPU-bound function on all cores
+        >>> node = FnNode(mix_audio, executor="process", initializer=load_codec)
+
+        >>> # Embed many texts per model call
+        >>> def embed(texts: list[str]) -> list[list[float]]:
+        ...     return model.encode(texts).tolist()
+        >>> node = FnNode(embed, batch=True, max_batch_size=64)
     """
 
     def __init__(
@@ -668,14 +844,36 @@ class FnNode(Node):
         concurrent: bool = False,
         concurrency_group: str | None = None,
         max_concurrent: int = 1,
+        concurrency_scope: str = "session",
+        cache: str | CachePolicy | None = None,
+        executor: str = "thread",
+        initializer: Callable | None = None,
+        initargs: tuple = (),
+        batch: bool = False,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 10,
+        timeout: float | None = None,
     ):
         super().__init__(name)
         self._fn = fn
+        self._cache = CachePolicy.resolve(cache)
+        self._timeout = _validate_timeout(timeout)
         self._preprocess = preprocess
         self._postprocess = postprocess
-        self._concurrent = concurrent
+        self._executor = executor
+        self._is_async = inspect.iscoroutinefunction(fn)
+        self._initializer = initializer
+        self._initargs = tuple(initargs)
+        self._validate_executor()
+        self._batch = batch
+        self._max_batch_size = max_batch_size
+        self._max_wait_ms = max_wait_ms
+        self._batcher = None
+        self._validate_batch(concurrency_group)
+        self._concurrent = concurrent or executor == "process" or batch
         self._concurrency_group = concurrency_group
         self._max_concurrent = max_concurrent
+        self._concurrency_scope = _validate_concurrency_scope(concurrency_scope)
 
         if not self._name:
             self._name = self._fn.__name__
@@ -692,6 +890,50 @@ class FnNode(Node):
             self._output_ports = ["output"]
 
         self._validate_ports()
+        self._warn_if_uncacheable()
+
+    def _warn_if_uncacheable(self) -> None:
+        from daggr.result_cache import has_closure
+
+        if self._cache is not None and has_closure(self._fn):
+            warnings.warn(
+                f"FnNode '{self._name}' won't be cached: its function reads "
+                f"variables from an enclosing function, which can change without "
+                f"its source changing. Define it at module level to cache it.",
+                stacklevel=3,
+            )
+
+    def _validate_executor(self) -> None:
+        if self._executor not in ("thread", "process"):
+            raise ValueError(
+                f"Invalid executor '{self._executor}'. Expected 'thread' or 'process'."
+            )
+        if self._executor != "process":
+            if self._initializer is not None:
+                raise ValueError(
+                    "initializer is only supported with executor='process'"
+                )
+            return
+        if self._is_async:
+            raise ValueError("async functions cannot use executor='process'")
+        from daggr._pools import check_picklable
+
+        fn_name = getattr(self._fn, "__name__", repr(self._fn))
+        check_picklable(self._fn, f"Function '{fn_name}'")
+        if self._initializer is not None:
+            check_picklable(self._initializer, "initializer")
+        check_picklable(self._initargs, "initargs")
+
+    def _validate_batch(self, concurrency_group: str | None) -> None:
+        if self._max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        if self._max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be a non-negative number")
+        if self._batch and concurrency_group is not None:
+            raise ValueError(
+                "batch=True cannot be combined with concurrency_group: batches "
+                "already run one at a time"
+            )
 
     def _discover_signature(self):
         sig = inspect.signature(self._fn)
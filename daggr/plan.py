@@ -0,0 +1,99 @@
+"""Compiled execution plan for daggr graphs.
+
+A CompiledPlan holds per-node indexes derived from a Graph's topology so that
+the executor and server do not rescan every edge on hot paths. Graphs build
+their plan lazily and discard it whenever a node or edge is added.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import networkx as nx
+
+if TYPE_CHECKING:
+    from daggr.edge import Edge
+    from daggr.graph import Graph
+
+
+class CompiledPlan:
+    """Precomputed topology indexes for a Graph.
+
+    Attributes:
+        order: Node names in topological order.
+        index: Position of each node name in `order`.
+        incoming: Incoming edges per node, in the order they were added.
+        scattered_edges: Incoming scattered edges per node.
+        gathered_edges: Incoming gathered edges per node.
+        predecessors: Upstream node names per node.
+        levels: Length of the longest path from an entry node to each node.
+        stream_sources: For nodes that scatter over the output of another
+            scattered node, the name of that node. Items can be pipelined
+            through such chains.
+    """
+
+    def __init__(self, graph: Graph):
+        self.order: list[str] = list(nx.topological_sort(graph._nx_graph))
+        self.index: dict[str, int] = {name: i for i, name in enumerate(self.order)}
+
+        self.incoming: dict[str, list[Edge]] = {name: [] for name in self.order}
+        for edge in graph._edges:
+            self.incoming[edge.target_node._name].append(edge)
+
+        self.scattered_edges: dict[str, list[Edge]] = {}
+        self.gathered_edges: dict[str, list[Edge]] = {}
+        self.predecessors: dict[str, list[str]] = {}
+        for name, edges in self.incoming.items():
+            self.scattered_edges[name] = [e for e in edges if e.is_scattered]
+            self.gathered_edges[name] = [e for e in edges if e.is_gathered]
+            self.predecessors[name] = list(graph._nx_graph.predecessors(name))
+
+        self.stream_sources: dict[str, str] = {}
+        for name, edges in self.scattered_edges.items():
+            sources = {e.source_node._name for e in edges}
+            if len(sources) != 1:
+                continue
+            source = sources.pop()
+            from_source = [
+                e for e in self.incoming[name] if e.source_node._name == source
+            ]
+            if self.scattered_edges[source] and all(
+                e.is_scattered for e in from_source
+            ):
+                self.stream_sources[name] = source
+
+        self.levels: dict[str, int] = {}
+        self._ancestor_bits: dict[str, int] = {}
+        for name in self.order:
+            level = 0
+            bits = 0
+            for source in self.predecessors[name]:
+                level = max(level, self.levels[source] + 1)
+                bits |= self._ancestor_bits[source] | (1 << self.index[source])
+            self.levels[name] = level
+            self._ancestor_bits[name] = bits
+
+    def has_scattered_input(self, node_name: str) -> bool:
+        return bool(self.scattered_edges.get(node_name))
+
+    def ancestors(self, node_name: str) -> list[str]:
+        """Get all upstream nodes of `node_name`, in topological order."""
+        bits = self._ancestor_bits.get(node_name, 0)
+        names = []
+        while bits:
+            low = bits & -bits
+            names.append(self.order[low.bit_length() - 1])
+            bits ^= low
+        return names
+
+    def descendants(self, node_name: str) -> list[str]:
+        """Get all downstream nodes of `node_name`, in topological order."""
+        return [
+            name
+            for name in self.order[self.index[node_name] + 1 :]
+            if self.is_ancestor(node_name, name)
+        ]
+
+    def is_ancestor(self, ancestor: str, node_name: str) -> bool:
+        bits = self._ancestor_bits.get(node_name, 0)
+        return bool(bits >> self.index[ancestor] & 1)
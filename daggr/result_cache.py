@@ -0,0 +1,437 @@
+"""Memoization of node results for daggr.
+
+Nodes opt in with `cache=`. Results are keyed by a fingerprint of the node
+(what it calls and how) plus its normalized inputs, with file inputs hashed
+by content (downloaded files by their URL-derived name), so the same request
+is only sent once. The same fingerprints are
+stored with persisted results, so the server can tell which ancestors of a
+node are up to date (see `input_fingerprint`). Session-scoped entries live
+on the ExecutionSession; global entries live in a process-wide LRU backed by
+JSON files under the daggr cache directory, so they survive restarts.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from daggr.state import get_daggr_cache_dir
+
+if TYPE_CHECKING:
+    from daggr.node import Node
+    from daggr.session import ExecutionSession
+
+CACHE_SCOPES = ("none", "session", "global")
+
+_FILE_TAG = "__daggr_file__"
+
+
+class CachePolicy:
+    """Controls whether and for how long a node's results are reused.
+
+    Args:
+        scope: "session" reuses results within one browser session or API call,
+            "global" shares them across sessions and persists them to disk,
+            "none" disables caching.
+        ttl: Seconds after which an entry expires. None keeps entries until
+            they are evicted.
+        max_entries: Max entries kept per node (in memory, and on disk for
+            the global scope). Least recently used entries are evicted first.
+
+    Example:
+        >>> node = GradioNode("user/space", cache=CachePolicy("global", ttl=3600))
+    """
+
+    def __init__(
+        self,
+        scope: str = "global",
+        ttl: float | None = None,
+        max_entries: int = 256,
+    ):
+        if scope not in CACHE_SCOPES:
+            raise ValueError(
+                f"Invalid cache scope '{scope}'. Expected one of: "
+                f"{', '.join(CACHE_SCOPES)}"
+            )
+        if ttl is not None and ttl <= 0:
+            raise ValueError("Cache ttl must be a positive number of seconds")
+        if max_entries < 1:
+            raise ValueError("Cache max_entries must be at least 1")
+        self.scope = scope
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    @classmethod
+    def resolve(cls, cache: str | bool | CachePolicy | None) -> CachePolicy | None:
+        """Turn a node's `cache=` argument into a policy, or None if disabled."""
+        if cache is None or cache is False:
+            return None
+        if cache is True:
+            policy = cls()
+        elif isinstance(cache, str):
+            policy = cls(scope=cache)
+        elif isinstance(cache, CachePolicy):
+            policy = cache
+        else:
+            raise ValueError(
+                f"Invalid cache value {cache!r}. Expected a scope string, "
+                f"True/False, or a CachePolicy."
+            )
+        return None if policy.scope == "none" else policy
+
+    def __repr__(self) -> str:
+        return (
+            f"CachePolicy(scope={self.scope!r}, ttl={self.ttl!r}, "
+            f"max_entries={self.max_entries!r})"
+        )
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+_file_digests: dict[tuple[str, int, int], str] = {}
+_file_digests_lock = threading.Lock()
+
+
+def _file_digest(path: str) -> str:
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    with _file_digests_lock:
+        digest = _file_digests.get(memo_key)
+    if digest is not None:
+        return digest
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    digest = hasher.hexdigest()
+    with _file_digests_lock:
+        _file_digests[memo_key] = digest
+    return digest
+
+
+def _file_key(value: str) -> dict[str, str] | None:
+    """Key a file path by its content, or None if it isn't a local file.
+
+    Downloaded files are keyed by their URL-derived name instead, so a lazy
+    file has the same key before and after it's downloaded.
+    """
+    from daggr._downloads import is_download_path
+    from daggr.executor import FileValue
+
+    if not (isinstance(value, FileValue) or os.path.isabs(value)):
+        return None
+    if is_download_path(value):
+        return {_FILE_TAG: f"download:{os.path.basename(value)}"}
+    if os.path.isfile(value):
+        return {_FILE_TAG: _file_digest(value)}
+    return None
+
+
+def _normalize(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return _file_key(value) or value
+    if isinstance(value, dict):
+        if "path" in value and isinstance(value["path"], str):
+            key = _file_key(value["path"])
+            if key is not None:
+                return key
+        return {str(k): _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    raise _Uncacheable(type(value).__name__)
+
+
+def has_closure(fn: Any) -> bool:
+    """Whether `fn` reads variables from an enclosing function's scope."""
+    return bool(getattr(inspect.unwrap(fn), "__closure__", None))
+
+
+def _callable_identity(fn: Any) -> list[str] | None:
+    """Key a function by its source.
+
+    Closed-over variables can change without the source changing, so
+    functions with a closure can't be keyed. Module globals the function
+    reads are not part of the key either.
+    """
+    if fn is None:
+        return None
+    fn = inspect.unwrap(fn)
+    if has_closure(fn):
+        raise _Uncacheable("closure")
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        code = getattr(fn, "__code__", None)
+        source = code.co_code.hex() if code is not None else repr(fn)
+    return [
+        getattr(fn, "__module__", None) or "",
+        getattr(fn, "__qualname__", None) or type(fn).__qualname__,
+        hashlib.sha256(source.encode()).hexdigest(),
+    ]
+
+
+def _digest(data: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def node_fingerprint(node: Node) -> str | None:
+    """Get a stable key for what a node computes, or None if it can't be cached.
+
+    Nodes whose fixed inputs are callables (e.g. random seeds) produce a new
+    value on every run and are never cached, and neither are nodes whose
+    functions close over variables of an enclosing function.
+    """
+    cached = getattr(node, "_cache_fingerprint", None)
+    if cached is not None:
+        return cached or None
+
+    try:
+        identity: dict[str, Any] = {
+            "type": type(node).__name__,
+            "src": getattr(node, "_src", None),
+            "api_name": getattr(node, "_api_name", None),
+            "model": getattr(node, "_model", None),
+            "fn": _callable_identity(getattr(node, "_fn", None)),
+            "preprocess": _callable_identity(getattr(node, "_preprocess", None)),
+            "postprocess": _callable_identity(getattr(node, "_postprocess", None)),
+            "outputs": list(node._output_ports),
+        }
+        if any(callable(v) for v in node._fixed_inputs.values()):
+            raise _Uncacheable("callable fixed input")
+        identity["fixed"] = _normalize(node._fixed_inputs)
+        fingerprint = _digest(identity)
+    except _Uncacheable:
+        fingerprint = ""
+    node._cache_fingerprint = fingerprint
+    return fingerprint or None
+
+
+def input_fingerprint(
+    node: Node,
+    inputs: dict[str, Any],
+    upstream: dict[str, Any],
+    variant: int | None = None,
+) -> str | None:
+    """Get a key for everything one run of a node depends on: what the node
+    computes, the values entered for its inputs, the results of the nodes it
+    reads from and, for a ChoiceNode, the selected variant.
+
+    Upstream results are keyed by value, so an upstream node that re-runs and
+    produces the same result leaves its dependents' fingerprints unchanged.
+    Returns None if a value can't be keyed.
+    """
+    try:
+        return _digest(
+            {
+                "node": node_fingerprint(node) or f"{type(node).__name__}:{node._name}",
+                "inputs": _normalize(inputs),
+                "upstream": _normalize(upstream),
+                "variant": variant,
+            }
+        )
+    except (_Uncacheable, OSError):
+        return None
+
+
+def _encode(value: Any) -> Any:
+    from daggr.executor import FileValue
+
+    if isinstance(value, FileValue):
+        return {_FILE_TAG: str(value)}
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(v) for v in value]
+    return value
+
+
+def _decode(value: Any) -> Any:
+    from daggr.executor import FileValue
+
+    if isinstance(value, dict):
+        if set(value) == {_FILE_TAG}:
+            path = value[_FILE_TAG]
+            if not os.path.exists(path):
+                raise FileNotFoundError(path)
+            return FileValue(path)
+        return {k: _decode(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_decode(v) for v in value]
+    return value
+
+
+class ResultCache:
+    """A per-node LRU of results, optionally backed by a directory of JSON files.
+
+    Thread-safe, since nodes run in worker threads.
+
+    Args:
+        disk_dir: Directory for the persistent tier. None keeps entries in
+            memory only.
+    """
+
+    def __init__(self, disk_dir: Path | None = None):
+        self.disk_dir = disk_dir
+        self._entries: dict[str, OrderedDict[str, tuple[float | None, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, policy: CachePolicy, node_key: str, input_key: str
+    ) -> tuple[bool, Any]:
+        """Look up a result. Returns (hit, value)."""
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(node_key)
+            if entries is not None and input_key in entries:
+                expires_at, value = entries[input_key]
+                if expires_at is None or expires_at > now:
+                    entries.move_to_end(input_key)
+                    return True, value
+                del entries[input_key]
+
+        if self.disk_dir is None:
+            return False, None
+        path = self.disk_dir / node_key[:32] / f"{input_key}.json"
+        try:
+            record = json.loads(path.read_text())
+            expires_at = record.get("expires_at")
+            if expires_at is not None and expires_at <= now:
+                path.unlink(missing_ok=True)
+                return False, None
+            value = _decode(record["value"])
+        except (OSError, ValueError, KeyError):
+            return False, None
+        self._remember(policy, node_key, input_key, expires_at, value)
+        return True, value
+
+    def put(self, policy: CachePolicy, node_key: str, input_key: str, value: Any):
+        expires_at = time.time() + policy.ttl if policy.ttl else None
+        self._remember(policy, node_key, input_key, expires_at, value)
+        if self.disk_dir is not None:
+            self._write_disk(policy, node_key, input_key, expires_at, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(
+        self,
+        policy: CachePolicy,
+        node_key: str,
+        input_key: str,
+        expires_at: float | None,
+        value: Any,
+    ):
+        with self._lock:
+            entries = self._entries.setdefault(node_key, OrderedDict())
+            entries[input_key] = (expires_at, value)
+            entries.move_to_end(input_key)
+            while len(entries) > policy.max_entries:
+                entries.popitem(last=False)
+
+    def _write_disk(
+        self,
+        policy: CachePolicy,
+        node_key: str,
+        input_key: str,
+        expires_at: float | None,
+        value: Any,
+    ):
+        node_dir = self.disk_dir / node_key[:32]
+        try:
+            data = json.dumps({"expires_at": expires_at, "value": _encode(value)})
+        except (TypeError, ValueError):
+            return
+        try:
+            node_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = node_dir / f".{input_key}.{threading.get_ident()}.tmp"
+            tmp_path.write_text(data)
+            os.replace(tmp_path, node_dir / f"{input_key}.json")
+            files = list(node_dir.glob("*.json"))
+            if len(files) > policy.max_entries:
+                files.sort(key=lambda p: p.stat().st_mtime)
+                for stale in files[: len(files) - policy.max_entries]:
+                    stale.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+
+_global_cache: ResultCache | None = None
+_global_cache_lock = threading.Lock()
+
+
+def get_global_cache() -> ResultCache:
+    global _global_cache
+    with _global_cache_lock:
+        if _global_cache is None:
+            _global_cache = ResultCache(get_daggr_cache_dir() / "results")
+        return _global_cache
+
+
+class CachedCall:
+    """A cache slot for one node call, created before the call is made."""
+
+    def __init__(
+        self, store: ResultCache, policy: CachePolicy, node_key: str, input_key: str
+    ):
+        self.store = store
+        self.policy = policy
+        self.node_key = node_key
+        self.input_key = input_key
+
+    def get(self) -> tuple[bool, Any]:
+        return self.store.get(self.policy, self.node_key, self.input_key)
+
+    def put(self, value: Any):
+        self.store.put(self.policy, self.node_key, self.input_key, value)
+
+
+def _is_remote(node: Node) -> bool:
+    from daggr.node import GradioNode, InferenceNode
+
+    return isinstance(node, (GradioNode, InferenceNode))
+
+
+def cached_call(
+    session: ExecutionSession, node: Node, inputs: dict[str, Any]
+) -> CachedCall | None:
+    """Get the cache slot for calling `node` with `inputs`.
+
+    Returns None if the node has no cache policy or the inputs can't be keyed.
+    Calls to Spaces and models are also keyed by the session's HF token, since
+    what a token can see (private Spaces, gated models) differs per user.
+    """
+    policy = getattr(node, "_cache", None)
+    if policy is None:
+        return None
+    node_key = node_fingerprint(node)
+    if node_key is None:
+        return None
+    try:
+        key: dict[str, Any] = {
+            k: _normalize(inputs[k]) for k in node._input_ports if k in inputs
+        }
+    except (_Uncacheable, OSError):
+        return None
+    if session.hf_token and _is_remote(node):
+        token = hashlib.sha256(session.hf_token.encode()).hexdigest()
+        key = {"inputs": key, "token": token}
+    input_key = _digest(key)
+    if policy.scope == "session":
+        store = session.result_cache
+    else:
+        store = get_global_cache()
+    return CachedCall(store, policy, node_key, input_key)
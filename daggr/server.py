@@ -11,8 +11,9 @@ import tempfile
 import threading
 import time
 import traceback
-import uuid
 import webbrowser
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
@@ -27,7 +28,24 @@ from fastapi.responses import (
 )
 from gradio_client.utils import is_file_obj_with_meta
 
-from daggr.executor import AsyncExecutor, FileValue
+from daggr._cancellation import remaining_time, run_deadline, validate_deadline
+from daggr._downloads import (
+    download_file_async,
+    get_lazy_file,
+    materialize_in_background,
+)
+from daggr._file_store import store_bytes, touch
+from daggr._pools import run_in_pool, shutdown_pools
+from daggr._run_queue import RunQueue, RunQueueFull
+from daggr._uploads import (
+    MAX_PENDING_UPLOADS,
+    PendingUpload,
+    UploadTooLarge,
+    receive_multipart,
+)
+from daggr.executor import AsyncExecutor, FileValue, NodeExecutionError
+from daggr.metrics import WEBSOCKET_SENDS_PENDING, WEBSOCKET_SENT_BYTES
+from daggr.metrics import render as render_metrics
 from daggr.node import (
     _FILE_TYPE_COMPONENTS,
     ChoiceNode,
@@ -36,8 +54,10 @@ from daggr.node import (
     InputNode,
     InteractionNode,
 )
+from daggr.result_cache import input_fingerprint
 from daggr.session import ExecutionSession
 from daggr.state import SessionState, get_daggr_cache_dir
+from daggr.tracing import get_trace, start_trace, traced, validate_run_id
 
 _FILE_COMP_TYPES = {c.lower() for c in _FILE_TYPE_COMPONENTS}
 
@@ -47,6 +67,9 @@ if TYPE_CHECKING:
     from daggr.graph import Graph
 
 
+ITEM_WRITE_BATCH = 64
+ITEM_WRITE_INTERVAL = 1.0
+
 INITIAL_PORT_VALUE = int(os.getenv("DAGGR_SERVER_PORT", "7860"))
 TRY_NUM_PORTS = int(os.getenv("DAGGR_NUM_PORTS", "100"))
 
@@ -106,6 +129,56 @@ def _get_theme(theme: "Theme | str | None") -> "Theme":
     return theme
 
 
+async def _send_json(websocket: WebSocket, message: dict) -> None:
+    """Send a message to a websocket client, counting it in `/metrics`."""
+    text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+    WEBSOCKET_SENDS_PENDING.inc()
+    try:
+        await websocket.send_text(text)
+    finally:
+        WEBSOCKET_SENDS_PENDING.dec()
+    WEBSOCKET_SENT_BYTES.inc(len(text.encode()), type=message.get("type", ""))
+
+
+class _ItemWriter:
+    """Saves a scattered node's item results as they finish, in batches.
+
+    Finished items are written in one transaction once `ITEM_WRITE_BATCH`
+    are pending or `ITEM_WRITE_INTERVAL` seconds have passed, so a failed or
+    cancelled run's finished items can still be reused. Call `flush` when
+    the node stops to write the rest.
+    """
+
+    def __init__(self, state: SessionState, sheet_id: str | None, node_name: str):
+        self.state = state
+        self.sheet_id = sheet_id
+        self.node_name = node_name
+        self._pending: list[tuple[int, Any, str | None]] = []
+        self._last_flush = time.monotonic()
+
+    async def add(self, event: dict[str, Any]) -> None:
+        if self.sheet_id is None or event["type"] != "item_complete":
+            return
+        if event["reused"]:
+            return
+        materialize_in_background(event["result"])
+        self._pending.append((event["index"], event["result"], event["fingerprint"]))
+        if (
+            len(self._pending) >= ITEM_WRITE_BATCH
+            or time.monotonic() - self._last_flush >= ITEM_WRITE_INTERVAL
+        ):
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        items, self._pending = self._pending, []
+        await run_in_pool(
+            "io", self.state.save_item_results, self.sheet_id, self.node_name, items
+        )
+
+
 class DaggrServer:
     def __init__(
         self,
@@ -117,12 +190,44 @@ class DaggrServer:
         self.api_server = api_server
         self.executor = AsyncExecutor(graph)
         self.state = SessionState(db_path=os.environ.get("DAGGR_DB_PATH"))
-        self.app = FastAPI(title=graph.name)
+        self.run_queue = RunQueue()
+        self.app = FastAPI(title=graph.name, lifespan=self._lifespan)
         self.connections: dict[str, WebSocket] = {}
         self.theme = _get_theme(theme)
         self.theme_css = self.theme._get_theme_css()
         self._setup_routes()
 
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        yield
+        # Stop the worker threads and processes so they don't keep the
+        # interpreter alive once the server is done.
+        shutdown_pools()
+
+    def _queue_user(self, user_id: str | None, connection: Request | WebSocket) -> str:
+        """Identify who a run is for, for fair queuing. UI and API runs use the
+        same key: the user's ID if known, otherwise their address."""
+        if user_id:
+            return f"user-{user_id}"
+        if connection.client is not None:
+            return f"host-{connection.client.host}"
+        return "anonymous"
+
+    def _get_request_user_id(self, authorization: str | None) -> str | None:
+        browser_token = self._extract_token_from_header(authorization)
+        if browser_token:
+            hf_user = self._validate_hf_token(browser_token)
+        else:
+            hf_user = self._get_hf_user_info()
+        return self.state.get_effective_user_id(hf_user)
+
+    def _queue_full_response(self, error: RunQueueFull, run_id: str) -> JSONResponse:
+        return JSONResponse(
+            {"error": str(error), "run_id": run_id, "retry_after": error.retry_after},
+            status_code=429,
+            headers={"Retry-After": str(error.retry_after)},
+        )
+
     def _extract_token_from_header(self, authorization: str | None) -> str | None:
         if authorization and authorization.startswith("Bearer "):
             return authorization[7:]
@@ -211,7 +316,9 @@ class DaggrServer:
                     {"error": "Login required to access sheets on Spaces"},
                     status_code=401,
                 )
-            sheets = self.state.list_sheets(user_id, self.graph.persist_key)
+            sheets = await run_in_pool(
+                "io", self.state.list_sheets, user_id, self.graph.persist_key
+            )
             return {"sheets": sheets, "user_id": user_id}
 
         @self.app.post("/api/sheets")
@@ -236,8 +343,10 @@ class DaggrServer:
                 )
             body = await request.json()
             name = body.get("name")
-            sheet_id = self.state.create_sheet(user_id, self.graph.persist_key, name)
-            sheet = self.state.get_sheet(sheet_id)
+            sheet_id = await run_in_pool(
+                "io", self.state.create_sheet, user_id, self.graph.persist_key, name
+            )
+            sheet = await run_in_pool("io", self.state.get_sheet, sheet_id)
             return {"sheet": sheet}
 
         @self.app.patch("/api/sheets/{sheet_id}")
@@ -254,7 +363,7 @@ class DaggrServer:
             user_id = self.state.get_effective_user_id(hf_user)
             if not user_id:
                 return JSONResponse({"error": "Login required"}, status_code=401)
-            sheet = self.state.get_sheet(sheet_id)
+            sheet = await run_in_pool("io", self.state.get_sheet, sheet_id)
             if not sheet:
                 return JSONResponse({"error": "Sheet not found"}, status_code=404)
             if sheet["user_id"] != user_id:
@@ -263,8 +372,11 @@ class DaggrServer:
             new_name = body.get("name")
             if not new_name:
                 return JSONResponse({"error": "Name required"}, status_code=400)
-            self.state.rename_sheet(sheet_id, new_name)
-            return {"success": True, "sheet": self.state.get_sheet(sheet_id)}
+            await run_in_pool("io", self.state.rename_sheet, sheet_id, new_name)
+            return {
+                "success": True,
+                "sheet": await run_in_pool("io", self.state.get_sheet, sheet_id),
+            }
 
         @self.app.delete("/api/sheets/{sheet_id}")
         async def delete_sheet(
@@ -278,12 +390,12 @@ class DaggrServer:
             user_id = self.state.get_effective_user_id(hf_user)
             if not user_id:
                 return JSONResponse({"error": "Login required"}, status_code=401)
-            sheet = self.state.get_sheet(sheet_id)
+            sheet = await run_in_pool("io", self.state.get_sheet, sheet_id)
             if not sheet:
                 return JSONResponse({"error": "Sheet not found"}, status_code=404)
             if sheet["user_id"] != user_id:
                 return JSONResponse({"error": "Access denied"}, status_code=403)
-            self.state.delete_sheet(sheet_id)
+            await run_in_pool("io", self.state.delete_sheet, sheet_id)
             return {"success": True}
 
         @self.app.get("/api/sheets/{sheet_id}/state")
@@ -298,24 +410,108 @@ class DaggrServer:
             user_id = self.state.get_effective_user_id(hf_user)
             if not user_id:
                 return JSONResponse({"error": "Login required"}, status_code=401)
-            sheet = self.state.get_sheet(sheet_id)
+            sheet = await run_in_pool("io", self.state.get_sheet, sheet_id)
             if not sheet:
                 return JSONResponse({"error": "Sheet not found"}, status_code=404)
             if sheet["user_id"] != user_id:
                 return JSONResponse({"error": "Access denied"}, status_code=403)
-            state = self.state.get_sheet_state(sheet_id)
+            state = await run_in_pool("io", self.state.get_sheet_state, sheet_id)
             return {"sheet": sheet, "state": state}
 
+        @self.app.post("/api/upload")
+        async def upload_files(request: Request):
+            try:
+                uploads = await receive_multipart(
+                    request.headers.get("content-type", ""), request.stream()
+                )
+            except UploadTooLarge as e:
+                return JSONResponse({"error": str(e)}, status_code=413)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            if not uploads:
+                return JSONResponse({"error": "No files uploaded"}, status_code=400)
+            return {
+                "files": [
+                    upload.to_handle(self._file_to_url(str(upload.path)))
+                    for upload in uploads
+                ]
+            }
+
         @self.app.post("/api/run/{node_name}")
-        async def run_to_node(node_name: str, data: dict):
+        async def run_to_node(node_name: str, data: dict, request: Request):
             session = ExecutionSession(self.graph)
             session_id = data.get("session_id")
             input_values = data.get("inputs", {})
             selected_results = data.get("selected_results", {})
-            return await self._execute_to_node(
-                session, node_name, session_id, input_values, selected_results
+            retry_items = data.get("retry_items")
+            try:
+                run_id = validate_run_id(data.get("run_id"))
+                if retry_items is not None:
+                    self._validate_retry_items(node_name, retry_items)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+            user_id = await run_in_pool(
+                "io",
+                self._get_request_user_id,
+                request.headers.get("authorization"),
+            )
+            try:
+                ticket = self.run_queue.admit(
+                    run_id, self._queue_user(user_id, request), "interactive"
+                )
+            except RunQueueFull as e:
+                return self._queue_full_response(e, run_id)
+            with start_trace(run_id):
+                async with ticket:
+                    graph_data = await self._execute_to_node(
+                        session,
+                        node_name,
+                        session_id,
+                        input_values,
+                        selected_results,
+                        retry_items,
+                    )
+            graph_data["run_id"] = run_id
+            return graph_data
+
+        @self.app.get("/api/queue")
+        async def get_queue_status():
+            return self.run_queue.status()
+
+        @self.app.get("/api/queue/{run_id}")
+        async def get_run_queue_position(run_id: str):
+            ticket = self.run_queue.get(run_id)
+            if ticket is None:
+                return JSONResponse(
+                    {"error": f"Run '{run_id}' is not queued or running"},
+                    status_code=404,
+                )
+            position = ticket.position
+            return {
+                "run_id": run_id,
+                "state": "running" if position is None else "queued",
+                "position": position,
+            }
+
+        @self.app.get("/metrics")
+        async def get_metrics():
+            return PlainTextResponse(
+                await run_in_pool("io", render_metrics),
+                media_type="text/plain; version=0.0.4",
             )
 
+        @self.app.get("/api/runs/{run_id}/trace")
+        async def get_run_trace(run_id: str, format: str = "chrome"):
+            trace = get_trace(run_id)
+            if trace is None:
+                return JSONResponse(
+                    {"error": f"No trace for run '{run_id}'"}, status_code=404
+                )
+            try:
+                return trace.export(format)
+            except ValueError as e:
+                return JSONResponse({"error": str(e)}, status_code=400)
+
         if self.api_server:
 
             @self.app.get("/api/schema")
@@ -341,8 +537,29 @@ class DaggrServer:
             user_id = self.state.get_effective_user_id(hf_user)
             current_sheet_id: str | None = None
 
-            session = ExecutionSession(self.graph)
+            session = ExecutionSession(self.graph, user_id=user_id)
             running_tasks: dict[str, asyncio.Task] = {}
+            uploads: dict[str, PendingUpload] = {}
+
+            async def receive_upload_chunk(frame: bytes):
+                upload_id, _, chunk = frame.partition(b"\n")
+                upload_id = upload_id.decode(errors="replace")
+                upload = uploads.get(upload_id)
+                if upload is None:
+                    return
+                try:
+                    await upload.write(chunk)
+                except UploadTooLarge as e:
+                    del uploads[upload_id]
+                    upload.abort()
+                    await _send_json(
+                        websocket,
+                        {
+                            "type": "upload_error",
+                            "upload_id": upload_id,
+                            "error": str(e),
+                        },
+                    )
 
             async def run_node_execution(
                 node_name: str,
@@ -353,35 +570,78 @@ class DaggrServer:
                 run_id: str,
                 user_id: str | None,
                 run_ancestors: bool = True,
+                deadline: float | None = None,
+                retry_items: list[int] | None = None,
             ):
+                async def send_position(position: int):
+                    await _send_json(
+                        websocket,
+                        {
+                            "type": "queued",
+                            "run_id": run_id,
+                            "node": node_name,
+                            "position": position,
+                        },
+                    )
+
                 try:
-                    async for result in self._execute_to_node_streaming(
-                        session,
-                        node_name,
-                        sheet_id,
-                        input_values,
-                        item_list_values,
-                        selected_results,
-                        run_id,
-                        user_id,
-                        run_ancestors,
-                    ):
-                        await websocket.send_json(result)
+                    deadline = validate_deadline(deadline)
+                    ticket = self.run_queue.admit(
+                        validate_run_id(run_id),
+                        self._queue_user(user_id, websocket),
+                        "interactive",
+                    )
+                    try:
+                        with start_trace(ticket.run_id), run_deadline(deadline):
+                            await ticket.wait(send_position)
+                            async for result in self._execute_to_node_streaming(
+                                session,
+                                node_name,
+                                sheet_id,
+                                input_values,
+                                item_list_values,
+                                selected_results,
+                                run_id,
+                                user_id,
+                                run_ancestors,
+                                retry_items,
+                            ):
+                                await _send_json(websocket, result)
+                    finally:
+                        ticket.release()
                 except asyncio.CancelledError:
                     pass
+                except RunQueueFull as e:
+                    await _send_json(
+                        websocket,
+                        {
+                            "type": "error",
+                            "run_id": run_id,
+                            "error": str(e),
+                            "node": node_name,
+                            "retry_after": e.retry_after,
+                        },
+                    )
                 except Exception as e:
-                    await websocket.send_json(
+                    await _send_json(
+                        websocket,
                         {
                             "type": "error",
                             "run_id": run_id,
                             "error": str(e),
                             "node": node_name,
-                        }
+                        },
                     )
 
             try:
                 while True:
-                    data = await websocket.receive_json()
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    if message.get("bytes") is not None:
+                        await receive_upload_chunk(message["bytes"])
+                        continue
+                    data = json.loads(message.get("text") or "{}")
                     action = data.get("action")
 
                     if "hf_token" in data:
@@ -397,9 +657,10 @@ class DaggrServer:
                             session.set_hf_token(None)
                         if old_user_id != user_id:
                             session.clear_results()
+                            session.user_id = user_id
                             current_sheet_id = None
 
-                    if action == "run":
+                    if action in ("run", "retry_items"):
                         node_name = data.get("node_name")
                         input_values = data.get("inputs", {})
                         item_list_values = data.get("item_list_values", {})
@@ -418,6 +679,10 @@ class DaggrServer:
                                 run_id,
                                 user_id,
                                 run_ancestors,
+                                data.get("deadline"),
+                                data.get("items", [])
+                                if action == "retry_items"
+                                else None,
                             )
                         )
                         running_tasks[run_id] = task
@@ -431,12 +696,13 @@ class DaggrServer:
                         task = running_tasks.get(cancel_run_id)
                         if task:
                             task.cancel()
-                        await websocket.send_json(
+                        await _send_json(
+                            websocket,
                             {
                                 "type": "cancelled",
                                 "run_id": cancel_run_id,
                                 "node": cancel_node,
-                            }
+                            },
                         )
 
                     elif action == "get_graph":
@@ -448,10 +714,14 @@ class DaggrServer:
                             persisted_transform = None
 
                             if user_id and sheet_id:
-                                sheet = self.state.get_sheet(sheet_id)
+                                sheet = await run_in_pool(
+                                    "io", self.state.get_sheet, sheet_id
+                                )
                                 if sheet and sheet["user_id"] == user_id:
                                     current_sheet_id = sheet_id
-                                    state = self.state.get_sheet_state(sheet_id)
+                                    state = await run_in_pool(
+                                        "io", self.state.get_sheet_state, sheet_id
+                                    )
                                     persisted_inputs = state.get("inputs", {})
                                     persisted_results = state.get("results", {})
                                     persisted_transform = sheet.get("transform")
@@ -480,14 +750,14 @@ class DaggrServer:
                             )
                             graph_data["transform"] = persisted_transform
 
-                            await websocket.send_json(
-                                {"type": "graph", "data": graph_data}
+                            await _send_json(
+                                websocket, {"type": "graph", "data": graph_data}
                             )
                         except Exception as e:
                             print(f"[ERROR] get_graph failed: {e}")
                             traceback.print_exc()
-                            await websocket.send_json(
-                                {"type": "error", "error": str(e)}
+                            await _send_json(
+                                websocket, {"type": "error", "error": str(e)}
                             )
 
                     elif action == "save_input":
@@ -496,11 +766,17 @@ class DaggrServer:
                             port_name = data.get("port_name")
                             value = data.get("value")
                             if node_id and port_name is not None:
-                                self.state.save_input(
-                                    current_sheet_id, node_id, port_name, value
+                                await run_in_pool(
+                                    "io",
+                                    self.state.save_input,
+                                    current_sheet_id,
+                                    node_id,
+                                    port_name,
+                                    value,
                                 )
-                                await websocket.send_json(
-                                    {"type": "input_saved", "node_id": node_id}
+                                await _send_json(
+                                    websocket,
+                                    {"type": "input_saved", "node_id": node_id},
                                 )
 
                     elif action == "save_transform":
@@ -508,41 +784,103 @@ class DaggrServer:
                             x = data.get("x", 0)
                             y = data.get("y", 0)
                             scale = data.get("scale", 1)
-                            self.state.save_transform(current_sheet_id, x, y, scale)
+                            await run_in_pool(
+                                "io",
+                                self.state.save_transform,
+                                current_sheet_id,
+                                x,
+                                y,
+                                scale,
+                            )
 
                     elif action == "set_sheet":
                         sheet_id = data.get("sheet_id")
                         if user_id and sheet_id:
-                            sheet = self.state.get_sheet(sheet_id)
+                            sheet = await run_in_pool(
+                                "io", self.state.get_sheet, sheet_id
+                            )
                             if sheet and sheet["user_id"] == user_id:
                                 current_sheet_id = sheet_id
                                 session.clear_results()
-                                await websocket.send_json(
-                                    {"type": "sheet_set", "sheet_id": sheet_id}
+                                await _send_json(
+                                    websocket,
+                                    {"type": "sheet_set", "sheet_id": sheet_id},
                                 )
 
                     elif action == "save_variant_selection":
                         node_id = data.get("node_id")
                         variant_index = data.get("variant_index", 0)
                         if user_id and current_sheet_id and node_id is not None:
-                            self.state.save_input(
+                            await run_in_pool(
+                                "io",
+                                self.state.save_input,
                                 current_sheet_id,
                                 node_id,
                                 "_selected_variant",
                                 variant_index,
                             )
-                            await websocket.send_json(
+                            await _send_json(
+                                websocket,
                                 {
                                     "type": "variant_selection_saved",
                                     "node_id": node_id,
                                     "variant_index": variant_index,
-                                }
+                                },
                             )
 
+                    elif action == "upload_start":
+                        upload_id = data.get("upload_id")
+                        if upload_id:
+                            previous = uploads.pop(upload_id, None)
+                            if previous is not None:
+                                previous.abort()
+                            if len(uploads) >= MAX_PENDING_UPLOADS:
+                                await _send_json(
+                                    websocket,
+                                    {
+                                        "type": "upload_error",
+                                        "upload_id": upload_id,
+                                        "error": "Too many uploads in progress: at "
+                                        f"most {MAX_PENDING_UPLOADS} at a time",
+                                    },
+                                )
+                            else:
+                                uploads[upload_id] = PendingUpload(data.get("name"))
+
+                    elif action == "upload_end":
+                        upload_id = data.get("upload_id")
+                        upload = uploads.pop(upload_id, None)
+                        if upload is not None:
+                            try:
+                                path = await upload.finish()
+                            except OSError as e:
+                                upload.abort()
+                                await _send_json(
+                                    websocket,
+                                    {
+                                        "type": "upload_error",
+                                        "upload_id": upload_id,
+                                        "error": str(e),
+                                    },
+                                )
+                            else:
+                                await _send_json(
+                                    websocket,
+                                    {
+                                        "type": "upload_complete",
+                                        "upload_id": upload_id,
+                                        **upload.to_handle(
+                                            self._file_to_url(str(path))
+                                        ),
+                                    },
+                                )
+
                     elif action == "clear_sheet":
                         if user_id and current_sheet_id:
-                            self.state.clear_sheet_data(current_sheet_id)
-                            await websocket.send_json({"type": "sheet_cleared"})
+                            await run_in_pool(
+                                "io", self.state.clear_sheet_data, current_sheet_id
+                            )
+                            await _send_json(websocket, {"type": "sheet_cleared"})
 
             except WebSocketDisconnect:
                 for task in running_tasks.values():
@@ -554,6 +892,10 @@ class DaggrServer:
                     task.cancel()
                 print(f"[ERROR] WebSocket error: {e}")
                 traceback.print_exc()
+            finally:
+                for upload in uploads.values():
+                    upload.abort()
+                uploads.clear()
 
         @self.app.get("/")
         async def serve_index():
@@ -585,19 +927,17 @@ class DaggrServer:
                 file_path = Path(path)
             else:
                 file_path = Path("/") / path
-            temp_dir = Path(tempfile.gettempdir()).resolve()
-            daggr_cache = get_daggr_cache_dir().resolve()
-
-            try:
-                resolved = file_path.resolve()
-                is_allowed = str(resolved).startswith(str(temp_dir)) or str(
-                    resolved
-                ).startswith(str(daggr_cache))
-                if not is_allowed:
-                    return Response(status_code=403)
-            except (ValueError, OSError):
+            resolved = self._resolve_servable_path(file_path)
+            if resolved is None:
                 return Response(status_code=403)
+            lazy = get_lazy_file(str(resolved))
+            if lazy is not None and not resolved.exists():
+                try:
+                    await download_file_async(*lazy)
+                except Exception:
+                    return Response(status_code=502)
             if resolved.exists() and resolved.is_file():
+                touch(resolved)
                 content_type, _ = mimetypes.guess_type(str(resolved))
                 return FileResponse(
                     resolved, media_type=content_type or "application/octet-stream"
@@ -672,16 +1012,11 @@ class DaggrServer:
         return type_map.get(class_name, class_name.upper())
 
     def _has_scattered_input(self, node_name: str) -> bool:
-        for edge in self.graph._edges:
-            if edge.target_node._name == node_name and edge.is_scattered:
-                return True
-        return False
+        return self.graph.get_plan().has_scattered_input(node_name)
 
     def _get_scattered_edge(self, node_name: str):
-        for edge in self.graph._edges:
-            if edge.target_node._name == node_name and edge.is_scattered:
-                return edge
-        return None
+        edges = self.graph.get_plan().scattered_edges.get(node_name)
+        return edges[0] if edges else None
 
     def _is_output_node(self, node_name: str) -> bool:
         return self.graph._nx_graph.out_degree(node_name) == 0
@@ -795,10 +1130,42 @@ class DaggrServer:
             "value": value,
         }
 
+    def _resolve_servable_path(self, file_path: Path) -> Path | None:
+        """Resolve a path if it's one daggr may serve (temp or cache files)."""
+        temp_dir = Path(tempfile.gettempdir()).resolve()
+        daggr_cache = get_daggr_cache_dir().resolve()
+        try:
+            resolved = file_path.resolve()
+        except (ValueError, OSError):
+            return None
+        if str(resolved).startswith(str(temp_dir)) or str(resolved).startswith(
+            str(daggr_cache)
+        ):
+            return resolved
+        return None
+
+    def _file_from_url(self, value: Any) -> Any:
+        """Turn a `/file/...` URL from the client back into the local file.
+
+        Inverse of `_file_to_url`, used for uploaded files referenced in
+        inputs. Other values are returned unchanged.
+        """
+        if not isinstance(value, str) or not value.startswith("/file/"):
+            return value
+        path = value[len("/file/") :]
+        file_path = (
+            Path(path) if len(path) >= 2 and path[1] == ":" else Path("/") / path
+        )
+        resolved = self._resolve_servable_path(file_path)
+        if resolved is None or not resolved.is_file():
+            return value
+        return FileValue(str(resolved))
+
     def _file_to_url(self, value: Any) -> Any:
         if isinstance(value, str) and not value.startswith("/file/"):
             path = Path(value)
-            if path.is_absolute() and path.exists():
+            is_lazy = isinstance(value, FileValue) and value.url is not None
+            if path.is_absolute() and (is_lazy or path.exists()):
                 normalized = value.replace("\\", "/")
                 if normalized.startswith("/"):
                     return f"/file{normalized}"
@@ -898,6 +1265,47 @@ class DaggrServer:
             components.append(comp_data)
         return components, validation_error
 
+    def _is_audio_item_output(self, node) -> bool:
+        for comp in node._output_components.values():
+            if comp is None:
+                continue
+            if self._get_component_type(comp) == "audio":
+                return True
+        return False
+
+    def _build_scattered_item(
+        self, index: int, source_item: Any, item_result: Any, is_audio_output: bool
+    ) -> dict[str, Any]:
+        preview = ""
+        output = None
+
+        if isinstance(source_item, dict):
+            preview_parts = [
+                f"{k}: {str(v)[:20]}" for k, v in list(source_item.items())[:2]
+            ]
+            preview = ", ".join(preview_parts)
+        elif source_item:
+            preview = str(source_item)[:50]
+
+        if isinstance(item_result, dict):
+            first_key = list(item_result.keys())[0] if item_result else None
+            if first_key:
+                output = item_result[first_key]
+        else:
+            output = item_result
+
+        if output:
+            output = str(output)
+
+        failed = isinstance(item_result, dict) and set(item_result) == {"error"}
+        return {
+            "index": index + 1,
+            "preview": preview or f"Item {index + 1}",
+            "output": output,
+            "is_audio_output": is_audio_output,
+            "status": "error" if failed else "completed",
+        }
+
     def _build_scattered_items(
         self, node_name: str, result: Any = None
     ) -> list[dict[str, Any]]:
@@ -905,15 +1313,7 @@ class DaggrServer:
         if not scattered_edge:
             return []
 
-        node = self.graph.nodes[node_name]
-        item_output_type = "text"
-        for comp in node._output_components.values():
-            if comp is None:
-                continue
-            comp_type = self._get_component_type(comp)
-            if comp_type == "audio":
-                item_output_type = "audio"
-                break
+        is_audio_output = self._is_audio_item_output(self.graph.nodes[node_name])
 
         items = []
         if result and isinstance(result, dict) and "_scattered_results" in result:
@@ -921,37 +1321,42 @@ class DaggrServer:
             source_items = result.get("_items", [])
             for i, item_result in enumerate(results):
                 source_item = source_items[i] if i < len(source_items) else None
-                preview = ""
-                output = None
-
-                if isinstance(source_item, dict):
-                    preview_parts = [
-                        f"{k}: {str(v)[:20]}" for k, v in list(source_item.items())[:2]
-                    ]
-                    preview = ", ".join(preview_parts)
-                elif source_item:
-                    preview = str(source_item)[:50]
-
-                if isinstance(item_result, dict):
-                    first_key = list(item_result.keys())[0] if item_result else None
-                    if first_key:
-                        output = item_result[first_key]
-                else:
-                    output = item_result
-
-                if output:
-                    output = str(output)
-
                 items.append(
-                    {
-                        "index": i + 1,
-                        "preview": preview or f"Item {i + 1}",
-                        "output": output,
-                        "is_audio_output": item_output_type == "audio",
-                    }
+                    self._build_scattered_item(
+                        i, source_item, item_result, is_audio_output
+                    )
                 )
         return items
 
+    def _build_progress_event(
+        self, event: dict[str, Any], run_id: str
+    ) -> dict[str, Any]:
+        node_name = event["node"]
+        if event["type"] == "node_partial":
+            node = self.graph.nodes[node_name]
+            output_components, _ = self._build_output_components(node, event["result"])
+            return {
+                "type": "node_partial",
+                "node": node_name,
+                "run_id": run_id,
+                "output_components": output_components,
+            }
+        if event["type"] in ("node_status", "variant_won"):
+            return {**event, "run_id": run_id}
+        is_audio_output = self._is_audio_item_output(self.graph.nodes[node_name])
+        return {
+            "type": "item_complete",
+            "node": node_name,
+            "run_id": run_id,
+            "index": event["index"],
+            "item": self._build_scattered_item(
+                event["index"], event["item"], event["result"], is_audio_output
+            ),
+            "execution_time_ms": event["execution_time_ms"],
+            "completed": event["completed"],
+            "total": event["total"],
+        }
+
     def _serialize_item_list_schema(
         self, schema: dict[str, Any]
     ) -> list[dict[str, Any]]:
@@ -1003,28 +1408,7 @@ class DaggrServer:
         return result
 
     def _compute_node_depths(self) -> dict[str, int]:
-        depths: dict[str, int] = {}
-        connections = self.graph.get_connections()
-
-        for node_name in self.graph.nodes:
-            if self.graph._nx_graph.in_degree(node_name) == 0:
-                depths[node_name] = 0
-
-        changed = True
-        while changed:
-            changed = False
-            for source, _, target, _ in connections:
-                if source in depths:
-                    new_depth = depths[source] + 1
-                    if target not in depths or depths[target] < new_depth:
-                        depths[target] = new_depth
-                        changed = True
-
-        for node_name in self.graph.nodes:
-            if node_name not in depths:
-                depths[node_name] = 0
-
-        return depths
+        return dict(self.graph.get_plan().levels)
 
     def _get_hf_user_info(self) -> dict | None:
         try:
@@ -1043,6 +1427,7 @@ class DaggrServer:
         except Exception:
             return None
 
+    @traced("build_graph_data")
     def _build_graph_data(
         self,
         node_results: dict[str, Any] | None = None,
@@ -1390,16 +1775,167 @@ class DaggrServer:
             "session_id": session_id,
         }
 
+    async def _input_fingerprint(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        user_input: dict[str, Any],
+        running: dict[str, asyncio.Future],
+        item_list_values: dict,
+    ) -> str | None:
+        """Fingerprint a node's inputs from its upstream results.
+
+        A node pipelined behind its stream source starts before the source's
+        result is known, so it's keyed by the source's input fingerprint (and
+        any item edits applied to its result) instead.
+        """
+        plan = self.graph.get_plan()
+        source = plan.stream_sources.get(node_name)
+        upstream = {}
+        for name in plan.predecessors[node_name]:
+            if name == source and name in running:
+                source_fingerprint = await running[name]
+                if source_fingerprint is None:
+                    return None
+                node_id = name.replace(" ", "_").replace("-", "_")
+                upstream[name] = {
+                    "fingerprint": source_fingerprint,
+                    "edits": item_list_values.get(node_id),
+                }
+            elif name in session.results:
+                upstream[name] = session.results[name]
+        return await run_in_pool(
+            "io",
+            input_fingerprint,
+            self.graph.nodes[node_name],
+            user_input,
+            upstream,
+            session.selected_variants.get(node_name),
+        )
+
+    async def _find_reusable_result(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        fingerprint: str | None,
+        sheet_id: str | None,
+        selected_results: dict[str, int],
+    ) -> Any | None:
+        """Find a result of `node_name` computed from the same inputs, so the
+        node needn't re-run.
+
+        The selected (or latest) persisted result is preferred, then the most
+        recent one in the sheet's history with a matching fingerprint, then the
+        session's in-memory result. Results stored without a fingerprint, or
+        inputs that can't be fingerprinted, can't be shown to be up to date,
+        so the node re-runs.
+        """
+        if fingerprint is None:
+            return None
+        if sheet_id is not None:
+            fingerprints = await run_in_pool(
+                "io", self.state.get_result_fingerprints, sheet_id, node_name
+            )
+            if fingerprints:
+                index = selected_results.get(node_name, len(fingerprints) - 1)
+                if not 0 <= index < len(fingerprints):
+                    index = len(fingerprints) - 1
+                if fingerprints[index] != fingerprint:
+                    matches = [
+                        i for i, fp in enumerate(fingerprints) if fp == fingerprint
+                    ]
+                    index = matches[-1] if matches else None
+                if index is not None:
+                    cached = await run_in_pool(
+                        "io", self.state.get_result_by_index, sheet_id, node_name, index
+                    )
+                    if cached is not None:
+                        selected_results[node_name] = index
+                        session.result_fingerprints[node_name] = fingerprint
+                        return self._convert_urls_to_file_values(cached)
+
+        if node_name in session.results:
+            if session.result_fingerprints.get(node_name) == fingerprint:
+                return session.results[node_name]
+        return None
+
+    def _validate_retry_items(self, node_name: str, retry_items: Any) -> None:
+        if node_name not in self.graph.nodes:
+            raise ValueError(f"Node '{node_name}' not found")
+        if not self.graph.get_plan().has_scattered_input(node_name):
+            raise ValueError(
+                f"Node '{node_name}' has no scattered inputs, so it has no items to retry"
+            )
+        if not isinstance(retry_items, list) or not all(
+            isinstance(i, int) and not isinstance(i, bool) for i in retry_items
+        ):
+            raise ValueError(
+                f"retry_items must be a list of item indices, got {retry_items!r}"
+            )
+
+    async def _prepare_item_retry(
+        self,
+        session: ExecutionSession,
+        node_name: str,
+        retry_items: list[int],
+        sheet_id: str | None,
+    ) -> list[str]:
+        """Set up a re-run of a scattered node's failed items and `retry_items`.
+
+        The stored item results of the node and of scattered nodes downstream
+        of it are made reusable, except for the items to retry. Returns the
+        downstream nodes that already have results, to re-run with the new
+        items.
+        """
+        self._validate_retry_items(node_name, retry_items)
+        plan = self.graph.get_plan()
+        descendants = []
+        for name in plan.descendants(node_name):
+            if name in session.results or (
+                sheet_id is not None
+                and await run_in_pool("io", self.state.get_result_count, sheet_id, name)
+            ):
+                descendants.append(name)
+
+        for name in [node_name, *descendants]:
+            if not plan.has_scattered_input(name):
+                continue
+            stored = await self._get_stored_items(session, name, sheet_id)
+            if name == node_name:
+                for index in retry_items:
+                    stored.pop(index, None)
+            session.reusable_items[name] = stored
+        return descendants
+
+    async def _get_stored_items(
+        self, session: ExecutionSession, node_name: str, sheet_id: str | None
+    ) -> dict[int, tuple[str | None, Any]]:
+        if sheet_id is not None:
+            stored = await run_in_pool(
+                "io", self.state.get_item_results, sheet_id, node_name
+            )
+            if stored:
+                return {
+                    index: (fingerprint, self._convert_urls_to_file_values(result))
+                    for index, (fingerprint, result) in stored.items()
+                }
+        result = session.results.get(node_name)
+        if not isinstance(result, dict) or "_item_fingerprints" not in result:
+            return {}
+        return dict(
+            enumerate(zip(result["_item_fingerprints"], result["_scattered_results"]))
+        )
+
+    def _get_nodes_to_execute(self, targets: list[str] | set[str]) -> list[str]:
+        """Get `targets` and all their ancestors, in topological order."""
+        plan = self.graph.get_plan()
+        names = set(targets)
+        for target in targets:
+            names.update(plan.ancestors(target))
+        return sorted(names, key=plan.index.__getitem__)
+
     def _get_ancestors(self, node_name: str) -> list[str]:
-        ancestors = set()
-        to_visit = [node_name]
-        while to_visit:
-            current = to_visit.pop()
-            for source, _, target, _ in self.graph.get_connections():
-                if target == current and source not in ancestors:
-                    ancestors.add(source)
-                    to_visit.append(source)
-        return list(ancestors)
+        return self.graph.get_plan().ancestors(node_name)
 
     def _get_user_provided_output(
         self, node, node_id: str, input_values: dict[str, Any]
@@ -1421,7 +1957,7 @@ class DaggrServer:
                 if value is not None:
                     if isinstance(value, str) and value.startswith("data:"):
                         value = self._save_data_url_as_gradio_file(value)
-                    result[port_name] = value
+                    result[port_name] = self._file_from_url(value)
                     has_user_value = True
 
         return result if has_user_value else None
@@ -1441,12 +1977,7 @@ class DaggrServer:
                 "audio/mpeg": ".mp3",
             }
             ext = ext_map.get(mime_type, ".bin")
-            file_data = base64.b64decode(data)
-            temp_dir = Path(tempfile.gettempdir()) / "daggr_uploads"
-            temp_dir.mkdir(exist_ok=True)
-            file_path = temp_dir / f"{uuid.uuid4()}{ext}"
-            file_path.write_bytes(file_data)
-            return FileValue(str(file_path))
+            return FileValue(store_bytes(base64.b64decode(data), ext))
         except Exception as e:
             print(f"[ERROR] Failed to save data URL: {e}")
             return data_url
@@ -1483,9 +2014,14 @@ class DaggrServer:
         session_id: str | None,
         input_values: dict[str, Any],
         selected_results: dict[str, int],
+        retry_items: list[int] | None = None,
     ) -> dict:
         if not session_id:
-            session_id = self.state.create_session(self.graph.persist_key)
+            session_id = await run_in_pool(
+                "io", self.state.create_session, self.graph.persist_key
+            )
+        # Item results are saved, so a later run can retry just some of them.
+        session.keep_item_results = True
 
         for node_name, node in self.graph.nodes.items():
             if isinstance(node, ChoiceNode):
@@ -1493,10 +2029,14 @@ class DaggrServer:
                 variant_idx = input_values.get(node_id, {}).get("_selected_variant", 0)
                 session.selected_variants[node_name] = variant_idx
 
-        ancestors = self._get_ancestors(target_node)
-        nodes_to_run = ancestors + [target_node]
-        execution_order = self.graph.get_execution_order()
-        nodes_to_execute = [n for n in execution_order if n in nodes_to_run]
+        rerun = {target_node}
+        if retry_items is not None:
+            rerun.update(
+                await self._prepare_item_retry(
+                    session, target_node, retry_items, session_id
+                )
+            )
+        nodes_to_execute = self._get_nodes_to_execute(rerun)
 
         entry_inputs: dict[str, dict[str, Any]] = {}
         for node_name in nodes_to_execute:
@@ -1510,14 +2050,14 @@ class DaggrServer:
                     if input_node_id in input_values:
                         value = input_values[input_node_id].get("value")
                         if value is not None:
-                            node_inputs[port_name] = value
+                            node_inputs[port_name] = self._file_from_url(value)
 
                     current_node_id = node_name.replace(" ", "_").replace("-", "_")
                     if current_node_id in input_values:
                         if port_name in input_values[current_node_id]:
                             value = input_values[current_node_id][port_name]
                             if value is not None:
-                                node_inputs[port_name] = value
+                                node_inputs[port_name] = self._file_from_url(value)
 
                 if node_inputs:
                     entry_inputs[node_name] = node_inputs
@@ -1530,12 +2070,20 @@ class DaggrServer:
         existing_results = {}
         if session_id:
             for node_name in nodes_to_execute:
+                if retry_items is not None and node_name in rerun:
+                    continue
                 if node_name in selected_results:
-                    cached = self.state.get_result_by_index(
-                        session_id, node_name, selected_results[node_name]
+                    cached = await run_in_pool(
+                        "io",
+                        self.state.get_result_by_index,
+                        session_id,
+                        node_name,
+                        selected_results[node_name],
                     )
                 else:
-                    cached = self.state.get_latest_result(session_id, node_name)
+                    cached = await run_in_pool(
+                        "io", self.state.get_latest_result, session_id, node_name
+                    )
                 if cached is not None:
                     existing_results[node_name] = self._convert_urls_to_file_values(
                         cached
@@ -1545,34 +2093,83 @@ class DaggrServer:
             if k not in session.results:
                 session.results[k] = v
 
-        if target_node in session.results:
-            del session.results[target_node]
+        for node_name in rerun:
+            session.results.pop(node_name, None)
 
         node_results = {}
         node_statuses = {}
 
-        for node_name in nodes_to_execute:
+        async def run_node(node_name: str):
             if node_name in existing_results:
                 node_results[node_name] = existing_results[node_name]
                 node_statuses[node_name] = "completed"
-                continue
+                return
 
             if node_name in session.results:
                 node_results[node_name] = session.results[node_name]
                 node_statuses[node_name] = "completed"
-                continue
+                return
 
             node_statuses[node_name] = "running"
             user_input = entry_inputs.get(node_name, {})
-            result = await self.executor.execute_node(session, node_name, user_input)
+            events: asyncio.Queue = asyncio.Queue()
+            task = asyncio.ensure_future(
+                self.executor.execute_node(
+                    session, node_name, user_input, on_event=events.put_nowait
+                )
+            )
+            items = _ItemWriter(self.state, session_id, node_name)
+            try:
+                async for event in self._iter_events(task, events):
+                    await items.add(event)
+            finally:
+                await items.flush()
+            result = task.result()
             node_results[node_name] = result
             node_statuses[node_name] = "completed"
-            self.state.save_result(session_id, node_name, result)
+            materialize_in_background(result)
+            await run_in_pool(
+                "io", self.state.save_result, session_id, node_name, result
+            )
+            yield node_name
+
+        try:
+            async for _ in self.executor.execute_wavefront(
+                nodes_to_execute, run_node, session
+            ):
+                pass
+        except NodeExecutionError as e:
+            raise e.error
+        finally:
+            for node_name in nodes_to_execute:
+                session.reusable_items.pop(node_name, None)
 
         return self._build_graph_data(
             node_results, node_statuses, input_values, {}, session_id, selected_results
         )
 
+    async def _iter_events(self, task: asyncio.Future, events: asyncio.Queue):
+        """Yield events from `events` until `task` finishes, then drain the rest.
+
+        The task is cancelled if the consumer stops iterating early.
+        """
+        try:
+            while not task.done():
+                getter = asyncio.ensure_future(events.get())
+                done, _ = await asyncio.wait(
+                    {task, getter}, return_when=asyncio.FIRST_COMPLETED
+                )
+                if getter in done:
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            while not events.empty():
+                yield events.get_nowait()
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
     async def _execute_to_node_streaming(
         self,
         session: ExecutionSession,
@@ -1584,12 +2181,23 @@ class DaggrServer:
         run_id: str,
         user_id: str | None = None,
         run_ancestors: bool = True,
+        retry_items: list[int] | None = None,
     ):
+        """Run `target_node`, and its ancestors if `run_ancestors`, yielding
+        progress events and graph updates.
+
+        With `retry_items`, the target must be a scattered node: only its failed
+        items and the items listed are re-run, reusing the stored results of the
+        rest, and downstream nodes that already have results are re-run with
+        the new items.
+        """
         can_persist = (
             user_id is not None
             and sheet_id is not None
             and self.graph.persist_key is not None
         )
+        # Item results are kept, saved or in the session, for retries.
+        session.keep_item_results = True
 
         for node_name, node in self.graph.nodes.items():
             if isinstance(node, ChoiceNode):
@@ -1597,13 +2205,15 @@ class DaggrServer:
                 variant_idx = input_values.get(node_id, {}).get("_selected_variant", 0)
                 session.selected_variants[node_name] = variant_idx
 
-        if run_ancestors:
-            ancestors = self._get_ancestors(target_node)
-            nodes_to_run = ancestors + [target_node]
+        if retry_items is not None:
+            descendants = await self._prepare_item_retry(
+                session, target_node, retry_items, sheet_id if can_persist else None
+            )
+            nodes_to_execute = self._get_nodes_to_execute([target_node, *descendants])
+        elif run_ancestors:
+            nodes_to_execute = self._get_ancestors(target_node) + [target_node]
         else:
-            nodes_to_run = [target_node]
-        execution_order = self.graph.get_execution_order()
-        nodes_to_execute = [n for n in execution_order if n in nodes_to_run]
+            nodes_to_execute = [target_node]
 
         entry_inputs: dict[str, dict[str, Any]] = {}
         for node_name in nodes_to_execute:
@@ -1617,14 +2227,14 @@ class DaggrServer:
                     if input_node_id in input_values:
                         value = input_values[input_node_id].get("value")
                         if value is not None:
-                            node_inputs[port_name] = value
+                            node_inputs[port_name] = self._file_from_url(value)
 
                     current_node_id = node_name.replace(" ", "_").replace("-", "_")
                     if current_node_id in input_values:
                         if port_name in input_values[current_node_id]:
                             value = input_values[current_node_id][port_name]
                             if value is not None:
-                                node_inputs[port_name] = value
+                                node_inputs[port_name] = self._file_from_url(value)
 
                 if node_inputs:
                     entry_inputs[node_name] = node_inputs
@@ -1646,46 +2256,66 @@ class DaggrServer:
                         "inputs": input_values,
                         "selected_results": selected_results,
                     }
-                    self.state.save_result(sheet_id, node_name, user_output, snapshot)
-                continue
-
-            if node_name == target_node:
-                continue
-
-            if can_persist:
-                if node_name in selected_results:
-                    cached = self.state.get_result_by_index(
-                        sheet_id, node_name, selected_results[node_name]
-                    )
-                else:
-                    cached = self.state.get_latest_result(sheet_id, node_name)
-                if cached is not None:
-                    existing_results[node_name] = self._convert_urls_to_file_values(
-                        cached
+                    materialize_in_background(user_output)
+                    await run_in_pool(
+                        "io",
+                        self.state.save_result,
+                        sheet_id,
+                        node_name,
+                        user_output,
+                        snapshot,
                     )
-
-        for k, v in existing_results.items():
-            if k not in session.results:
-                session.results[k] = v
+                continue
 
         if target_node in session.results:
             del session.results[target_node]
 
         node_results = {}
         node_statuses = {}
+        loop = asyncio.get_running_loop()
+        fingerprints = {name: loop.create_future() for name in nodes_to_execute}
 
-        try:
-            for node_name in nodes_to_execute:
-                if node_name in existing_results:
-                    result = existing_results[node_name]
+        async def run_node(node_name: str):
+            if node_name in existing_results:
+                fingerprints[node_name].set_result(None)
+                result = existing_results[node_name]
+                result = self._apply_item_list_edits(
+                    node_name, result, item_list_values
+                )
+                node_results[node_name] = result
+                session.results[node_name] = result
+                session.result_fingerprints.pop(node_name, None)
+                node_statuses[node_name] = "completed"
+                return
+
+            user_input = entry_inputs.get(node_name, {})
+            fingerprint = await self._input_fingerprint(
+                session, node_name, user_input, fingerprints, item_list_values
+            )
+            fingerprints[node_name].set_result(fingerprint)
+
+            if node_name != target_node:
+                reusable = await self._find_reusable_result(
+                    session,
+                    node_name,
+                    fingerprint,
+                    sheet_id if can_persist else None,
+                    selected_results,
+                )
+                if reusable is not None:
                     result = self._apply_item_list_edits(
-                        node_name, result, item_list_values
+                        node_name, reusable, item_list_values
                     )
                     node_results[node_name] = result
                     session.results[node_name] = result
                     node_statuses[node_name] = "completed"
-                    continue
+                    return
 
+            can_execute = await session.start_node_execution(node_name)
+            if not can_execute:
+                if node_name == target_node:
+                    return
+                await session.wait_for_node(node_name)
                 if node_name in session.results:
                     result = session.results[node_name]
                     result = self._apply_item_list_edits(
@@ -1693,78 +2323,91 @@ class DaggrServer:
                     )
                     node_results[node_name] = result
                     node_statuses[node_name] = "completed"
-                    continue
+                    return
 
-                can_execute = await session.start_node_execution(node_name)
-                if not can_execute:
-                    if node_name == target_node:
-                        return
-                    await session.wait_for_node(node_name)
-                    if node_name in session.results:
-                        result = session.results[node_name]
-                        result = self._apply_item_list_edits(
-                            node_name, result, item_list_values
-                        )
-                        node_results[node_name] = result
-                        node_statuses[node_name] = "completed"
-                        continue
-
-                try:
-                    node_statuses[node_name] = "running"
-                    user_input = entry_inputs.get(node_name, {})
-
-                    yield {
-                        "type": "node_started",
-                        "started_node": node_name,
-                        "run_id": run_id,
-                    }
+            try:
+                node_statuses[node_name] = "running"
 
-                    start_time = time.time()
-                    result = await self.executor.execute_node(
-                        session, node_name, user_input
-                    )
-                    elapsed_ms = (time.time() - start_time) * 1000
+                yield {
+                    "type": "node_started",
+                    "started_node": node_name,
+                    "run_id": run_id,
+                }
 
-                    result = self._apply_item_list_edits(
-                        node_name, result, item_list_values
+                start_time = time.time()
+                events: asyncio.Queue = asyncio.Queue()
+                task = asyncio.ensure_future(
+                    self.executor.execute_node(
+                        session, node_name, user_input, on_event=events.put_nowait
                     )
-                    session.results[node_name] = result
-                    node_results[node_name] = result
-                    node_statuses[node_name] = "completed"
+                )
+                items = _ItemWriter(
+                    self.state, sheet_id if can_persist else None, node_name
+                )
+                try:
+                    async for event in self._iter_events(task, events):
+                        await items.add(event)
+                        yield self._build_progress_event(event, run_id)
+                finally:
+                    await items.flush()
+                result = task.result()
+                elapsed_ms = (time.time() - start_time) * 1000
 
-                    if can_persist:
-                        current_count = self.state.get_result_count(sheet_id, node_name)
-                        snapshot = {
-                            "inputs": input_values,
-                            "selected_results": selected_results,
-                        }
-                        self.state.save_result(sheet_id, node_name, result, snapshot)
-                        selected_results[node_name] = current_count
+                result = self._apply_item_list_edits(
+                    node_name, result, item_list_values
+                )
+                session.results[node_name] = result
+                session.result_fingerprints[node_name] = fingerprint
+                node_results[node_name] = result
+                node_statuses[node_name] = "completed"
 
-                    graph_data = self._build_graph_data(
-                        node_results,
-                        node_statuses,
-                        input_values,
-                        {},
+                if can_persist:
+                    current_count = await run_in_pool(
+                        "io", self.state.get_result_count, sheet_id, node_name
+                    )
+                    snapshot = {
+                        "inputs": input_values,
+                        "selected_results": selected_results,
+                    }
+                    materialize_in_background(result)
+                    await run_in_pool(
+                        "io",
+                        self.state.save_result,
                         sheet_id,
-                        selected_results,
+                        node_name,
+                        result,
+                        snapshot,
+                        fingerprint,
                     )
-                    graph_data["type"] = "node_complete"
-                    graph_data["completed_node"] = node_name
-                    graph_data["run_id"] = run_id
-                    graph_data["execution_time_ms"] = elapsed_ms
-                finally:
-                    await session.finish_node_execution(node_name)
-                yield graph_data
+                    selected_results[node_name] = current_count
+
+                graph_data = self._build_graph_data(
+                    node_results,
+                    node_statuses,
+                    input_values,
+                    {},
+                    sheet_id,
+                    selected_results,
+                )
+                graph_data["type"] = "node_complete"
+                graph_data["completed_node"] = node_name
+                graph_data["run_id"] = run_id
+                graph_data["execution_time_ms"] = elapsed_ms
+            finally:
+                await session.finish_node_execution(node_name)
+            yield graph_data
+
+        try:
+            async for _, message in self.executor.execute_wavefront(
+                nodes_to_execute, run_node, session
+            ):
+                yield message
 
         except Exception as e:
-            error_node = None
-            if nodes_to_execute:
-                current_idx = len(node_results)
-                if current_idx < len(nodes_to_execute):
-                    error_node = nodes_to_execute[current_idx]
-                    node_statuses[error_node] = "error"
-                    node_results[error_node] = {"error": str(e)}
+            error_node = getattr(e, "node_name", None)
+            if error_node:
+                node_statuses[error_node] = "error"
+                node_results[error_node] = {"error": str(e)}
 
             graph_data = self._build_graph_data(
                 node_results,
@@ -1782,6 +2425,9 @@ class DaggrServer:
                 graph_data["node"] = error_node
                 graph_data["completed_node"] = error_node
             yield graph_data
+        finally:
+            for node_name in nodes_to_execute:
+                session.reusable_items.pop(node_name, None)
 
     async def _execute_workflow_api(
         self, request: Request, subgraph_id: str | None = None
@@ -1792,6 +2438,11 @@ class DaggrServer:
             body = {}
 
         input_values = body.get("inputs", {})
+        try:
+            deadline = validate_deadline(body.get("deadline"))
+            run_id = validate_run_id(body.get("run_id"))
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
         session = ExecutionSession(self.graph)
 
         subgraphs = self.graph.get_subgraphs()
@@ -1851,25 +2502,57 @@ class DaggrServer:
                         " ", "_"
                     ).replace("-", "_")
                     if input_node_id in input_values:
-                        node_inputs[port_name] = input_values[input_node_id]
+                        node_inputs[port_name] = self._file_from_url(
+                            input_values[input_node_id]
+                        )
                 if node_inputs:
                     entry_inputs[node_name] = node_inputs
 
         session.results = {}
         node_results = {}
+        user_id = await run_in_pool(
+            "io", self._get_request_user_id, request.headers.get("authorization")
+        )
+        try:
+            ticket = self.run_queue.admit(
+                run_id, self._queue_user(user_id, request), "batch"
+            )
+        except RunQueueFull as e:
+            return self._queue_full_response(e, run_id)
+
+        async def run_node(node_name: str):
+            user_input = entry_inputs.get(node_name, {})
+            node_results[node_name] = await self.executor.execute_node(
+                session, node_name, user_input
+            )
+            yield node_name
 
         try:
-            for node_name in nodes_to_execute:
-                user_input = entry_inputs.get(node_name, {})
-                result = await self.executor.execute_node(
-                    session, node_name, user_input
-                )
-                node_results[node_name] = result
-        except Exception as e:
+            with start_trace(run_id), run_deadline(deadline):
+                try:
+                    await asyncio.wait_for(ticket.wait(), remaining_time())
+                except asyncio.TimeoutError:
+                    return JSONResponse(
+                        {
+                            "error": "Run deadline exceeded while queued",
+                            "run_id": run_id,
+                        },
+                        status_code=504,
+                    )
+                async for _ in self.executor.execute_wavefront(
+                    nodes_to_execute, run_node, session
+                ):
+                    pass
+        except NodeExecutionError as e:
             return JSONResponse(
-                {"error": f"Execution error in node '{node_name}': {str(e)}"},
-                status_code=500,
+                {
+                    "error": f"Execution error in node '{e.node_name}': {str(e.error)}",
+                    "run_id": run_id,
+                },
+                status_code=504 if isinstance(e.error, TimeoutError) else 500,
             )
+        finally:
+            ticket.release()
 
         outputs = {}
         for node_name in nodes_to_execute:
@@ -1878,7 +2561,7 @@ class DaggrServer:
                 result = self._transform_file_paths(result)
                 outputs[node_name] = result
 
-        return JSONResponse({"outputs": outputs})
+        return JSONResponse({"outputs": outputs, "run_id": run_id})
 
     def run(
         self,
@@ -5,6 +5,8 @@ from __future__ import annotations
 import asyncio
 from typing import TYPE_CHECKING, Any
 
+from daggr.result_cache import ResultCache
+
 if TYPE_CHECKING:
     from daggr.graph import Graph
 
@@ -47,29 +49,98 @@ class ConcurrencyManager:
         return None
 
 
+class ItemStream:
+    """Per-item results of a scattered node, published as each item finishes.
+
+    A node that scatters over a still-running scattered node reads its items
+    from the stream, so each item can move down the chain as soon as it is
+    ready. Readers fall back to the node's final result once the stream is
+    closed.
+    """
+
+    def __init__(self):
+        self.total: int | None = None
+        self.closed = False
+        self._items: dict[int, Any] = {}
+        self._changed = asyncio.Event()
+
+    def set_total(self, total: int):
+        self.total = total
+        self._notify()
+
+    def publish(self, index: int, result: Any):
+        self._items[index] = result
+        self._notify()
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+    async def wait_total(self) -> int | None:
+        """Wait until the item count is known. Returns None if the stream closed
+        without the node publishing any items."""
+        while self.total is None and not self.closed:
+            await self._changed.wait()
+        return self.total
+
+    async def get(self, index: int) -> tuple[bool, Any]:
+        """Wait for an item's result. Returns (available, result)."""
+        while index not in self._items and not self.closed:
+            await self._changed.wait()
+        return index in self._items, self._items.get(index)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
 class ExecutionSession:
     """Per-session execution context.
 
     Each WebSocket connection gets its own ExecutionSession, providing:
     - Isolated HF token
     - Isolated results cache
+    - Session-scoped memoized node results
     - Isolated Gradio client cache
     - Per-session concurrency management
     - Node execution coordination (wait for dependencies)
+
+    `user_id` identifies the user for fair queuing on server-wide concurrency
+    limits. Sessions without one are queued as separate users.
+
+    `reusable_items` holds, per scattered node, item results from an earlier
+    run as (input fingerprint, result) by index. The node's next run reuses
+    the ones whose fingerprint still matches instead of re-running them.
+    Item fingerprints are only computed for those, or for every item when
+    `keep_item_results` is set because the results are kept for later
+    retries.
     """
 
-    def __init__(self, graph: Graph, hf_token: str | None = None):
+    def __init__(
+        self, graph: Graph, hf_token: str | None = None, user_id: str | None = None
+    ):
         self.graph = graph
         self.hf_token = hf_token
+        self.user_id = user_id
         self.results: dict[str, Any] = {}
+        self.result_fingerprints: dict[str, str | None] = {}
         self.scattered_results: dict[str, list[Any]] = {}
         self.selected_variants: dict[str, int] = {}
+        self.race_winners: dict[str, int] = {}
         self.clients: dict[str, Any] = {}
         self.concurrency = ConcurrencyManager()
+        self.result_cache = ResultCache()
+        self.item_streams: dict[str, ItemStream] = {}
+        self.reusable_items: dict[str, dict[int, tuple[str | None, Any]]] = {}
+        self.keep_item_results = False
 
         self._executing_nodes: dict[str, asyncio.Event] = {}
         self._execution_lock = asyncio.Lock()
 
+    @property
+    def fairness_key(self) -> str:
+        return self.user_id or f"session-{id(self)}"
+
     def set_hf_token(self, token: str | None):
         """Update the HF token and clear cached clients."""
         if token != self.hf_token:
@@ -79,6 +150,7 @@ class ExecutionSession:
     def clear_results(self):
         """Clear cached results for a fresh execution."""
         self.results = {}
+        self.result_fingerprints = {}
         self.scattered_results = {}
 
     async def wait_for_node(self, node_name: str) -> bool:
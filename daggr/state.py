@@ -3,6 +3,7 @@ from __future__ import annotations
 import json
 import os
 import sqlite3
+import time
 import uuid
 from datetime import datetime
 from pathlib import Path
@@ -10,6 +11,9 @@ from typing import Any
 
 from huggingface_hub import constants
 
+from daggr.metrics import SQLITE_QUERY_DURATION
+from daggr.tracing import traced
+
 
 def get_daggr_cache_dir() -> Path:
     """Get the daggr cache directory, respecting HF_HOME env var."""
@@ -24,6 +28,32 @@ def get_daggr_files_dir() -> Path:
     return files_dir
 
 
+class _TimedCursor(sqlite3.Cursor):
+    """Cursor that records query latency in the `/metrics` endpoint."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            SQLITE_QUERY_DURATION.observe(
+                time.perf_counter() - start, operation=_sql_operation(sql)
+            )
+
+
+class _TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+
+def _sql_operation(sql: str) -> str:
+    words = sql.split(None, 1)
+    return words[0].upper() if words else ""
+
+
 class SessionState:
     def __init__(self, db_path: str | None = None):
         if db_path is None:
@@ -31,8 +61,11 @@ class SessionState:
         self.db_path = db_path
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, factory=_TimedConnection)
+
     def _init_db(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
 
         self._migrate_legacy_schema(cursor)
@@ -84,6 +117,7 @@ class SessionState:
                 node_name TEXT,
                 result TEXT,
                 inputs_snapshot TEXT,
+                input_fingerprint TEXT,
                 created_at TEXT,
                 FOREIGN KEY (sheet_id) REFERENCES sheets(sheet_id) ON DELETE CASCADE
             )
@@ -93,12 +127,27 @@ class SessionState:
         result_columns = [col[1] for col in cursor.fetchall()]
         if "inputs_snapshot" not in result_columns:
             cursor.execute("ALTER TABLE node_results ADD COLUMN inputs_snapshot TEXT")
+        if "input_fingerprint" not in result_columns:
+            cursor.execute("ALTER TABLE node_results ADD COLUMN input_fingerprint TEXT")
 
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_node_results_sheet_node 
             ON node_results(sheet_id, node_name)
         """)
 
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS node_item_results (
+                sheet_id TEXT,
+                node_name TEXT,
+                item_index INTEGER,
+                input_fingerprint TEXT,
+                result TEXT,
+                created_at TEXT,
+                PRIMARY KEY (sheet_id, node_name, item_index),
+                FOREIGN KEY (sheet_id) REFERENCES sheets(sheet_id) ON DELETE CASCADE
+            )
+        """)
+
         conn.commit()
         conn.close()
 
@@ -185,7 +234,7 @@ class SessionState:
             count = self.get_sheet_count(user_id, graph_name)
             name = f"Sheet {count + 1}"
 
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """INSERT INTO sheets (sheet_id, user_id, graph_name, name, created_at, updated_at) 
@@ -197,7 +246,7 @@ class SessionState:
         return sheet_id
 
     def get_sheet_count(self, user_id: str, graph_name: str) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             "SELECT COUNT(*) FROM sheets WHERE user_id = ? AND graph_name = ?",
@@ -208,7 +257,7 @@ class SessionState:
         return count
 
     def list_sheets(self, user_id: str, graph_name: str) -> list[dict[str, Any]]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """SELECT sheet_id, name, created_at, updated_at 
@@ -230,7 +279,7 @@ class SessionState:
         ]
 
     def get_sheet(self, sheet_id: str) -> dict[str, Any] | None:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """SELECT sheet_id, user_id, graph_name, name, transform, created_at, updated_at 
@@ -260,7 +309,7 @@ class SessionState:
     def save_transform(self, sheet_id: str, x: float, y: float, scale: float) -> bool:
         now = datetime.now().isoformat()
         transform = json.dumps({"x": x, "y": y, "scale": scale})
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE sheets SET transform = ?, updated_at = ? WHERE sheet_id = ?",
@@ -273,7 +322,7 @@ class SessionState:
 
     def rename_sheet(self, sheet_id: str, new_name: str) -> bool:
         now = datetime.now().isoformat()
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             "UPDATE sheets SET name = ?, updated_at = ? WHERE sheet_id = ?",
@@ -285,10 +334,11 @@ class SessionState:
         return updated
 
     def delete_sheet(self, sheet_id: str) -> bool:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM node_inputs WHERE sheet_id = ?", (sheet_id,))
         cursor.execute("DELETE FROM node_results WHERE sheet_id = ?", (sheet_id,))
+        cursor.execute("DELETE FROM node_item_results WHERE sheet_id = ?", (sheet_id,))
         cursor.execute("DELETE FROM sheets WHERE sheet_id = ?", (sheet_id,))
         deleted = cursor.rowcount > 0
         conn.commit()
@@ -312,7 +362,7 @@ class SessionState:
     def save_input(self, sheet_id: str, node_name: str, port_name: str, value: Any):
         now = datetime.now().isoformat()
         value_json = json.dumps(value, default=str)
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """INSERT INTO node_inputs (sheet_id, node_name, port_name, value, updated_at)
@@ -329,7 +379,7 @@ class SessionState:
         conn.close()
 
     def get_inputs(self, sheet_id: str) -> dict[str, dict[str, Any]]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             "SELECT node_name, port_name, value FROM node_inputs WHERE sheet_id = ?",
@@ -344,23 +394,25 @@ class SessionState:
             inputs[node_name][port_name] = json.loads(value_json)
         return inputs
 
+    @traced("save_result")
     def save_result(
         self,
         sheet_id: str,
         node_name: str,
         result: Any,
         inputs_snapshot: dict[str, Any] | None = None,
+        input_fingerprint: str | None = None,
     ):
         now = datetime.now().isoformat()
         result_json = json.dumps(result, default=str)
         inputs_json = (
             json.dumps(inputs_snapshot, default=str) if inputs_snapshot else None
         )
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
-            "INSERT INTO node_results (sheet_id, node_name, result, inputs_snapshot, created_at) VALUES (?, ?, ?, ?, ?)",
-            (sheet_id, node_name, result_json, inputs_json, now),
+            "INSERT INTO node_results (sheet_id, node_name, result, inputs_snapshot, input_fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (sheet_id, node_name, result_json, inputs_json, input_fingerprint, now),
         )
         cursor.execute(
             "UPDATE sheets SET updated_at = ? WHERE sheet_id = ?",
@@ -370,7 +422,7 @@ class SessionState:
         conn.close()
 
     def get_latest_result(self, sheet_id: str, node_name: str) -> Any | None:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """SELECT result FROM node_results 
@@ -385,7 +437,7 @@ class SessionState:
         return None
 
     def get_result_count(self, sheet_id: str, node_name: str) -> int:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             "SELECT COUNT(*) FROM node_results WHERE sheet_id = ? AND node_name = ?",
@@ -398,7 +450,7 @@ class SessionState:
     def get_result_by_index(
         self, sheet_id: str, node_name: str, index: int
     ) -> Any | None:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """SELECT result FROM node_results 
@@ -414,8 +466,78 @@ class SessionState:
             return json.loads(results[-1][0])
         return None
 
+    def get_result_fingerprints(
+        self, sheet_id: str, node_name: str
+    ) -> list[str | None]:
+        """Get the input fingerprint of each of a node's results, oldest first,
+        so indices match `get_result_by_index`."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT input_fingerprint FROM node_results 
+               WHERE sheet_id = ? AND node_name = ? 
+               ORDER BY created_at ASC""",
+            (sheet_id, node_name),
+        )
+        fingerprints = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return fingerprints
+
+    @traced("save_item_results")
+    def save_item_results(
+        self,
+        sheet_id: str,
+        node_name: str,
+        items: list[tuple[int, Any, str | None]],
+    ):
+        """Save results of items of a scattered node in one transaction,
+        replacing the items' previous results.
+
+        Args:
+            sheet_id: The sheet the results belong to.
+            node_name: The scattered node.
+            items: (index, result, input fingerprint) for each item.
+        """
+        now = datetime.now().isoformat()
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.executemany(
+            """INSERT OR REPLACE INTO node_item_results 
+               (sheet_id, node_name, item_index, input_fingerprint, result, created_at) 
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [
+                (
+                    sheet_id,
+                    node_name,
+                    index,
+                    input_fingerprint,
+                    json.dumps(result, default=str),
+                    now,
+                )
+                for index, result, input_fingerprint in items
+            ],
+        )
+        conn.commit()
+        conn.close()
+
+    def get_item_results(
+        self, sheet_id: str, node_name: str
+    ) -> dict[int, tuple[str | None, Any]]:
+        """Get the latest result of each item of a scattered node, as
+        (input fingerprint, result) by item index."""
+        conn = self._connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT item_index, input_fingerprint, result FROM node_item_results 
+               WHERE sheet_id = ? AND node_name = ?""",
+            (sheet_id, node_name),
+        )
+        rows = cursor.fetchall()
+        conn.close()
+        return {index: (fp, json.loads(result)) for index, fp, result in rows}
+
     def get_all_results(self, sheet_id: str) -> dict[str, list[Any]]:
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute(
             """SELECT node_name, result, inputs_snapshot FROM node_results 
@@ -443,10 +565,11 @@ class SessionState:
         }
 
     def clear_sheet_data(self, sheet_id: str):
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM node_inputs WHERE sheet_id = ?", (sheet_id,))
         cursor.execute("DELETE FROM node_results WHERE sheet_id = ?", (sheet_id,))
+        cursor.execute("DELETE FROM node_item_results WHERE sheet_id = ?", (sheet_id,))
         conn.commit()
         conn.close()
 
@@ -0,0 +1,344 @@
+"""Per-run execution tracing for daggr.
+
+Every run started by the server records a trace: a tree of timed spans for
+the nodes it executes and the steps inside them (input preparation, waiting
+for a concurrency slot or a worker thread, a Space's queue and processing
+time, file downloads, result mapping, persistence). The current span is kept
+in a context variable, so spans opened in tasks and worker threads started by
+a run attach to that run. Outside a trace, `span` does nothing.
+
+Recent traces are kept in memory and served at `/api/runs/{run_id}/trace`.
+They can be exported as Chrome trace JSON (for chrome://tracing or Perfetto)
+or OTLP-JSON (for OpenTelemetry collectors), and written to
+`DAGGR_TRACE_DIR` as each run finishes.
+
+Example:
+    >>> with start_trace("run-1") as trace:
+    ...     with span("load", kind="step"):
+    ...         ...
+    >>> trace.save("run-1.json", format="chrome")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import json
+import os
+import re
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, TypeVar
+
+from daggr._utils import env_int
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACE_FORMATS = ("chrome", "otlp")
+TRACE_HISTORY = env_int("DAGGR_TRACE_HISTORY", 100)
+RUN_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+_span_ids = itertools.count(1)
+_current_trace: ContextVar[Trace | None] = ContextVar("daggr_trace", default=None)
+_current_span: ContextVar[Span | None] = ContextVar("daggr_span", default=None)
+
+_traces: OrderedDict[str, Trace] = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def _lane() -> str:
+    """Name the task or thread a span runs in. Spans in one lane nest."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        return f"task-{id(task):x}"
+    return f"thread-{threading.get_ident()}"
+
+
+class Span:
+    """One timed step of a run."""
+
+    def __init__(
+        self,
+        name: str,
+        trace: Trace,
+        parent: Span | None,
+        attributes: dict[str, Any],
+        start_ns: int | None = None,
+    ):
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.lane = _lane()
+        self.start_ns = start_ns if start_ns is not None else time.time_ns()
+        self.end_ns: int | None = None
+        self._trace = trace
+        self._token = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, end_ns: int | None = None) -> None:
+        self.end_ns = end_ns if end_ns is not None else time.time_ns()
+        self._trace._add(self)
+
+    def __enter__(self) -> Span:
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.end()
+
+
+class _NoSpan:
+    """Stands in for a span outside a trace."""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def __enter__(self) -> _NoSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Trace:
+    """The spans recorded for one run.
+
+    Args:
+        run_id: The run the trace belongs to.
+    """
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.trace_id = secrets.token_hex(16)
+        self.start_ns = time.time_ns()
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def _add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def _finished_spans(self) -> list[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start_ns)
+
+    def to_chrome(self) -> dict[str, Any]:
+        """Export as Chrome trace event JSON."""
+        lanes: dict[str, int] = {}
+        events: list[dict[str, Any]] = []
+        for span in self._finished_spans():
+            tid = lanes.setdefault(span.lane, len(lanes) + 1)
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": str(span.attributes.get("kind", "step")),
+                    "ph": "X",
+                    "ts": (span.start_ns - self.start_ns) / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {k: _json_value(v) for k, v in span.attributes.items()},
+                }
+            )
+        events.append(
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": 1,
+                "args": {"name": f"daggr run {self.run_id}"},
+            }
+        )
+        for lane, tid in lanes.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": 1,
+                    "tid": tid,
+                    "args": {"name": lane},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp(self) -> dict[str, Any]:
+        """Export as OTLP-JSON, as accepted by OpenTelemetry collectors."""
+        spans = []
+        for span in self._finished_spans():
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": f"{span.span_id:016x}",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [
+                    {"key": k, "value": _otlp_value(v)}
+                    for k, v in span.attributes.items()
+                ],
+            }
+            if span.parent_id is not None:
+                otlp_span["parentSpanId"] = f"{span.parent_id:016x}"
+            if "error" in span.attributes:
+                otlp_span["status"] = {
+                    "code": 2,
+                    "message": str(span.attributes["error"]),
+                }
+            spans.append(otlp_span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": "daggr"}},
+                            {
+                                "key": "daggr.run_id",
+                                "value": {"stringValue": self.run_id},
+                            },
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "daggr"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def export(self, format: str = "chrome") -> dict[str, Any]:
+        if format not in TRACE_FORMATS:
+            raise ValueError(
+                f"Invalid trace format '{format}'. Expected one of: "
+                f"{', '.join(TRACE_FORMATS)}"
+            )
+        return self.to_chrome() if format == "chrome" else self.to_otlp()
+
+    def save(self, path: str | Path, format: str = "chrome") -> None:
+        """Write the trace to a JSON file."""
+        Path(path).write_text(json.dumps(self.export(format)))
+
+
+def _json_value(value: Any) -> Any:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def validate_run_id(run_id: Any) -> str:
+    """Check a client-chosen run ID, or make one up if none was given.
+
+    Run IDs name trace files, so only letters, digits, `_` and `-` are
+    accepted, up to 64 characters.
+
+    Raises:
+        ValueError: If `run_id` isn't a valid run ID.
+    """
+    if run_id is None or run_id == "":
+        return uuid.uuid4().hex
+    if not isinstance(run_id, str) or not RUN_ID_PATTERN.fullmatch(run_id):
+        raise ValueError(
+            f"run_id must be 1-64 letters, digits, '_' or '-', got {run_id!r}"
+        )
+    return run_id
+
+
+@contextmanager
+def start_trace(run_id: str) -> Iterator[Trace]:
+    """Record a trace for the run in the current context.
+
+    The trace is kept in memory for `/api/runs/{run_id}/trace` and, if
+    `DAGGR_TRACE_DIR` is set, written there as Chrome trace JSON when the
+    run ends. Runs whose ID isn't a valid run ID (see `validate_run_id`)
+    aren't written.
+    """
+    trace = Trace(run_id)
+    if TRACE_HISTORY > 0:
+        with _traces_lock:
+            _traces[run_id] = trace
+            _traces.move_to_end(run_id)
+            while len(_traces) > TRACE_HISTORY:
+                _traces.popitem(last=False)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace_dir = os.environ.get("DAGGR_TRACE_DIR")
+        if trace_dir and RUN_ID_PATTERN.fullmatch(run_id):
+            try:
+                Path(trace_dir).mkdir(parents=True, exist_ok=True)
+                trace.save(Path(trace_dir) / f"{run_id}.json")
+            except OSError:
+                pass
+
+
+def span(name: str, **attributes: Any) -> Span | _NoSpan:
+    """Time a step of the current run as a child of the current span.
+
+    Use as a context manager. Outside a trace this does nothing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return _NO_SPAN
+    return Span(name, trace, _current_span.get(), attributes)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorate a function so each call is timed as a span named `name`."""
+
+    def decorator(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes: Any) -> None:
+    """Record a step whose start and end were measured separately, e.g. the
+    time a call waited in a queue."""
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    Span(name, trace, _current_span.get(), attributes, start_ns=start_ns).end(end_ns)
+
+
+def is_tracing() -> bool:
+    return _current_trace.get() is not None
+
+
+def get_trace(run_id: str) -> Trace | None:
+    """Get a recent run's trace."""
+    with _traces_lock:
+        return _traces.get(run_id)
@@ -0,0 +1,138 @@
+import asyncio
+import os
+import threading
+from pathlib import Path
+
+import httpx
+import pytest
+
+from daggr import _downloads, _file_store
+from daggr.executor import AsyncExecutor
+from daggr.graph import Graph
+from daggr.node import FnNode
+
+
+@pytest.fixture
+def files_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(_downloads, "get_daggr_files_dir", lambda: tmp_path)
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: tmp_path)
+    return tmp_path
+
+
+def mock_client(monkeypatch, requests, delay=0.0):
+    async def handler(request):
+        requests.append(str(request.url))
+        await asyncio.sleep(delay)
+        return httpx.Response(200, content=request.url.path.encode() * 1000)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(_downloads, "_get_async_client", lambda: client)
+
+
+def test_concurrent_requests_share_one_download(files_dir, monkeypatch):
+    requests = []
+    mock_client(monkeypatch, requests, delay=0.1)
+    url = "https://example.com/video.mp4"
+
+    async def run():
+        return await asyncio.gather(
+            *(_downloads.download_file_async(url) for _ in range(5))
+        )
+
+    paths = asyncio.run(run())
+    assert requests == [url]
+    assert len(set(paths)) == 1
+    assert paths[0].endswith(".mp4")
+    assert [p.name for p in files_dir.glob("*.mp4")] == [Path(paths[0]).name]
+
+
+def test_lazy_files_download_only_when_materialized(files_dir, monkeypatch):
+    requests = []
+    mock_client(monkeypatch, requests)
+    image_url = "https://example.com/a.png"
+    audio_url = "https://example.com/b.wav"
+    result = {
+        "image": _downloads.lazy_file(image_url),
+        "clips": [_downloads.lazy_file(audio_url, hf_token="hf_x")],
+        "caption": "caption",
+    }
+
+    assert requests == []
+    assert not os.path.exists(result["image"])
+    assert result["image"].url == image_url
+    assert _downloads.get_lazy_file(result["clips"][0]) == (audio_url, "hf_x")
+
+    asyncio.run(_downloads.materialize_files_async(result))
+
+    assert sorted(requests) == [image_url, audio_url]
+    assert open(result["image"], "rb").read() == b"/a.png" * 1000
+    assert _downloads.get_lazy_file(result["image"]) is None
+
+
+def test_sync_materialize_downloads_files_concurrently(files_dir, monkeypatch):
+    urls = [f"https://example.com/{i}.png" for i in range(3)]
+    # Every request waits for the others, so this only finishes if all three
+    # downloads are in flight at once.
+    barrier = threading.Barrier(len(urls), timeout=5)
+
+    def handler(request):
+        barrier.wait()
+        return httpx.Response(200, content=request.url.path.encode())
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(_downloads, "_get_sync_client", lambda: client)
+    result = [_downloads.lazy_file(url) for url in urls]
+
+    _downloads.materialize_files(result)
+
+    assert [open(path, "rb").read() for path in result] == [
+        f"/{i}.png".encode() for i in range(3)
+    ]
+
+
+def test_private_files_are_downloaded_before_passing_to_a_space(files_dir, monkeypatch):
+    headers = []
+
+    def handler(request):
+        headers.append(request.headers.get("authorization"))
+        return httpx.Response(200, content=b"data")
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(_downloads, "_get_sync_client", lambda: client)
+    monkeypatch.setattr(_downloads, "LAZY_FILES_MAX", 0)
+    executor = AsyncExecutor(Graph("test", nodes=[FnNode(lambda: None)]))
+    public = _downloads.lazy_file("https://example.com/public.png")
+    private = _downloads.lazy_file("https://example.com/private.png", hf_token="hf_x")
+
+    assert executor._wrap_file_input(public)["path"] == public.url
+    assert headers == []
+    # The token is kept on the value even once the registry has evicted it.
+    assert executor._wrap_file_input(private)["path"] == str(private)
+    assert headers == ["Bearer hf_x"]
+    assert os.path.exists(private)
+
+
+def test_download_is_aborted_when_every_caller_is_cancelled(files_dir, monkeypatch):
+    requests = []
+    mock_client(monkeypatch, requests, delay=0.5)
+    url = "https://example.com/video.mp4"
+
+    async def run():
+        waiters = [
+            asyncio.ensure_future(_downloads.download_file_async(url)) for _ in range(2)
+        ]
+        await asyncio.sleep(0.1)
+        download = _downloads._inflight[url]
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not download.task.done()
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert download.task.cancelled()
+
+    asyncio.run(run())
+    assert requests == [url]
+    assert url not in _downloads._inflight
+    assert list(files_dir.glob("*.mp4")) == []
+    assert list(files_dir.glob(".*.tmp")) == []
@@ -1,5 +1,36 @@
-from daggr import FnNode, Graph
-from daggr.executor import SequentialExecutor
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import httpx
+import pytest
+from gradio_client.utils import Status, StatusUpdate
+
+from daggr import (
+    ChoiceNode,
+    FnNode,
+    GradioNode,
+    Graph,
+    InferenceNode,
+    _client_cache,
+    _downloads,
+)
+from daggr._cancellation import (
+    CANCEL_POLL_INTERVAL,
+    run_deadline,
+    run_in_thread,
+    wait_future,
+)
+from daggr._limiter import FairLimiter
+from daggr._pools import ThreadPool
+from daggr._run_queue import RunQueue, RunQueueFull
+from daggr._utils import env_int
+from daggr.executor import AsyncExecutor, SequentialExecutor
+from daggr.session import ExecutionSession
+from daggr.tracing import start_trace
 
 
 class TestSequentialExecutor:
@@ -83,3 +114,1075 @@ class TestSequentialExecutor:
         result2 = executor.execute_node("process", {})
         assert result1["output"] == 1
         assert result2["output"] == 2
+
+
+class TestWavefrontScheduler:
+    def test_independent_branches_run_in_parallel(self):
+        # Each branch waits for the other, so a serial run breaks the barrier.
+        both_running = threading.Barrier(2, timeout=5)
+
+        def slow_a(x):
+            both_running.wait()
+            return x + 1
+
+        def slow_b(x):
+            both_running.wait()
+            return x + 2
+
+        def join(a, b):
+            return a + b
+
+        n1 = FnNode(slow_a, inputs={"x": 1}, concurrent=True)
+        n2 = FnNode(slow_b, inputs={"x": 1}, concurrent=True)
+        n3 = FnNode(join, inputs={"a": n1.output, "b": n2.output})
+        graph = Graph("test", nodes=[n3])
+        executor = SequentialExecutor(graph)
+
+        results = executor.execute_all({})
+
+        assert results["join"]["output"] == 5
+        assert not both_running.broken
+
+    def test_events_stream_in_completion_order(self):
+        def slow(x):
+            time.sleep(0.3)
+            return x
+
+        def fast(x):
+            return x
+
+        n1 = FnNode(slow, inputs={"x": 1}, concurrent=True)
+        n2 = FnNode(fast, inputs={"x": 2}, concurrent=True)
+        graph = Graph("test", nodes=[n1, n2])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+
+            async def run_node(node_name):
+                yield await executor.execute_node(session, node_name, {})
+
+            order = graph.get_execution_order()
+            return [
+                name async for name, _ in executor.execute_wavefront(order, run_node)
+            ]
+
+        assert asyncio.run(run()) == ["fast", "slow"]
+
+    def test_failure_reports_node_name(self):
+        def ok(x):
+            return x
+
+        def boom(y):
+            raise ValueError("kaboom")
+
+        n1 = FnNode(ok, inputs={"x": 1})
+        n2 = FnNode(boom, inputs={"y": n1.output})
+        graph = Graph("test", nodes=[n2])
+        executor = SequentialExecutor(graph)
+
+        with pytest.raises(RuntimeError, match="Error executing node 'boom'"):
+            executor.execute_all({})
+
+
+class FakeJob:
+    def __init__(self, future, outputs):
+        self.future = future
+        self._outputs = outputs
+        self.cancelled = False
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+    def outputs(self):
+        return list(self._outputs)
+
+    def status(self):
+        code = Status.FINISHED if self.done() else Status.PROCESSING
+        return StatusUpdate(
+            code=code,
+            rank=None,
+            queue_size=None,
+            eta=None,
+            success=None,
+            time=None,
+            progress_data=None,
+        )
+
+    def cancel(self):
+        self.cancelled = True
+        return self.future.cancel()
+
+
+class FakeSpaceClient:
+    def __init__(self, delay: float = 0.05, partials: tuple = ()):
+        self.delay = delay
+        self.partials = partials
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.jobs = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=32)
+
+    def submit(self, api_name, **kwargs):
+        outputs = []
+        job = FakeJob(self._pool.submit(self._run, outputs, kwargs), outputs)
+        self.jobs.append(job)
+        return job
+
+    def _run(self, outputs, kwargs):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        for partial in self.partials:
+            outputs.append(partial)
+            time.sleep(self.delay)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        result = kwargs["x"] * 2
+        outputs.append(result)
+        return result
+
+
+class TestScatterConcurrency:
+    def test_max_concurrency_bounds_in_flight_items(self, monkeypatch):
+        client = FakeSpaceClient()
+        monkeypatch.setitem(_client_cache._client_cache, "test/doubler", client)
+
+        def make_items():
+            return list(range(10))
+
+        items = FnNode(make_items, outputs={"items": None})
+        doubler = GradioNode(
+            "test/doubler",
+            validate=False,
+            inputs={"x": items.items.each},
+            outputs={"y": None},
+            max_concurrency=3,
+        )
+        graph = Graph("test", nodes=[doubler])
+        results = SequentialExecutor(graph).execute_all({})
+
+        scattered = results["doubler"]["_scattered_results"]
+        assert [r["y"] for r in scattered] == [i * 2 for i in range(10)]
+        assert client.max_in_flight == 3
+
+    def test_nodes_share_upstream_limit(self, monkeypatch):
+        client = FakeSpaceClient(delay=0.1)
+        monkeypatch.setitem(_client_cache._client_cache, "test/shared", client)
+
+        nodes = [
+            GradioNode(
+                "test/shared",
+                name=f"call_{i}",
+                validate=False,
+                inputs={"x": i},
+                outputs={"y": None},
+                max_concurrency=2,
+            )
+            for i in range(4)
+        ]
+        graph = Graph("test", nodes=nodes)
+        results = SequentialExecutor(graph).execute_all({})
+
+        assert results["call_3"]["y"] == 6
+        assert client.max_in_flight == 2
+
+    def test_item_fingerprints_are_only_computed_when_kept(self):
+        def make_items():
+            return ["a", "b"]
+
+        def shout(s):
+            return s.upper()
+
+        items = FnNode(make_items, outputs={"items": None})
+        shouter = FnNode(shout, inputs={"s": items.items.each}, outputs={"s": None})
+        graph = Graph("test", nodes=[shouter])
+        executor = AsyncExecutor(graph)
+
+        async def run(keep):
+            session = ExecutionSession(graph)
+            session.keep_item_results = keep
+            await executor.execute_node(session, "make_items", {})
+            return await executor.execute_node(session, "shout", {})
+
+        assert asyncio.run(run(False))["_item_fingerprints"] == [None, None]
+        assert None not in asyncio.run(run(True))["_item_fingerprints"]
+
+    def test_smallest_declared_limit_applies(self, monkeypatch):
+        client = FakeSpaceClient()
+        monkeypatch.setitem(_client_cache._client_cache, "test/conflict", client)
+
+        def make_items():
+            return list(range(8))
+
+        items = FnNode(make_items, outputs={"items": None})
+        wide = GradioNode(
+            "test/conflict",
+            name="wide",
+            validate=False,
+            inputs={"x": items.items.each},
+            outputs={"y": None},
+            max_concurrency=6,
+        )
+        narrow = GradioNode(
+            "test/conflict",
+            name="narrow",
+            validate=False,
+            inputs={"x": 1},
+            outputs={"y": None},
+            max_concurrency=2,
+        )
+        graph = Graph("test", nodes=[wide, narrow])
+        results = SequentialExecutor(graph).execute_all({})
+
+        assert len(results["wide"]["_scattered_results"]) == 8
+        assert client.max_in_flight == 2
+
+    def test_upstream_limit_is_shared_by_sessions(self, monkeypatch):
+        client = FakeSpaceClient()
+        monkeypatch.setitem(_client_cache._client_cache, "test/busy", client)
+        node = GradioNode(
+            "test/busy",
+            validate=False,
+            inputs={"x": 1},
+            outputs={"y": None},
+            max_concurrency=2,
+        )
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            sessions = [ExecutionSession(graph, user_id=f"u{i}") for i in range(5)]
+            await asyncio.gather(
+                *(executor.execute_node(s, "busy", {}) for s in sessions)
+            )
+
+        asyncio.run(run())
+        assert len(client.jobs) == 5
+        assert client.max_in_flight == 2
+
+    def test_malformed_env_limit_falls_back_to_default(self, monkeypatch):
+        monkeypatch.setenv("DAGGR_REMOTE_CONCURRENCY", "sixteen")
+        with pytest.warns(UserWarning, match="DAGGR_REMOTE_CONCURRENCY"):
+            assert env_int("DAGGR_REMOTE_CONCURRENCY", 16, minimum=1) == 16
+        monkeypatch.setenv("DAGGR_REMOTE_CONCURRENCY", "4")
+        assert env_int("DAGGR_REMOTE_CONCURRENCY", 16, minimum=1) == 4
+
+    def test_invalid_max_concurrency(self):
+        with pytest.raises(ValueError, match="max_concurrency"):
+            GradioNode("test/doubler", validate=False, max_concurrency=0)
+
+
+_worker_state = {}
+
+
+def load_offset(offset):
+    _worker_state["offset"] = offset
+
+
+def add_offset(x):
+    return x + _worker_state.get("offset", 0), os.getpid()
+
+
+class TestProcessExecutor:
+    def test_runs_in_worker_process_with_initializer(self):
+        node = FnNode(
+            add_offset,
+            inputs={"x": 1},
+            outputs={"value": None, "pid": None},
+            executor="process",
+            initializer=load_offset,
+            initargs=(100,),
+        )
+        graph = Graph("test", nodes=[node])
+        result = SequentialExecutor(graph).execute_node("add_offset", {})
+        assert result["value"] == 101
+        assert result["pid"] != os.getpid()
+
+    def test_scattered_items_run_in_pool(self):
+        def make_items():
+            return [1, 2, 3, 4]
+
+        items = FnNode(make_items, outputs={"items": None})
+        node = FnNode(
+            add_offset,
+            inputs={"x": items.items.each},
+            outputs={"value": None, "pid": None},
+            executor="process",
+        )
+        graph = Graph("test", nodes=[node])
+        results = SequentialExecutor(graph).execute_all({})
+        scattered = results["add_offset"]["_scattered_results"]
+        assert [r["value"] for r in scattered] == [1, 2, 3, 4]
+
+    def test_unpicklable_function_fails_at_build_time(self):
+        with pytest.raises(ValueError, match="picklable"):
+            FnNode(lambda x: x, executor="process")
+
+    def test_invalid_executor(self):
+        with pytest.raises(ValueError, match="executor"):
+            FnNode(add_offset, executor="gpu")
+
+
+class TestAsyncFnNode:
+    def test_awaited_on_event_loop(self):
+        threads = []
+
+        async def fetch(x):
+            threads.append(threading.get_ident())
+            await asyncio.sleep(0)
+            return x * 3
+
+        node = FnNode(fetch, inputs={"x": 2})
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            result = await executor.execute_node(session, "fetch", {})
+            return result, threading.get_ident()
+
+        result, loop_thread = asyncio.run(run())
+        assert result["output"] == 6
+        assert threads == [loop_thread]
+
+    def test_follows_concurrency_rules(self):
+        running = 0
+        peak = 0
+
+        async def track():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+
+        async def slow_a(x):
+            await track()
+            return x
+
+        async def slow_b(x):
+            await track()
+            return x
+
+        def peak_in_flight(concurrent):
+            nonlocal peak
+            peak = 0
+            n1 = FnNode(slow_a, inputs={"x": 1}, concurrent=concurrent)
+            n2 = FnNode(slow_b, inputs={"x": 2}, concurrent=concurrent)
+            SequentialExecutor(Graph("test", nodes=[n1, n2])).execute_all({})
+            return peak
+
+        assert peak_in_flight(concurrent=True) == 2
+        assert peak_in_flight(concurrent=False) == 1
+
+    def test_process_executor_rejected(self):
+        async def fetch(x):
+            return x
+
+        with pytest.raises(ValueError, match="async"):
+            FnNode(fetch, executor="process")
+
+
+class TestGradioJobs:
+    def test_partial_outputs_and_status_are_reported(self, monkeypatch):
+        client = FakeSpaceClient(delay=0.15, partials=("He", "Hell"))
+        monkeypatch.setitem(_client_cache._client_cache, "test/stream", client)
+        node = GradioNode(
+            "test/stream", validate=False, inputs={"x": "Hello"}, outputs={"y": None}
+        )
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+        events = []
+
+        async def run():
+            session = ExecutionSession(graph)
+            return await executor.execute_node(
+                session, "stream", {}, on_event=events.append
+            )
+
+        result = asyncio.run(run())
+        assert result == {"y": "HelloHello"}
+        partials = [e["result"]["y"] for e in events if e["type"] == "node_partial"]
+        assert partials == ["He", "Hell"]
+        statuses = [e["status"] for e in events if e["type"] == "node_status"]
+        assert statuses[0] == "PROCESSING"
+
+    def test_cancelling_run_cancels_job(self, monkeypatch):
+        client = FakeSpaceClient(delay=0.5)
+        monkeypatch.setitem(_client_cache._client_cache, "test/slow", client)
+        node = GradioNode(
+            "test/slow", validate=False, inputs={"x": 1}, outputs={"y": None}
+        )
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            task = asyncio.create_task(executor.execute_node(session, "slow", {}))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        assert client.jobs[0].cancelled
+
+
+class TestChoiceRace:
+    def test_first_success_wins_and_loser_job_is_cancelled(self, monkeypatch):
+        slow = FakeSpaceClient(delay=1.0)
+        fast = FakeSpaceClient(delay=0.02)
+        monkeypatch.setitem(_client_cache._client_cache, "test/slow", slow)
+        monkeypatch.setitem(_client_cache._client_cache, "test/fast", fast)
+        choice = ChoiceNode(
+            [
+                GradioNode(
+                    "test/slow", validate=False, inputs={"x": 1}, outputs={"y": None}
+                ),
+                GradioNode(
+                    "test/fast", validate=False, inputs={"x": 2}, outputs={"y": None}
+                ),
+            ],
+            name="tts",
+            race=True,
+        )
+        graph = Graph("test", nodes=[choice])
+        executor = AsyncExecutor(graph)
+        events = []
+
+        async def run():
+            session = ExecutionSession(graph)
+            result = await executor.execute_node(
+                session, "tts", {}, on_event=events.append
+            )
+            return result, session.race_winners
+
+        start = time.time()
+        result, winners = asyncio.run(run())
+        assert time.time() - start < 0.8
+        assert result == {"y": 4}
+        assert winners == {"tts": 1}
+        assert slow.jobs[0].cancelled
+        won = [e for e in events if e["type"] == "variant_won"]
+        assert won == [
+            {
+                "type": "variant_won",
+                "node": "tts",
+                "variant": 1,
+                "variant_name": "fast",
+            }
+        ]
+
+    def test_backups_wait_for_hedge_delay(self):
+        started = []
+
+        async def primary(x):
+            started.append("primary")
+            await asyncio.sleep(0.05)
+            return x
+
+        async def backup(x):
+            started.append("backup")
+            return -x
+
+        choice = ChoiceNode(
+            [FnNode(primary, inputs={"x": 1}), FnNode(backup, inputs={"x": 1})],
+            hedge_after=0.5,
+        )
+        graph = Graph("test", nodes=[choice])
+        result = asyncio.run(
+            AsyncExecutor(graph).execute_node(ExecutionSession(graph), "primary", {})
+        )
+        assert result["output"] == 1
+        assert started == ["primary"]
+
+    def test_failed_primary_starts_backups_immediately(self):
+        async def primary(x):
+            raise ValueError("space is down")
+
+        async def backup(x):
+            return -x
+
+        choice = ChoiceNode(
+            [FnNode(primary, inputs={"x": 1}), FnNode(backup, inputs={"x": 1})],
+            hedge_after=5,
+        )
+        graph = Graph("test", nodes=[choice])
+        start = time.time()
+        result = asyncio.run(
+            AsyncExecutor(graph).execute_node(ExecutionSession(graph), "primary", {})
+        )
+        assert result["output"] == -1
+        assert time.time() - start < 1
+
+
+class TestCancellation:
+    def test_cancelling_choice_node_cancels_variant_job(self, monkeypatch):
+        client = FakeSpaceClient(delay=0.5)
+        monkeypatch.setitem(_client_cache._client_cache, "test/voice", client)
+        choice = ChoiceNode(
+            [
+                FnNode(lambda x: x, inputs={"x": 1}, outputs={"y": None}),
+                GradioNode(
+                    "test/voice", validate=False, inputs={"x": 1}, outputs={"y": None}
+                ),
+            ],
+            name="voice",
+        )
+        graph = Graph("test", nodes=[choice])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            session.selected_variants["voice"] = 1
+            task = asyncio.create_task(executor.execute_node(session, "voice", {}))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        assert client.jobs[0].cancelled
+
+    def test_cancelling_task_stops_wait_in_worker_thread(self):
+        future = Future()
+
+        async def run():
+            task = asyncio.create_task(run_in_thread(wait_future, future))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # The worker thread notices the cancellation on its next poll.
+            await asyncio.sleep(CANCEL_POLL_INTERVAL * 2)
+
+        start = time.time()
+        asyncio.run(run())
+        assert future.cancelled()
+        assert time.time() - start < 1
+
+
+class TestTimeouts:
+    def test_timeout_cancels_job(self, monkeypatch):
+        client = FakeSpaceClient(delay=1.0)
+        monkeypatch.setitem(_client_cache._client_cache, "test/hung", client)
+        node = GradioNode(
+            "test/hung",
+            validate=False,
+            inputs={"x": 1},
+            outputs={"y": None},
+            timeout=0.2,
+        )
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            await executor.execute_node(ExecutionSession(graph), "hung", {})
+
+        start = time.time()
+        with pytest.raises(TimeoutError, match="'hung': timed out after 0.2s"):
+            asyncio.run(run())
+        assert time.time() - start < 0.8
+        assert client.jobs[0].cancelled
+
+    def test_timed_out_variant_falls_back(self):
+        async def hung(x):
+            await asyncio.sleep(5)
+
+        def backup(x):
+            return -x
+
+        choice = ChoiceNode(
+            [
+                FnNode(hung, inputs={"x": 1}, timeout=0.1),
+                FnNode(backup, inputs={"x": 1}),
+            ],
+            hedge_after="p95",
+        )
+        graph = Graph("test", nodes=[choice])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            return await executor.execute_node(ExecutionSession(graph), "hung", {})
+
+        start = time.time()
+        assert asyncio.run(run()) == {"output": -1}
+        assert time.time() - start < 1
+
+    def test_run_deadline_bounds_scattered_items(self):
+        def make_items():
+            return [0.01, 5, 5]
+
+        async def wait(seconds):
+            await asyncio.sleep(seconds)
+            return seconds
+
+        items = FnNode(make_items, outputs={"items": None})
+        waiter = FnNode(wait, inputs={"seconds": items.items.each}, concurrent=True)
+        graph = Graph("test", nodes=[waiter])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            await executor.execute_node(session, "make_items")
+            with run_deadline(0.3):
+                return await executor.execute_node(session, "wait")
+
+        start = time.time()
+        results = asyncio.run(run())["_scattered_results"]
+        assert time.time() - start < 1
+        assert results[0] == {"output": 0.01}
+        assert results[1] == results[2] == {"error": "run deadline exceeded"}
+
+
+class TestTracing:
+    def test_node_steps_are_recorded_as_nested_spans(self):
+        def add_one(x):
+            return x + 1
+
+        def double(x):
+            return x * 2
+
+        n1 = FnNode(add_one, name="add_one", inputs={"x": 3})
+        n2 = FnNode(double, name="double", inputs={"x": n1.output})
+        graph = Graph("test", nodes=[n2])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            with start_trace("run-1") as trace:
+                await executor.execute_node(session, "add_one", {})
+                await executor.execute_node(session, "double", {})
+            return trace
+
+        trace = asyncio.run(run())
+        spans = {s.name: s for s in trace.spans}
+        assert spans["add_one"].attributes["node_type"] == "FnNode"
+        for step in ("prepare_inputs", "thread_queue_wait", "map_result"):
+            assert spans[step].parent_id in (
+                spans["add_one"].span_id,
+                spans["double"].span_id,
+            )
+
+        chrome = trace.export("chrome")
+        names = {e["name"] for e in chrome["traceEvents"] if e["ph"] == "X"}
+        assert {"add_one", "double", "map_result"} <= names
+        otlp = trace.export("otlp")
+        otlp_spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert len(otlp_spans) == len(trace.spans)
+        assert {s["traceId"] for s in otlp_spans} == {trace.trace_id}
+
+    def test_remote_phases_are_recorded(self, monkeypatch):
+        client = FakeSpaceClient(delay=0.3)
+        monkeypatch.setitem(_client_cache._client_cache, "test/traced", client)
+        node = GradioNode(
+            "test/traced", validate=False, inputs={"x": 1}, outputs={"y": None}
+        )
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            with start_trace("run-2") as trace:
+                await executor.execute_node(ExecutionSession(graph), "traced", {})
+            return trace
+
+        trace = asyncio.run(run())
+        phase = next(s for s in trace.spans if s.name == "remote_processing")
+        node_span = next(s for s in trace.spans if s.name == "traced")
+        assert phase.parent_id == node_span.span_id
+        assert phase.end_ns - phase.start_ns >= 0.2e9
+
+
+class TestThreadPools:
+    def test_busy_pool_does_not_block_other_pools(self):
+        fn_pool = ThreadPool("fn-test", 1)
+        io_pool = ThreadPool("io-test", 1)
+        release = threading.Event()
+
+        async def run():
+            blocked = asyncio.ensure_future(fn_pool.run(release.wait))
+            queued = asyncio.ensure_future(fn_pool.run(lambda: "fn"))
+            assert await asyncio.wait_for(io_pool.run(lambda: "io"), 1) == "io"
+            assert not queued.done()
+            release.set()
+            return await blocked, await queued
+
+        assert asyncio.run(run()) == (True, "fn")
+
+    def test_autoscale_grows_pool_when_calls_wait(self):
+        pool = ThreadPool("autoscale-test", 1, autoscale=True)
+
+        async def run():
+            await asyncio.gather(*(pool.run(time.sleep, 0.2) for _ in range(5)))
+
+        start = time.time()
+        asyncio.run(run())
+        assert pool.max_workers == 2
+        assert time.time() - start < 1.0
+
+
+class TestServerConcurrency:
+    def test_server_scope_limits_calls_across_sessions(self):
+        running = 0
+        peak = 0
+
+        async def gpu(x):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.05)
+            running -= 1
+            return x
+
+        node = FnNode(
+            gpu,
+            name="gpu_server_scope",
+            inputs={"x": 1},
+            concurrent=True,
+            concurrency_scope="server",
+        )
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            sessions = [ExecutionSession(graph, user_id=f"u{i}") for i in range(4)]
+            await asyncio.gather(
+                *(executor.execute_node(s, "gpu_server_scope", {}) for s in sessions)
+            )
+
+        asyncio.run(run())
+        assert peak == 1
+
+    def test_waiting_users_are_served_round_robin(self):
+        limiter = FairLimiter("fair-test", 1)
+        order = []
+
+        async def call(user, tag):
+            async with limiter.slot(user):
+                order.append(tag)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await limiter.acquire("a")
+            tasks = [asyncio.create_task(call("a", f"a{i}")) for i in range(3)]
+            await asyncio.sleep(0)
+            tasks.append(asyncio.create_task(call("b", "b0")))
+            await asyncio.sleep(0)
+            limiter.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        assert order == ["a0", "b0", "a1", "a2"]
+        assert limiter.active == 0
+
+    def test_run_queue_prioritizes_interactive_runs_and_bounds_waiting(self):
+        queue = RunQueue(max_running=1, max_queued=3)
+        order = []
+
+        async def run(ticket):
+            async with ticket:
+                order.append(ticket.run_id)
+
+        async def main():
+            first = queue.admit("first", "a")
+            await first.wait()
+            batch = [queue.admit(f"batch{i}", "api", "batch") for i in range(2)]
+            ui = queue.admit("ui", "b", "interactive")
+            assert ui.position == 0
+            assert [t.position for t in batch] == [1, 2]
+            with pytest.raises(RunQueueFull) as e:
+                queue.admit("rejected", "c")
+            assert e.value.retry_after >= 1
+            assert queue.status()["queued"] == 3
+
+            tasks = [asyncio.create_task(run(t)) for t in [*batch, ui]]
+            await asyncio.sleep(0)
+            first.release()
+            await asyncio.gather(*tasks)
+
+        asyncio.run(main())
+        assert order == ["ui", "batch0", "batch1"]
+        assert queue.status()["running"] == 0
+        assert queue.get("ui") is None
+
+    def test_releasing_a_queued_run_gives_up_its_place(self):
+        queue = RunQueue(max_running=1, max_queued=2)
+
+        async def main():
+            running = queue.admit("running", "a")
+            queued = queue.admit("queued", "b")
+            queued.release()
+            queued.release()
+            assert queue.status()["queued"] == 0
+            running.release()
+            running.release()
+
+        asyncio.run(main())
+        assert queue.status()["running"] == 0
+
+
+class TestScatterPipelining:
+    def test_items_flow_through_chain_before_stage_finishes(self):
+        log = []
+
+        def split():
+            return ["a", "b", "c"]
+
+        def speak(line):
+            time.sleep(0.15)
+            log.append(("speak", line))
+            return line.upper()
+
+        def polish(audio):
+            log.append(("polish", audio))
+            return audio + "!"
+
+        lines = FnNode(split, outputs={"lines": None})
+        tts = FnNode(
+            speak,
+            inputs={"line": lines.lines.each},
+            outputs={"audio": None},
+            concurrent=True,
+        )
+        post = FnNode(
+            polish,
+            inputs={"audio": tts.audio.each},
+            outputs={"final": None},
+            concurrent=True,
+        )
+        graph = Graph("test", nodes=[post])
+        assert graph.get_plan().stream_sources == {"polish": "speak"}
+
+        results = SequentialExecutor(graph).execute_all({})
+
+        finals = [r["final"] for r in results["polish"]["_scattered_results"]]
+        assert finals == ["A!", "B!", "C!"]
+        assert results["polish"]["_items"] == ["A", "B", "C"]
+        assert log.index(("polish", "A")) < log.index(("speak", "c"))
+
+    def test_scatter_over_finished_scattered_node(self):
+        def split():
+            return [1, 2]
+
+        def double(x):
+            return x * 2
+
+        def inc(y):
+            return y + 1
+
+        source = FnNode(split, outputs={"items": None})
+        doubler = FnNode(double, inputs={"x": source.items.each})
+        incr = FnNode(inc, inputs={"y": doubler.output.each})
+        graph = Graph("test", nodes=[incr])
+        executor = SequentialExecutor(graph)
+        executor.execute_node("split", {})
+        executor.execute_node("double", {})
+        result = executor.execute_node("inc", {})
+        assert [r["output"] for r in result["_scattered_results"]] == [3, 5]
+
+
+class TestBatching:
+    def test_scattered_items_are_coalesced(self):
+        batch_sizes = []
+
+        def make_items():
+            return list(range(10))
+
+        def double(x):
+            batch_sizes.append(len(x))
+            return [v * 2 for v in x]
+
+        items = FnNode(make_items, outputs={"items": None})
+        doubler = FnNode(
+            double,
+            inputs={"x": items.items.each},
+            batch=True,
+            max_batch_size=4,
+            max_wait_ms=50,
+        )
+        graph = Graph("test", nodes=[doubler])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            await executor.execute_node(session, "make_items")
+            return await executor.execute_node(session, "double")
+
+        result = asyncio.run(run())
+        outputs = [r["output"] for r in result["_scattered_results"]]
+        assert outputs == [v * 2 for v in range(10)]
+        assert batch_sizes == [4, 4, 2]
+
+    def test_calls_from_separate_sessions_share_a_batch(self):
+        batch_sizes = []
+
+        def shout(text):
+            batch_sizes.append(len(text))
+            return [t.upper() for t in text]
+
+        node = FnNode(shout, batch=True, max_wait_ms=100)
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            return await asyncio.gather(
+                *(
+                    executor.execute_node(ExecutionSession(graph), "shout", {"text": t})
+                    for t in ("a", "b", "c")
+                )
+            )
+
+        results = asyncio.run(run())
+        assert [r["output"] for r in results] == ["A", "B", "C"]
+        assert batch_sizes == [3]
+
+    def test_wrong_result_count_fails_every_call(self):
+        def broken(x):
+            return x[:1]
+
+        node = FnNode(broken, batch=True, max_wait_ms=50)
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            return await asyncio.gather(
+                *(
+                    executor.execute_node(ExecutionSession(graph), "broken", {"x": i})
+                    for i in range(2)
+                ),
+                return_exceptions=True,
+            )
+
+        errors = asyncio.run(run())
+        assert all("returned 1 results for 2 calls" in str(e) for e in errors)
+
+
+class FakeAsyncInferenceClient:
+    created = []
+
+    def __init__(self, model=None, provider=None, token=None):
+        self.model = model
+        FakeAsyncInferenceClient.created.append(self)
+
+    async def text_generation(self, prompt):
+        await asyncio.sleep(0)
+        return prompt[::-1]
+
+
+class TestInferenceClients:
+    def test_sync_clients_are_pooled_per_token(self):
+        client = _client_cache.get_inference_client("org/model", None, "a")
+        assert _client_cache.get_inference_client("org/model", None, "a") is client
+        assert _client_cache.get_inference_client("org/model", None, "b") is not client
+
+    def test_least_recently_used_clients_are_dropped(self, monkeypatch):
+        monkeypatch.setattr(_client_cache, "INFERENCE_CLIENTS_MAX", 2)
+        monkeypatch.setattr(_client_cache, "_inference_clients", OrderedDict())
+        a = _client_cache.get_inference_client("org/model", None, "hf_a")
+        b = _client_cache.get_inference_client("org/model", None, "hf_b")
+        assert _client_cache.get_inference_client("org/model", None, "hf_a") is a
+        _client_cache.get_inference_client("org/model", None, "hf_c")
+
+        assert len(_client_cache._inference_clients) == 2
+        assert _client_cache.get_inference_client("org/model", None, "hf_a") is a
+        assert _client_cache.get_inference_client("org/model", None, "hf_b") is not b
+        assert "hf_a" not in str(list(_client_cache._inference_clients))
+
+    def test_inference_node_reuses_async_client(self, monkeypatch):
+        import huggingface_hub
+
+        monkeypatch.setattr(
+            huggingface_hub, "AsyncInferenceClient", FakeAsyncInferenceClient
+        )
+        FakeAsyncInferenceClient.created = []
+        node = InferenceNode(
+            "org/pooled-model", validate=False, inputs={"prompt": None}
+        )
+        node._task = "text-generation"
+        node._task_fetched = True
+        graph = Graph("test", nodes=[node])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            return [
+                await executor.execute_node(session, "pooled-model", {"prompt": p})
+                for p in ("abc", "xyz")
+            ]
+
+        results = asyncio.run(run())
+        assert [r["output"] for r in results] == ["cba", "zyx"]
+        assert len(FakeAsyncInferenceClient.created) == 1
+        assert FakeAsyncInferenceClient.created[0].model == "org/pooled-model"
+
+
+class FakeFileSpaceClient:
+    def __init__(self, url):
+        self.url = url
+        self.calls = []
+
+    def submit(self, api_name, **kwargs):
+        self.calls.append(kwargs)
+        future = Future()
+        future.set_result(
+            {"url": self.url, "path": "out.wav", "meta": {"_type": "gradio.FileData"}}
+        )
+        return FakeJob(future, [])
+
+
+class TestLazyFiles:
+    def test_urls_pass_through_spaces_and_download_for_functions(
+        self, tmp_path, monkeypatch
+    ):
+        url = "https://example.com/speech.wav"
+        requests = []
+
+        def handler(request):
+            requests.append(str(request.url))
+            return httpx.Response(200, content=b"RIFF" * 100)
+
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(_downloads, "get_daggr_files_dir", lambda: tmp_path)
+        monkeypatch.setattr(_downloads, "_get_sync_client", lambda: client)
+        tts_client = FakeFileSpaceClient(url)
+        enhance_client = FakeFileSpaceClient("https://example.com/enhanced.wav")
+        monkeypatch.setitem(_client_cache._client_cache, "test/tts", tts_client)
+        monkeypatch.setitem(_client_cache._client_cache, "test/enhance", enhance_client)
+
+        def size(audio):
+            return os.path.getsize(audio)
+
+        tts = GradioNode(
+            "test/tts",
+            name="tts",
+            validate=False,
+            inputs={"text": "hi"},
+            outputs={"audio": None},
+        )
+        enhance = GradioNode(
+            "test/enhance",
+            name="enhance",
+            validate=False,
+            inputs={"audio": tts.audio},
+            outputs={"audio": None},
+        )
+        measure = FnNode(size, inputs={"audio": tts.audio})
+        graph = Graph("test", nodes=[enhance, measure])
+        executor = AsyncExecutor(graph)
+
+        async def run():
+            session = ExecutionSession(graph)
+            await executor.execute_node(session, "tts")
+            await executor.execute_node(session, "enhance")
+            assert requests == []
+            return await executor.execute_node(session, "size")
+
+        assert asyncio.run(run())["output"] == 400
+        assert enhance_client.calls[0]["audio"]["path"] == url
+        assert requests == [url]
@@ -0,0 +1,79 @@
+import os
+import time
+
+import pytest
+
+from daggr import _file_store
+from daggr.state import SessionState
+
+
+@pytest.fixture
+def files_dir(tmp_path, monkeypatch):
+    files_dir = tmp_path / "files"
+    files_dir.mkdir()
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: files_dir)
+    monkeypatch.setattr(_file_store, "get_daggr_cache_dir", lambda: tmp_path)
+    monkeypatch.setenv("DAGGR_DB_PATH", str(tmp_path / "sessions.db"))
+    return files_dir
+
+
+def age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_identical_content_is_stored_once(files_dir):
+    first = _file_store.store_bytes(b"audio", ".wav")
+    second = _file_store.store_bytes(b"audio", ".WAV")
+    assert first == second
+
+    download = files_dir / "abc123.wav"
+    download.write_bytes(b"audio")
+    _file_store.link_file(download, _file_store.hash_file(download))
+
+    assert os.path.samefile(download, first)
+    assert _file_store.usage()["unique_files"] == 1
+
+
+def test_prune_evicts_unreferenced_files_least_recently_used_first(files_dir):
+    kept = _file_store.store_bytes(b"k" * 100, ".png")
+    old = _file_store.store_bytes(b"o" * 100, ".png")
+    recent = _file_store.store_bytes(b"r" * 100, ".png")
+    new = _file_store.store_bytes(b"n" * 100, ".png")
+    age(kept, 3000)
+    age(old, 2000)
+    age(recent, 1000)
+
+    state = SessionState(os.environ["DAGGR_DB_PATH"])
+    sheet_id = state.create_sheet("local", "graph")
+    state.save_result(sheet_id, "image_gen", {"image": kept})
+    state.save_input(sheet_id, "upload", "image", "/file" + new)
+
+    stats = _file_store.prune(max_size=300)
+
+    assert stats == {"removed": 1, "freed": 100}
+    assert not os.path.exists(old)
+    assert all(os.path.exists(p) for p in (kept, recent, new))
+
+    stats = _file_store.prune(max_size=10**9, older_than=500)
+    assert stats == {"removed": 1, "freed": 100}
+    assert os.path.exists(kept)
+    assert os.path.exists(new)
+
+
+def test_prune_keeps_files_of_saved_item_results(files_dir):
+    clip = _file_store.store_bytes(b"c" * 100, ".wav")
+    orphan = _file_store.store_bytes(b"o" * 100, ".wav")
+    age(clip, 2000)
+    age(orphan, 1000)
+
+    state = SessionState(os.environ["DAGGR_DB_PATH"])
+    sheet_id = state.create_sheet("local", "graph")
+    state.save_item_results(sheet_id, "tts", [(0, {"audio": clip}, "fp")])
+
+    assert _file_store.prune(max_size=10**9, older_than=500) == {
+        "removed": 1,
+        "freed": 100,
+    }
+    assert os.path.exists(clip)
+    assert not os.path.exists(orphan)
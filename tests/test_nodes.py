@@ -1,6 +1,6 @@
 import pytest
 
-from daggr import FnNode, Graph, InteractionNode
+from daggr import ChoiceNode, FnNode, Graph, InteractionNode
 from daggr.port import ItemList, Port, ScatteredPort
 
 
@@ -103,6 +103,57 @@ class TestChoiceNodeName:
         assert graph.nodes["Music generator"] is choice
 
 
+class TestChoiceNodeRace:
+    def test_hedge_after_percentile_uses_recent_latencies(self):
+        def step_a(x):
+            return x
+
+        def step_b(x):
+            return x
+
+        choice = ChoiceNode([FnNode(step_a), FnNode(step_b)], hedge_after="p90")
+        assert choice._race
+        assert choice._get_hedge_delay(0) is None
+
+        for seconds in range(1, 11):
+            choice._record_latency(0, seconds / 10)
+        assert choice._get_hedge_delay(0) == pytest.approx(0.9)
+        assert (choice | FnNode(step_a, name="c"))._hedge_after == "p90"
+
+    def test_invalid_hedge_after_raises(self):
+        def step(x):
+            return x
+
+        with pytest.raises(ValueError, match="hedge_after"):
+            ChoiceNode([FnNode(step)], hedge_after="fast")
+        with pytest.raises(ValueError, match="hedge_after"):
+            ChoiceNode([FnNode(step)], hedge_after=-1)
+
+
+class TestTimeouts:
+    def test_invalid_timeout_raises(self):
+        def step(x):
+            return x
+
+        with pytest.raises(ValueError, match="timeout"):
+            FnNode(step, timeout=0)
+        with pytest.raises(ValueError, match="timeout"):
+            ChoiceNode([FnNode(step)], timeout=-5)
+        choice = FnNode(step, timeout=2) | FnNode(step, name="b")
+        assert choice._timeout is None
+        assert choice._variants[0]._timeout == 2
+
+
+class TestConcurrencyScope:
+    def test_invalid_concurrency_scope_raises(self):
+        def step(x):
+            return x
+
+        with pytest.raises(ValueError, match="concurrency_scope"):
+            FnNode(step, concurrency_scope="global")
+        assert FnNode(step, concurrency_scope="server")._concurrency_scope == "server"
+
+
 class TestPort:
     def test_port_access(self):
         def process(x):
@@ -212,3 +263,31 @@ class TestGraphConstruction:
         connections = graph.get_connections()
         assert len(connections) == 1
         assert connections[0] == ("a", "output", "b", "y")
+
+    def test_plan_indexes_and_invalidation(self):
+        def a(x):
+            return {"output": x}
+
+        def b(y):
+            return {"output": y}
+
+        def c(z, w):
+            return {"output": z}
+
+        n1 = FnNode(a, name="first")
+        n2 = FnNode(b, name="second")
+        n3 = FnNode(c, name="third")
+        graph = Graph("test", nodes=[n1, n2, n3])
+        graph.edge(n1.output, n2.y)
+        plan = graph.get_plan()
+        assert graph.get_plan() is plan
+        assert [e.target_port for e in plan.incoming["second"]] == ["y"]
+        assert plan.ancestors("third") == []
+
+        graph.edge(n2.output, n3.z)
+        graph.edge(n1.output, n3.w)
+        plan = graph.get_plan()
+        assert plan.ancestors("third") == ["first", "second"]
+        assert plan.levels == {"first": 0, "second": 1, "third": 2}
+        assert plan.is_ancestor("first", "third")
+        assert not plan.is_ancestor("third", "first")
@@ -0,0 +1,166 @@
+from pathlib import Path
+
+import pytest
+
+from daggr import CachePolicy, FnNode, GradioNode, Graph, _downloads, result_cache
+from daggr.executor import FileValue, SequentialExecutor
+from daggr.result_cache import ResultCache, cached_call, input_fingerprint
+from daggr.session import ExecutionSession
+
+calls = []
+
+
+# Cached functions are defined at module level: closures are never cached.
+def shout(text):
+    calls.append(text)
+    return text.upper()
+
+
+def size(path):
+    calls.append(path)
+    return len(open(path).read())
+
+
+def executor_for(node):
+    return SequentialExecutor(Graph("test", nodes=[node]))
+
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    calls.clear()
+
+
+@pytest.fixture
+def global_cache(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path / "results")
+    monkeypatch.setattr(result_cache, "_global_cache", cache)
+    return cache
+
+
+class TestSessionCache:
+    def test_skips_repeat_calls(self):
+        executor = executor_for(FnNode(shout, cache="session"))
+
+        assert executor.execute_node("shout", {"text": "hi"})["output"] == "HI"
+        assert executor.execute_node("shout", {"text": "hi"})["output"] == "HI"
+        executor.execute_node("shout", {"text": "bye"})
+        assert calls == ["hi", "bye"]
+
+    def test_is_not_shared_between_sessions(self):
+        node = FnNode(shout, cache="session")
+        executor_for(node).execute_node("shout", {"text": "hi"})
+        executor_for(node).execute_node("shout", {"text": "hi"})
+        assert calls == ["hi", "hi"]
+
+
+class TestGlobalCache:
+    def test_survives_restart(self, global_cache):
+        node = FnNode(shout, cache="global")
+        executor_for(node).execute_node("shout", {"text": "a"})
+
+        global_cache.clear()
+        result = executor_for(node).execute_node("shout", {"text": "a"})
+        assert result["output"] == "A"
+        assert calls == ["a"]
+
+    def test_file_inputs_are_keyed_by_content(self, global_cache, tmp_path):
+        executor = executor_for(FnNode(size, cache="global"))
+        first = tmp_path / "a.txt"
+        second = tmp_path / "b.txt"
+        first.write_text("same")
+        second.write_text("same")
+
+        executor.execute_node("size", {"path": str(first)})
+        executor.execute_node("size", {"path": str(second)})
+        assert len(calls) == 1
+
+        second.write_text("different")
+        executor.execute_node("size", {"path": str(second)})
+        assert len(calls) == 2
+
+
+class TestUncacheableNodes:
+    def test_callable_fixed_inputs(self, global_cache):
+        node = FnNode(shout, inputs={"text": lambda: "x"}, cache="global")
+        executor = executor_for(node)
+        executor.execute_node("shout", {})
+        executor.execute_node("shout", {})
+        assert calls == ["x", "x"]
+
+    def test_closures(self, global_cache):
+        def make_node(suffix):
+            def add_suffix(text):
+                calls.append(text)
+                return text + suffix
+
+            return FnNode(add_suffix, cache="global")
+
+        with pytest.warns(UserWarning, match="won't be cached"):
+            node = make_node("!")
+        executor = executor_for(node)
+        executor.execute_node("add_suffix", {"text": "hi"})
+        executor.execute_node("add_suffix", {"text": "hi"})
+        assert calls == ["hi", "hi"]
+
+
+class TestCacheKeys:
+    def test_remote_calls_are_keyed_by_token(self, global_cache):
+        node = GradioNode("user/private", validate=False, cache="global")
+        graph = Graph("test", nodes=[node])
+        sessions = [
+            ExecutionSession(graph),
+            ExecutionSession(graph, hf_token="hf_alice"),
+            ExecutionSession(graph, hf_token="hf_bob"),
+        ]
+
+        keys = {
+            cached_call(session, node, {"text": "hi"}).input_key for session in sessions
+        }
+        assert len(keys) == 3
+        assert "hf_alice" not in str(keys)
+
+    def test_local_calls_ignore_token(self):
+        node = FnNode(shout, cache="session")
+        graph = Graph("test", nodes=[node])
+        keys = {
+            cached_call(ExecutionSession(graph, hf_token=token), node, {}).input_key
+            for token in (None, "hf_alice")
+        }
+        assert len(keys) == 1
+
+    def test_lazy_files_keep_their_key_once_downloaded(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(_downloads, "get_daggr_files_dir", lambda: tmp_path)
+        node = FnNode(size, cache="session")
+        audio = _downloads.lazy_file("https://example.com/speech.wav")
+
+        def fingerprint(value):
+            return input_fingerprint(node, {}, {"tts": {"audio": value}})
+
+        before = fingerprint(audio)
+        Path(audio).write_bytes(b"RIFF")
+        assert fingerprint(audio) == before
+        # Results loaded back from the database hold the plain path.
+        assert fingerprint(FileValue(str(audio))) == before
+        assert fingerprint(_downloads.lazy_file("https://example.com/b.wav")) != before
+
+
+class TestCachePolicy:
+    def test_ttl_and_max_entries(self, monkeypatch):
+        cache = ResultCache()
+        policy = CachePolicy("session", ttl=10, max_entries=2)
+        now = 1000.0
+        monkeypatch.setattr(result_cache.time, "time", lambda: now)
+
+        cache.put(policy, "node", "a", 1)
+        cache.put(policy, "node", "b", 2)
+        cache.put(policy, "node", "c", 3)
+        assert cache.get(policy, "node", "a") == (False, None)
+        assert cache.get(policy, "node", "c") == (True, 3)
+
+        now = 1011.0
+        assert cache.get(policy, "node", "c") == (False, None)
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError, match="scope"):
+            CachePolicy("forever")
+        assert CachePolicy.resolve("none") is None
@@ -1,10 +1,13 @@
+import asyncio
 from pathlib import Path
 from unittest.mock import patch
 
+import gradio as gr
 import pytest
 
-from daggr import Graph
+from daggr import FnNode, Graph
 from daggr.server import DaggrServer
+from daggr.session import ExecutionSession
 
 
 @pytest.fixture
@@ -33,3 +36,711 @@ def test_file_to_url_converts_real_file_paths(server, tmp_path):
 
     assert result.startswith("/file/")
     assert "\\" not in result
+
+
+def test_streaming_emits_item_complete_events():
+    def make_items():
+        return ["a", "b", "c"]
+
+    def shout(text):
+        return text.upper()
+
+    items = FnNode(make_items, outputs={"items": None})
+    shouter = FnNode(shout, inputs={"text": items.items.each})
+    graph = Graph("test", nodes=[shouter], persist_key=False)
+    server = DaggrServer(graph)
+
+    async def run():
+        session = ExecutionSession(graph)
+        return [
+            message
+            async for message in server._execute_to_node_streaming(
+                session, "shout", None, {}, {}, {}, "run-1"
+            )
+        ]
+
+    messages = asyncio.run(run())
+    item_events = [m for m in messages if m["type"] == "item_complete"]
+
+    assert [e["index"] for e in item_events] == [0, 1, 2]
+    assert [e["completed"] for e in item_events] == [1, 2, 3]
+    assert all(e["total"] == 3 and e["node"] == "shout" for e in item_events)
+    assert item_events[1]["item"]["output"] == "B"
+    assert messages[-1]["type"] == "node_complete"
+    assert messages[-1]["completed_node"] == "shout"
+
+
+def test_partial_event_renders_output_components():
+    def echo(text):
+        return text
+
+    node = FnNode(echo, outputs={"reply": gr.Textbox(label="Reply")})
+    server = DaggrServer(Graph("test", nodes=[node], persist_key=False))
+
+    message = server._build_progress_event(
+        {"type": "node_partial", "node": "echo", "result": {"reply": "Hel"}}, "run-1"
+    )
+
+    assert message["type"] == "node_partial"
+    assert message["run_id"] == "run-1"
+    assert message["output_components"][0]["value"] == "Hel"
+
+
+def test_upload_stores_file_and_resolves_file_urls(server, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from daggr import _file_store
+    from daggr.executor import FileValue
+
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: tmp_path)
+    client = TestClient(server.app)
+
+    response = client.post(
+        "/api/upload", files={"files": ("photo.PNG", b"x" * 3_000_000, "image/png")}
+    )
+    assert response.status_code == 200
+    handle = response.json()["files"][0]
+    assert handle["orig_name"] == "photo.PNG"
+    assert handle["size"] == 3_000_000
+    assert handle["path"].endswith(".png")
+    assert Path(handle["path"]).read_bytes() == b"x" * 3_000_000
+
+    value = server._file_from_url(handle["url"])
+    assert isinstance(value, FileValue)
+    assert value == handle["path"]
+    assert server._file_from_url("/file/etc/passwd") == "/file/etc/passwd"
+    assert client.post("/api/upload", data={"a": "b"}).status_code == 400
+
+
+def test_websocket_upload_in_binary_frames(server, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from daggr import _file_store
+
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: tmp_path)
+    client = TestClient(server.app)
+
+    with client.websocket_connect("/ws/test-session") as ws:
+        ws.send_json({"action": "upload_start", "upload_id": "u1", "name": "a.wav"})
+        ws.send_bytes(b"u1\nRIFF")
+        ws.send_bytes(b"u1\n\ndata")
+        ws.send_json({"action": "upload_end", "upload_id": "u1"})
+        while (message := ws.receive_json())["type"] != "upload_complete":
+            pass
+
+    assert message["upload_id"] == "u1"
+    assert message["size"] == 9
+    assert message["url"].startswith("/file/")
+    assert Path(message["path"]).read_bytes() == b"RIFF\ndata"
+
+
+def test_uploads_over_the_size_limit_are_rejected(server, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from daggr import _file_store, _uploads
+
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: tmp_path)
+    monkeypatch.setattr(_uploads, "MAX_UPLOAD_SIZE", 1000)
+    client = TestClient(server.app)
+
+    response = client.post(
+        "/api/upload",
+        files=[
+            ("files", ("small.txt", b"x" * 1000, "text/plain")),
+            ("files", ("big.txt", b"x" * 1001, "text/plain")),
+        ],
+    )
+    assert response.status_code == 413
+
+    with client.websocket_connect("/ws/test-session") as ws:
+        ws.send_json({"action": "upload_start", "upload_id": "u1", "name": "a.wav"})
+        ws.send_bytes(b"u1\n" + b"x" * 1001)
+        while (message := ws.receive_json())["type"] != "upload_error":
+            pass
+    assert message["upload_id"] == "u1"
+
+    # Only the file within the limit was stored; no partial files are left.
+    sizes = [p.stat().st_size for p in tmp_path.rglob("*") if p.is_file()]
+    assert sizes == [1000]
+
+
+def test_websocket_pending_uploads_are_capped_and_cleaned_up(
+    server, tmp_path, monkeypatch
+):
+    from fastapi.testclient import TestClient
+
+    from daggr import _file_store
+
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: tmp_path)
+    monkeypatch.setattr("daggr.server.MAX_PENDING_UPLOADS", 2)
+    client = TestClient(server.app)
+
+    with client.websocket_connect("/ws/test-session") as ws:
+        for upload_id in ("u1", "u2", "u3"):
+            ws.send_json({"action": "upload_start", "upload_id": upload_id})
+            ws.send_bytes(upload_id.encode() + b"\npartial")
+        while (message := ws.receive_json())["type"] != "upload_error":
+            pass
+        assert message["upload_id"] == "u3"
+        assert len(list(tmp_path.rglob("*.tmp"))) == 2
+
+    # Uploads left unfinished when the socket closes are discarded.
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+
+def test_api_call_deadline_returns_gateway_timeout():
+    from fastapi.testclient import TestClient
+
+    async def slow(text):
+        await asyncio.sleep(5)
+        return text
+
+    node = FnNode(slow, inputs={"text": gr.Textbox()}, outputs={"out": gr.Textbox()})
+    client = TestClient(DaggrServer(Graph("test", nodes=[node])).app)
+
+    response = client.post(
+        "/api/call", json={"inputs": {"slow__text": "hi"}, "deadline": 0.2}
+    )
+    assert response.status_code == 504
+    assert "run deadline exceeded" in response.json()["error"]
+
+    response = client.post("/api/call", json={"inputs": {}, "deadline": -1})
+    assert response.status_code == 400
+
+
+def test_api_call_trace_can_be_exported():
+    from fastapi.testclient import TestClient
+
+    def shout(text):
+        return text.upper()
+
+    node = FnNode(shout, inputs={"text": gr.Textbox()}, outputs={"out": gr.Textbox()})
+    client = TestClient(DaggrServer(Graph("test", nodes=[node])).app)
+
+    run_id = client.post("/api/call", json={"inputs": {"shout__text": "hi"}}).json()[
+        "run_id"
+    ]
+    trace = client.get(f"/api/runs/{run_id}/trace").json()
+    names = [e["name"] for e in trace["traceEvents"] if e["ph"] == "X"]
+    assert "shout" in names and "map_result" in names
+
+    otlp = client.get(f"/api/runs/{run_id}/trace?format=otlp").json()
+    assert otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert client.get(f"/api/runs/{run_id}/trace?format=xml").status_code == 400
+    assert client.get("/api/runs/missing/trace").status_code == 404
+
+
+def test_run_ids_cannot_escape_the_trace_dir(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from daggr.tracing import start_trace
+
+    monkeypatch.setenv("DAGGR_TRACE_DIR", str(tmp_path / "traces"))
+
+    def shout(text):
+        return text.upper()
+
+    node = FnNode(shout, inputs={"text": gr.Textbox()}, outputs={"out": gr.Textbox()})
+    client = TestClient(DaggrServer(Graph("test", nodes=[node])).app)
+
+    for run_id in ("../escaped", str(tmp_path / "escaped"), "a" * 65, 7):
+        response = client.post(
+            "/api/call", json={"inputs": {"shout__text": "hi"}, "run_id": run_id}
+        )
+        assert response.status_code == 400
+        response = client.post("/api/run/shout", json={"run_id": run_id})
+        assert response.status_code == 400
+
+    response = client.post(
+        "/api/call", json={"inputs": {"shout__text": "hi"}, "run_id": "run_1"}
+    )
+    assert response.status_code == 200
+    with start_trace("../escaped"):
+        pass
+    assert sorted(p.name for p in tmp_path.rglob("*.json")) == ["run_1.json"]
+
+
+def test_metrics_endpoint_reports_node_latency():
+    from fastapi.testclient import TestClient
+
+    def measured(text):
+        return text
+
+    node = FnNode(
+        measured, inputs={"text": gr.Textbox()}, outputs={"out": gr.Textbox()}
+    )
+    client = TestClient(DaggrServer(Graph("test", nodes=[node])).app)
+    client.post("/api/call", json={"inputs": {"measured__text": "hi"}})
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert "# TYPE daggr_node_duration_seconds histogram" in lines
+    assert any(
+        line.startswith(
+            'daggr_node_duration_seconds_count{node="measured",node_type="FnNode",'
+            'status="ok"} '
+        )
+        for line in lines
+    )
+    assert any(
+        line.startswith('daggr_node_duration_seconds_bucket{node="measured"')
+        and 'le="+Inf"' in line
+        for line in lines
+    )
+    assert any(line.startswith("daggr_files_bytes ") for line in lines)
+
+
+def test_api_call_returns_429_when_run_queue_is_full():
+    from fastapi.testclient import TestClient
+
+    from daggr._run_queue import RunQueue
+
+    def echo(text):
+        return text
+
+    node = FnNode(echo, inputs={"text": gr.Textbox()}, outputs={"out": gr.Textbox()})
+    server = DaggrServer(Graph("test", nodes=[node]))
+    server.run_queue = RunQueue(max_running=1, max_queued=0)
+    client = TestClient(server.app)
+
+    busy = server.run_queue.admit("busy", "someone-else")
+    assert client.get("/api/queue/busy").json() == {
+        "run_id": "busy",
+        "state": "running",
+        "position": None,
+    }
+    response = client.post("/api/call", json={"inputs": {"echo__text": "hi"}})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["retry_after"] >= 1
+
+    busy.release()
+    response = client.post("/api/call", json={"inputs": {"echo__text": "hi"}})
+    assert response.status_code == 200
+    assert client.get("/api/queue").json()["running"] == 0
+
+
+def test_streaming_reruns_only_nodes_whose_inputs_changed(tmp_path, monkeypatch):
+    monkeypatch.setenv("DAGGR_DB_PATH", str(tmp_path / "sessions.db"))
+    calls = []
+
+    def load(text):
+        calls.append("load")
+        return text
+
+    def normalize(value):
+        calls.append("normalize")
+        return value.lower()
+
+    def count(value):
+        calls.append("count")
+        return len(value)
+
+    def report(value):
+        calls.append("report")
+        return f"{value} chars"
+
+    loader = FnNode(
+        load, name="load", inputs={"text": gr.Textbox()}, outputs={"value": None}
+    )
+    normalizer = FnNode(
+        normalize,
+        name="normalize",
+        inputs={"value": loader.value},
+        outputs={"value": None},
+    )
+    counter = FnNode(
+        count, name="count", inputs={"value": normalizer.value}, outputs={"value": None}
+    )
+    reporter = FnNode(
+        report,
+        name="report",
+        inputs={"value": counter.value},
+        outputs={"value": gr.Textbox()},
+    )
+    graph = Graph("test", nodes=[reporter], persist_key="fingerprints")
+    server = DaggrServer(graph)
+    sheet_id = server.state.create_sheet("user", graph.persist_key)
+
+    def run(text):
+        calls.clear()
+
+        async def consume():
+            async for _ in server._execute_to_node_streaming(
+                ExecutionSession(graph),
+                "report",
+                sheet_id,
+                {"load__text": {"value": text}},
+                {},
+                {},
+                "run-1",
+                "user",
+            ):
+                pass
+
+        asyncio.run(consume())
+        return list(calls)
+
+    assert run("Hello") == ["load", "normalize", "count", "report"]
+    assert run("Hello") == ["report"]
+    # "hello" normalizes to the same value, so count's inputs are unchanged.
+    assert run("hello") == ["load", "normalize", "report"]
+    # Going back to an earlier input reuses the results computed for it.
+    assert run("Hello") == ["report"]
+    assert run("Goodbye") == ["load", "normalize", "count", "report"]
+
+
+def test_results_without_a_stored_fingerprint_are_rerun(tmp_path, monkeypatch):
+    monkeypatch.setenv("DAGGR_DB_PATH", str(tmp_path / "sessions.db"))
+    calls = []
+
+    def load(text):
+        calls.append("load")
+        return text
+
+    def shout(value):
+        calls.append("shout")
+        return value.upper()
+
+    loader = FnNode(
+        load, name="load", inputs={"text": gr.Textbox()}, outputs={"value": None}
+    )
+    shouter = FnNode(
+        shout, name="shout", inputs={"value": loader.value}, outputs={"out": None}
+    )
+    graph = Graph("test", nodes=[shouter], persist_key="legacy")
+    server = DaggrServer(graph)
+    sheet_id = server.state.create_sheet("user", graph.persist_key)
+
+    def run(text):
+        calls.clear()
+
+        async def consume():
+            async for _ in server._execute_to_node_streaming(
+                ExecutionSession(graph),
+                "shout",
+                sheet_id,
+                {"load__text": {"value": text}},
+                {},
+                {},
+                "run-1",
+                "user",
+            ):
+                pass
+
+        asyncio.run(consume())
+        return list(calls)
+
+    assert run("hello") == ["load", "shout"]
+    # Results saved before fingerprints were recorded have none.
+    with server.state._connect() as conn:
+        conn.execute("UPDATE node_results SET input_fingerprint = NULL")
+    assert run("goodbye") == ["load", "shout"]
+
+
+def test_retry_items_reruns_only_failed_and_requested_items(tmp_path, monkeypatch):
+    monkeypatch.setenv("DAGGR_DB_PATH", str(tmp_path / "sessions.db"))
+    calls = []
+    flaky = {"b"}
+
+    def make_items():
+        return ["a", "b", "c", "d"]
+
+    def shout(text):
+        calls.append(text)
+        if text in flaky:
+            raise RuntimeError("Space unavailable")
+        return text.upper()
+
+    def join(texts):
+        return "".join(t if isinstance(t, str) else "?" for t in texts)
+
+    items = FnNode(make_items, name="make_items", outputs={"items": None})
+    shouter = FnNode(
+        shout,
+        name="shout",
+        inputs={"text": items.items.each},
+        outputs={"text": None},
+    )
+    joiner = FnNode(
+        join,
+        name="join",
+        inputs={"texts": shouter.text.all()},
+        outputs={"text": gr.Textbox()},
+    )
+    graph = Graph("test", nodes=[joiner], persist_key="retries")
+    server = DaggrServer(graph)
+    sheet_id = server.state.create_sheet("user", graph.persist_key)
+
+    def run(target, retry_items=None):
+        calls.clear()
+
+        async def consume():
+            return [
+                message
+                async for message in server._execute_to_node_streaming(
+                    ExecutionSession(graph),
+                    target,
+                    sheet_id,
+                    {},
+                    {},
+                    {},
+                    "run-1",
+                    "user",
+                    retry_items=retry_items,
+                )
+            ]
+
+        return asyncio.run(consume())
+
+    writes = []
+    save_item_results = server.state.save_item_results
+
+    def record_write(sheet_id, node_name, items):
+        writes.append(len(items))
+        save_item_results(sheet_id, node_name, items)
+
+    monkeypatch.setattr(server.state, "save_item_results", record_write)
+
+    run("join")
+    assert calls == ["a", "b", "c", "d"]
+    # The items are saved together rather than one transaction per item.
+    assert writes == [4]
+    assert server.state.get_latest_result(sheet_id, "join") == {"text": "A?CD"}
+    stored = server.state.get_item_results(sheet_id, "shout")
+    assert stored[1][1] == {"error": "Space unavailable"}
+
+    flaky.clear()
+    messages = run("shout", retry_items=[])
+    assert calls == ["b"]
+    items_done = [m for m in messages if m["type"] == "item_complete"]
+    assert len(items_done) == 4
+    assert server.state.get_latest_result(sheet_id, "join") == {"text": "ABCD"}
+
+    run("shout", retry_items=[2])
+    assert calls == ["c"]
+
+    with pytest.raises(ValueError, match="no scattered inputs"):
+        run("join", retry_items=[])
+
+    from fastapi.testclient import TestClient
+
+    client = TestClient(server.app)
+    response = client.post("/api/run/join", json={"retry_items": []})
+    assert response.status_code == 400
+
+
+def test_retry_items_over_downloaded_files_reruns_only_failed_items(
+    tmp_path, monkeypatch
+):
+    import httpx
+
+    from daggr import _downloads, _file_store
+
+    monkeypatch.setenv("DAGGR_DB_PATH", str(tmp_path / "sessions.db"))
+    monkeypatch.setattr(_downloads, "get_daggr_files_dir", lambda: tmp_path)
+    monkeypatch.setattr(_file_store, "get_daggr_files_dir", lambda: tmp_path)
+
+    def handler(request):
+        return httpx.Response(200, content=request.url.path.encode())
+
+    async def slow_handler(request):
+        # Keep the clips lazy while the items are fingerprinted.
+        await asyncio.sleep(0.2)
+        return handler(request)
+
+    monkeypatch.setattr(
+        _downloads,
+        "_get_sync_client",
+        lambda: httpx.Client(transport=httpx.MockTransport(handler)),
+    )
+    monkeypatch.setattr(
+        _downloads,
+        "_get_async_client",
+        lambda: httpx.AsyncClient(transport=httpx.MockTransport(slow_handler)),
+    )
+    calls = []
+    flaky = {"b.wav"}
+
+    def speak():
+        return [
+            _downloads.lazy_file(f"https://example.com/{name}.wav") for name in "abc"
+        ]
+
+    def measure(clip):
+        name = Path(clip).read_bytes().decode().lstrip("/")
+        calls.append(name)
+        if name in flaky:
+            raise RuntimeError("Space unavailable")
+        return len(name)
+
+    speaker = FnNode(speak, name="speak", outputs={"clips": None})
+    measurer = FnNode(
+        measure,
+        name="measure",
+        inputs={"clip": speaker.clips.each},
+        outputs={"size": gr.Number()},
+    )
+    graph = Graph("test", nodes=[measurer], persist_key="file_retries")
+    server = DaggrServer(graph)
+    sheet_id = server.state.create_sheet("user", graph.persist_key)
+
+    def run(retry_items=None):
+        calls.clear()
+
+        async def consume():
+            async for _ in server._execute_to_node_streaming(
+                ExecutionSession(graph),
+                "measure",
+                sheet_id,
+                {},
+                {},
+                {},
+                "run-1",
+                "user",
+                retry_items=retry_items,
+            ):
+                pass
+
+        asyncio.run(consume())
+
+    run()
+    assert sorted(calls) == ["a.wav", "b.wav", "c.wav"]
+    # The clips are downloaded by now, which mustn't change the items' keys.
+    flaky.clear()
+    run(retry_items=[])
+    assert calls == ["b.wav"]
+    run(retry_items=[2])
+    assert calls == ["c.wav"]
+
+
+def test_websocket_run_with_invalid_deadline_frees_its_run_slot():
+    from fastapi.testclient import TestClient
+
+    from daggr._run_queue import RunQueue
+
+    def echo(text):
+        return text
+
+    node = FnNode(
+        echo, name="echo", inputs={"text": "hi"}, outputs={"out": gr.Textbox()}
+    )
+    server = DaggrServer(Graph("test", nodes=[node], persist_key=False))
+    server.run_queue = RunQueue(max_running=1, max_queued=4)
+    client = TestClient(server.app)
+
+    def run(websocket, run_id, **extra):
+        websocket.send_json(
+            {"action": "run", "node_name": "echo", "run_id": run_id, **extra}
+        )
+        while True:
+            message = websocket.receive_json()
+            if message.get("run_id") == run_id and message["type"] in (
+                "error",
+                "node_complete",
+            ):
+                return message
+
+    with client.websocket_connect("/ws/test-session") as websocket:
+        for _ in range(3):
+            message = run(websocket, "bad", deadline="soon")
+            assert message["type"] == "error"
+            assert "deadline" in message["error"]
+        assert server.run_queue.status()["running"] == 0
+        assert run(websocket, "good")["type"] == "node_complete"
+    assert server.run_queue.status() == {
+        "running": 0,
+        "queued": 0,
+        "max_running": 1,
+        "max_queued": 4,
+    }
+
+
+def test_server_shutdown_stops_worker_pools():
+    from fastapi.testclient import TestClient
+
+    from daggr import _pools
+
+    def shout(text):
+        return text.upper()
+
+    node = FnNode(shout, inputs={"text": gr.Textbox()}, outputs={"out": gr.Textbox()})
+    with TestClient(DaggrServer(Graph("test", nodes=[node])).app) as client:
+        response = client.post("/api/call", json={"inputs": {"shout__text": "hi"}})
+        assert response.status_code == 200
+        assert _pools._thread_pools
+
+    assert _pools._thread_pools == {}
+    assert _pools._process_pools == {}
+
+
+def test_pipelined_scatter_chain_reruns_when_its_input_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv("DAGGR_DB_PATH", str(tmp_path / "sessions.db"))
+    calls = []
+
+    def split(text):
+        return text.split()
+
+    def upper(word):
+        return word.upper()
+
+    def exclaim(word):
+        calls.append(word)
+        return word + "!"
+
+    def join(words):
+        return " ".join(words)
+
+    splitter = FnNode(
+        split, name="split", inputs={"text": gr.Textbox()}, outputs={"words": None}
+    )
+    upper_node = FnNode(
+        upper,
+        name="upper",
+        inputs={"word": splitter.words.each},
+        outputs={"word": None},
+    )
+    exclaim_node = FnNode(
+        exclaim,
+        name="exclaim",
+        inputs={"word": upper_node.word.each},
+        outputs={"word": None},
+    )
+    joiner = FnNode(
+        join,
+        name="join",
+        inputs={"words": exclaim_node.word.all()},
+        outputs={"text": gr.Textbox()},
+    )
+    graph = Graph("test", nodes=[joiner], persist_key="pipelined")
+    assert graph.get_plan().stream_sources == {"exclaim": "upper"}
+    server = DaggrServer(graph)
+    sheet_id = server.state.create_sheet("user", graph.persist_key)
+
+    def run(text):
+        calls.clear()
+
+        async def consume():
+            async for _ in server._execute_to_node_streaming(
+                ExecutionSession(graph),
+                "join",
+                sheet_id,
+                {"split__text": {"value": text}},
+                {},
+                {},
+                "run-1",
+                "user",
+            ):
+                pass
+
+        asyncio.run(consume())
+        return server.state.get_latest_result(sheet_id, "join")
+
+    assert run("a b") == {"text": "A! B!"}
+    # exclaim starts before upper finishes, so it mustn't be keyed without it.
+    assert run("x y z") == {"text": "X! Y! Z!"}
+    assert sorted(calls) == ["X", "Y", "Z"]
+    assert run("x y z") == {"text": "X! Y! Z!"}
+    assert calls == []